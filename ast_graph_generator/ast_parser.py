@@ -1,10 +1,55 @@
 # ast_parser.py
 import clang.cindex
 import logging
+from .session import AnalysisSession, get_thread_session
+from .ontologie import NAME_IDENTITY
 
-def parse_source(source_path: str, include_paths, library_paths) -> clang.cindex.TranslationUnit:
+# Modes d'extraction : "full" construit le graph complet (appels de fonctions, types utilisés),
+# "structure" ne garde que les déclarations (namespaces, classes, méthodes) sans parser les corps,
+# "skip_header_bodies" construit le graph complet mais ne parse pas les corps de fonctions des
+# includes de tête (seuls les appels du fichier analysé sont extraits)
+FULL_MODE = "full"
+STRUCTURE_MODE = "structure"
+SKIP_HEADER_BODIES_MODE = "skip_header_bodies"
+EXTRACTION_MODES = (FULL_MODE, STRUCTURE_MODE, SKIP_HEADER_BODIES_MODE)
+
+# Options libclang 18 absentes des bindings Python (CXTranslationUnit_Flags)
+PARSE_CREATE_PREAMBLE_ON_FIRST_PARSE = 0x100
+PARSE_LIMIT_SKIP_FUNCTION_BODIES_TO_PREAMBLE = 0x800
+
+def parse_options_for_mode(mode: str = FULL_MODE, incomplete: bool = False) -> int:
+    """
+    Retourne les options de parsing libclang d'un mode d'extraction.
+    incomplete ajoute PARSE_INCOMPLETE (pas d'instanciation implicite des templates en fin
+    d'unité de traduction), utile quand seule la structure est extraite.
+    """
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Mode d'extraction inconnu : {mode}")
+    options = 0
+    if mode == STRUCTURE_MODE:
+        options |= clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+    elif mode == SKIP_HEADER_BODIES_MODE:
+        # La limitation au préambule (les #include de tête) n'a d'effet que si le préambule
+        # est construit dès le premier parsing
+        options |= (clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+                    | PARSE_LIMIT_SKIP_FUNCTION_BODIES_TO_PREAMBLE
+                    | clang.cindex.TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+                    | PARSE_CREATE_PREAMBLE_ON_FIRST_PARSE)
+    if incomplete:
+        options |= clang.cindex.TranslationUnit.PARSE_INCOMPLETE
+    return options
+
+def extraction_profile(mode: str = FULL_MODE, incomplete: bool = False, identity: str = NAME_IDENTITY) -> str:
+    """
+    Identifiant du mode, des options de parsing et de l'identité des nœuds, enregistré dans
+    le cache : un graph produit dans un autre profil n'est pas réutilisable.
+    """
+    return mode + ("+incomplete" if incomplete else "") + ("" if identity == NAME_IDENTITY else f"+{identity}")
+
+def parse_source(source_path: str, include_paths, library_paths, session: AnalysisSession = None) -> clang.cindex.TranslationUnit:
     """
     Parse le fichier source et retourne l'unité de traduction (AST)
+    Sans session fournie, l'index de la session du thread courant est réutilisé.
     """
     includes = ['-I' + path for path in include_paths]
 
@@ -16,8 +61,9 @@ def parse_source(source_path: str, include_paths, library_paths) -> clang.cindex
 
     logging.info(f"args={args}")
 
-    index = clang.cindex.Index.create()
-    translation_unit = index.parse(source_path, args = args)
+    if session is None:
+        session = get_thread_session()
+    translation_unit = session.parse(source_path, args)
     return translation_unit
 
 def get_root_cursor(translation_unit: clang.cindex.TranslationUnit) -> clang.cindex.Cursor:
@@ -26,9 +72,10 @@ def get_root_cursor(translation_unit: clang.cindex.TranslationUnit) -> clang.cin
     """
     return translation_unit.cursor
 
-def parse_source_agrs(source_path: str, list_args) -> clang.cindex.TranslationUnit:
+def parse_source_agrs(source_path: str, list_args, session: AnalysisSession = None) -> clang.cindex.TranslationUnit:
     """
     Parse le fichier source et retourne l'unité de traduction (AST)
+    Sans session fournie, l'index de la session du thread courant est réutilisé.
     """
 
     std_libraries = ["-std=c++11"]
@@ -37,6 +84,7 @@ def parse_source_agrs(source_path: str, list_args) -> clang.cindex.TranslationUn
 
     logging.info(f"args={args}")
 
-    index = clang.cindex.Index.create()
-    translation_unit = index.parse(source_path, args = args)
+    if session is None:
+        session = get_thread_session()
+    translation_unit = session.parse(source_path, args)
     return translation_unit
@@ -0,0 +1,259 @@
+# cache.py
+import hashlib
+import json
+import os
+from typing import Optional
+import clang.cindex
+
+# A incrémenter à chaque changement des règles d'extraction : invalide toutes les entrées du cache
+ANALYZER_VERSION = "2"
+
+MANIFEST_NAME = "ast_cache_manifest.json"
+
+# Options dont l'argument suivant (ou le suffixe collé) est un chemin
+PATH_OPTIONS = ('-I', '-isystem', '-iquote', '-idirafter', '-include', '-imacros')
+
+def hash_file(path: str) -> str:
+    """
+    Retourne le hash sha256 du contenu d'un fichier.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_args(args: list[str], directory: str) -> list[str]:
+    """
+    Rend absolus les chemins relatifs des options d'include pour que deux commandes
+    équivalentes lancées depuis des dossiers différents aient la même clé.
+    """
+    normalized = []
+    expects_path = False
+    for arg in args:
+        if expects_path:
+            normalized.append(os.path.normpath(os.path.join(directory, arg)))
+            expects_path = False
+            continue
+        if arg in PATH_OPTIONS:
+            normalized.append(arg)
+            expects_path = True
+            continue
+        for option in PATH_OPTIONS:
+            if arg.startswith(option) and arg[len(option):] and not arg[len(option):].startswith('-'):
+                arg = option + os.path.normpath(os.path.join(directory, arg[len(option):]))
+                break
+        normalized.append(arg)
+    return normalized
+
+class AnalysisCache:
+    """
+    Manifeste persistant des unités de traduction déjà analysées.
+
+    Chaque entrée est indexée par le fichier .graphml produit et mémorise le hash du source,
+    les arguments normalisés, le hash de chaque header inclus et la version de l'analyseur.
+    Si rien n'a changé depuis la dernière exécution, le .graphml existant est réutilisé.
+    Les hash des fichiers sont mémorisés avec leur (mtime, taille) pour ne relire que les
+    fichiers modifiés d'une exécution à l'autre.
+    """
+
+    def __init__(self, manifest_path: str, entries: Optional[dict] = None, files: Optional[dict] = None):
+        self.manifest_path = manifest_path
+        self.entries = entries if entries is not None else {}
+        self.files = files if files is not None else {}
+        self.updates = {}
+        self.file_updates = {}
+
+    @classmethod
+    def load(cls, manifest_path: str) -> "AnalysisCache":
+        """
+        Charge le manifeste s'il existe ; un manifeste absent ou illisible donne un cache vide.
+        """
+        try:
+            with open(manifest_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(manifest_path)
+        if data.get("analyzer_version") != ANALYZER_VERSION:
+            return cls(manifest_path)
+        return cls(manifest_path, data.get("entries", {}), data.get("files", {}))
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """
+        Retourne le hash du fichier, en le recalculant seulement si sa date ou sa taille a changé.
+        Retourne None si le fichier n'existe plus ou n'est pas lisible.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        known = self.files.get(path)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        try:
+            digest = hash_file(path)
+        except OSError:
+            return None
+        self.files[path] = self.file_updates[path] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def lookup(self, source_file: str, args: list[str], directory: str, output_path: str, profile: str = "full") -> bool:
+        """
+        Retourne True si output_path est à jour pour cette commande de compilation.
+        profile identifie le mode d'extraction (voir ast_parser.extraction_profile).
+        """
+        entry = self.entries.get(output_path)
+        if entry is None or not os.path.exists(output_path):
+            return False
+        if entry["analyzer_version"] != ANALYZER_VERSION or entry["args"] != normalize_args(args, directory):
+            return False
+        if entry.get("profile", "full") != profile:
+            return False
+        source_path = os.path.normpath(os.path.join(directory, source_file))
+        if entry["source"] != source_path or entry["source_hash"] != self.file_hash(source_path):
+            return False
+        for include, digest in entry["includes"].items():
+            if self.file_hash(include) != digest:
+                return False
+        return True
+
+    def record(self, source_file: str, args: list[str], directory: str, output_path: str, tu: clang.cindex.TranslationUnit, profile: str = "full") -> None:
+        """
+        Enregistre l'entrée d'une unité de traduction qui vient d'être analysée.
+        """
+        source_path = os.path.normpath(os.path.join(directory, source_file))
+        includes = {}
+        for inclusion in tu.get_includes():
+            include = os.path.normpath(os.path.join(directory, inclusion.include.name))
+            if include not in includes:
+                includes[include] = self.file_hash(include)
+        entry = {
+            "source": source_path,
+            "source_hash": self.file_hash(source_path),
+            "args": normalize_args(args, directory),
+            "includes": includes,
+            "profile": profile,
+            "analyzer_version": ANALYZER_VERSION,
+        }
+        self.entries[output_path] = self.updates[output_path] = entry
+
+    def take_updates(self) -> tuple[dict, dict]:
+        """
+        Retourne puis oublie les entrées modifiées depuis le dernier appel (pour les renvoyer
+        d'un worker vers le processus principal).
+        """
+        updates, file_updates = self.updates, self.file_updates
+        self.updates, self.file_updates = {}, {}
+        return updates, file_updates
+
+    def merge(self, updates: dict, file_updates: dict) -> None:
+        self.entries.update(updates)
+        self.files.update(file_updates)
+
+    def save(self) -> None:
+        """
+        Écrit le manifeste de façon atomique (fichier temporaire puis renommage).
+        """
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"analyzer_version": ANALYZER_VERSION, "entries": self.entries, "files": self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+# Dossier des unités de traduction sérialisées (sous le dossier d'export)
+AST_CACHE_DIR_NAME = "ast_cache"
+
+def _file_stamp(path: str) -> Optional[list]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+class ASTCache:
+    """
+    Unités de traduction sérialisées (TranslationUnit.save), pour reconstruire les graphes
+    sans reparser quand seules les règles d'extraction ont changé.
+
+    Chaque unité est rangée sous la clé de sa commande (source, arguments normalisés, options
+    de parsing et libclang utilisée) : <clé>.ast, et <clé>.json qui mémorise (mtime, taille,
+    hash) du source et de chaque header inclus. Une unité n'est rechargée que si aucun de ces
+    fichiers n'a changé. Chaque unité a ses propres fichiers, écrits de façon atomique : les
+    workers partagent le dossier sans manifeste commun. Indépendant d'ANALYZER_VERSION.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def key(self, source_file: str, args: list[str], directory: str, options: int = 0) -> str:
+        source_path = os.path.normpath(os.path.join(directory, source_file))
+        # Un AST n'est relu que par la version de libclang qui l'a écrit
+        library = os.path.realpath(getattr(clang.cindex.conf.lib, "_name", "") or "")
+        identity = json.dumps([source_path, normalize_args(args, directory), options, library])
+        return hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+    def paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.directory, key)
+        return base + ".ast", base + ".json"
+
+    def is_valid(self, key: str) -> bool:
+        """
+        Vrai si l'unité de traduction de la clé est enregistrée et que ni son source ni ses
+        headers n'ont changé depuis (hash recalculé seulement si la date ou la taille diffère).
+        """
+        ast_path, meta_path = self.paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            return False
+        if not os.path.exists(ast_path):
+            return False
+        for path, (mtime, size, digest) in files.items():
+            stamp = _file_stamp(path)
+            if stamp is None:
+                return False
+            if stamp != [mtime, size]:
+                try:
+                    if hash_file(path) != digest:
+                        return False
+                except OSError:
+                    return False
+        return True
+
+    def load(self, key: str, session) -> Optional[clang.cindex.TranslationUnit]:
+        """
+        Recharge l'unité de traduction de la clé avec l'Index de la session (AnalysisSession),
+        ou retourne None si elle est absente, périmée ou refusée par libclang.
+        """
+        if not self.is_valid(key):
+            return None
+        try:
+            return session.read(self.paths(key)[0])
+        except clang.cindex.TranslationUnitLoadError:
+            return None
+
+    def store(self, key: str, tu: clang.cindex.TranslationUnit, source_file: str, directory: str) -> None:
+        """
+        Sérialise l'unité de traduction avec l'état de son source et de ses headers.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        files = {}
+        for path in [source_file] + [inclusion.include.name for inclusion in tu.get_includes()]:
+            path = os.path.normpath(os.path.join(directory, path))
+            if path in files:
+                continue
+            stamp = _file_stamp(path)
+            if stamp is None:
+                continue
+            files[path] = stamp + [hash_file(path)]
+        ast_path, meta_path = self.paths(key)
+        # Écritures atomiques, l'état des fichiers en dernier : un lecteur concurrent ne voit
+        # jamais un AST associé à l'état d'une autre version
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        tu.save(ast_path + ".tmp")
+        os.replace(ast_path + ".tmp", ast_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"source": os.path.normpath(os.path.join(directory, source_file)), "files": files}, f)
+        os.replace(meta_path + ".tmp", meta_path)
@@ -1,6 +1,8 @@
 # debug_util.py
 import logging
-from .node_filters import is_allowed_node
+from .node_filters import FileFilter
+from .ontologie import resolve_reference
+from .flat_ast import FlatAST, NO_INDEX
 
 def setup_logging(level=logging.DEBUG):
     logging.basicConfig(
@@ -9,29 +11,29 @@ def setup_logging(level=logging.DEBUG):
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
-def print_ast(node, ALLOWED_PATHS, depth=0, file=None):
+def print_ast(node, ALLOWED_PATHS, depth=0, file=None, working_dir=None, file_filter=None, resolutions=None):
     """
     Parcourt récursivement l'AST et écrit chaque nœud dans le fichier passé en argument.
+    file_filter est le FileFilter de l'unité de traduction (construit depuis ALLOWED_PATHS s'il
+    n'est pas fourni) ; resolutions est le cache de résolution des références partagé
+    avec la construction du graph.
     """
+    if file_filter is None:
+        file_filter = FileFilter(ALLOWED_PATHS, working_dir)
     indent = "  " * depth
     # Récupérer la ligne (si disponible)
     location = node.location if node.location else "N/A"
 
     new_node = "None"
 
-    if node.referenced: 
-            new_node = node.referenced.get_definition()
-            if new_node is None:
-                try :
-                    new_node = node.referenced.get_declaration()
-                except : 
-                    pass
     ref = ""
+    referenced = node.referenced
+    if referenced: 
+            resolution = resolve_reference(referenced, resolutions)
+            new_node = resolution.definition
+            if new_node is not None and not resolution.declaration_only:
+                ref = new_node.kind
     args = ""
-    try:
-        ref = node.referenced.get_definition().kind
-    except :
-        pass
 
     try:
         args = node.get_arguments()
@@ -45,8 +47,21 @@ def print_ast(node, ALLOWED_PATHS, depth=0, file=None):
         pass
                 
     # Construire la chaîne à écrire pour ce nœud
-    file.write(f"{indent}Kind: {node.kind} {args} | Is allowed {is_allowed_node(node, ALLOWED_PATHS)} | Spelling: {node.spelling} | Is Ref {ref} {new_node} | Location: {location}\n")
+    file.write(f"{indent}Kind: {node.kind} {args} | Is allowed {file_filter(node)} | Spelling: {node.spelling} | Is Ref {ref} {new_node} | Location: {location}\n")
     
     # Parcourir les enfants du nœud
     for child in node.get_children():
-        print_ast(child, ALLOWED_PATHS, depth + 1, file)
+        print_ast(child, ALLOWED_PATHS, depth + 1, file, working_dir, file_filter, resolutions)
+
+def print_flat_ast(flat: FlatAST, file=None) -> None:
+    """
+    Écrit l'AST capturé, un curseur par ligne indenté selon sa profondeur, sans appel à
+    libclang : genre, spelling, curseur référencé (s'il a été capturé) et localisation.
+    """
+    depths = flat.depths()
+    for i in range(len(flat)):
+        referenced = flat.referenced[i]
+        ref = ""
+        if referenced != NO_INDEX:
+            ref = f"{flat.cursor_kind(referenced)} {flat.spelling_of(referenced)}"
+        file.write(f"{'  ' * depths[i]}Kind: {flat.cursor_kind(i)} | Spelling: {flat.spelling_of(i)} | Is Ref {ref} | Location: {flat.file_of(i)}:{flat.line[i]}:{flat.column[i]}\n")
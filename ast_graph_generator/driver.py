@@ -0,0 +1,404 @@
+# driver.py
+import os
+import queue
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from typing import Optional
+from clang.cindex import CompilationDatabase
+from tqdm import tqdm
+from .lib import create_ast_graph_from_file_with_args
+from .exporter import graph_file_extension, SqliteGraphStore, GRAPHML_FORMAT, SQLITE_FORMAT
+from .cache import AnalysisCache, ASTCache
+from .instrumentation import measure_stage
+from .session import AnalysisSession, get_thread_session
+from .pch import PchGroup, group_jobs_for_pch, build_group_pch
+from .ast_parser import extraction_profile, FULL_MODE
+from .ontologie import NAME_IDENTITY
+
+@dataclass
+class CompileJob:
+    """
+    Une commande de compilation à analyser (une unité de traduction).
+    """
+    source_file: str
+    args: list[str]
+    directory: str
+    export_dir: str
+    out_name: str
+    pch: Optional[str] = None
+    mode: str = FULL_MODE
+    incomplete: bool = False
+    identity: str = NAME_IDENTITY
+    compress: bool = False
+    export_format: str = GRAPHML_FORMAT
+    # Dossier du cache d'AST (voir cache.ASTCache) ; reextract reconstruit le graph même s'il est à jour
+    ast_cache_dir: Optional[str] = None
+    reextract: bool = False
+
+    @property
+    def graph_file_path(self) -> str:
+        return os.path.join(self.export_dir, self.out_name + graph_file_extension(self.compress))
+
+    @property
+    def profile(self) -> str:
+        return extraction_profile(self.mode, self.incomplete, self.identity)
+
+@dataclass
+class JobResult:
+    """
+    Résultat d'une commande renvoyé par un worker au processus principal.
+    """
+    source_file: str
+    graph_file_path: str = ""
+    error: Optional[str] = None
+    cached: bool = False
+    parse_time: Optional[float] = None
+    # Unité de traduction rechargée depuis le cache d'AST plutôt que parsée
+    ast_cached: bool = False
+    # Temps par étape et compteurs de l'unité (voir instrumentation)
+    metrics: dict = field(default_factory=dict)
+    used_pch: bool = False
+    cache_updates: tuple = field(default_factory=lambda: ({}, {}))
+    # Nœuds et arêtes du graph, renvoyés au processus principal pour l'export SQLite
+    graph_records: Optional[tuple] = None
+
+def find_compile_commands(directory):
+    result = []
+    for root, dirs, files in os.walk(directory):
+        if 'compile_commands.json' in files:
+            result.append(os.path.join(root, 'compile_commands.json'))
+    return result
+
+def parse_args(args):
+    filtered_args = []
+    args = args[4:]
+    args = args[:-1]
+    for arg in args:
+        if not (arg.startswith('-T') or arg.startswith('-c') or arg.startswith('-o') or arg == '-fPIC'): # or arg.startswith('-W')
+            filtered_args.append(arg)
+    return filtered_args
+
+def collect_compile_jobs(list_json: list[str], talios_path: str, export_root_path: str, mode: str = FULL_MODE, incomplete: bool = False, identity: str = NAME_IDENTITY, compress: bool = False, export_format: str = GRAPHML_FORMAT, ast_cache_dir: Optional[str] = None, reextract: bool = False) -> list[CompileJob]:
+    """
+    Lit tous les compile_commands.json et retourne la liste des commandes à analyser.
+    Un fichier illisible est signalé puis ignoré, comme une commande invalide.
+    mode, incomplete et identity sont le mode d'extraction, les options de parsing et l'identité
+    des nœuds de toutes les commandes ; compress écrit des graphes GraphML compressés en gzip.
+    export_format est le format d'export des graphes (voir exporter.EXPORT_FORMATS).
+    ast_cache_dir est le dossier du cache d'AST ; reextract reconstruit tous les graphes depuis
+    ce cache, sans réutiliser les graphes à jour.
+    """
+    jobs = []
+    for compile_commands_json in list_json:
+        try:
+            compile_commands_json_dir = os.path.dirname(compile_commands_json)
+            cdb = CompilationDatabase.fromDirectory(compile_commands_json_dir)
+            compile_cmds = cdb.getAllCompileCommands()
+
+            if compile_cmds is None:
+                print(f"{compile_commands_json} est vide")
+                continue
+
+            for comp in compile_cmds:
+                try:
+                    args = [arg for arg in comp.arguments]
+                    args = parse_args(args)
+                    source_file = comp.filename
+                    cmd_exec_folder = comp.directory
+
+                    rel_cmd_exec_folder = os.path.relpath(cmd_exec_folder, talios_path).replace("/", "#").replace("\\", "#")
+
+                    export_path = os.path.join(export_root_path, rel_cmd_exec_folder)
+                    export_dir = os.path.join(source_file.replace("/", "#").replace("\\", "#"), export_path)
+
+                    abs_path = cmd_exec_folder + source_file
+                    rel_path_cpp_file = os.path.relpath(abs_path, talios_path)
+                    out_name = rel_path_cpp_file.replace("/", "#").replace("\\", "#")
+
+                    jobs.append(CompileJob(source_file, args, cmd_exec_folder, export_dir, out_name, mode=mode, incomplete=incomplete, identity=identity, compress=compress, export_format=export_format, ast_cache_dir=ast_cache_dir, reextract=reextract))
+                except Exception as e:
+                    print(f"Erreur lors du traitement des commandes de compilation pour {compile_commands_json}: {e}")
+                    continue  # Continue with the next compile command despite errors
+        except Exception as e:
+            print(f"Erreur lors de la tentative de lecture {compile_commands_json}: {e}")
+            continue  # Continue with the next compile_commands.json file despite errors
+    return jobs
+
+def process_compile_job(job: CompileJob, session: Optional[AnalysisSession] = None, cache: Optional[AnalysisCache] = None) -> JobResult:
+    """
+    Analyse une commande de compilation. Une unité de traduction en échec ne doit pas
+    interrompre les autres : l'erreur est retournée dans le résultat.
+    Si le cache indique que le graph existant est à jour, le parsing est évité (sauf en mode
+    reextract). Avec un cache d'AST, l'unité de traduction y est rechargée si elle est à jour.
+    Si le PCH du job est refusé par libclang, l'unité est reparsée sans PCH.
+    """
+    result = JobResult(job.source_file, job.graph_file_path)
+    try:
+        if cache is not None and not job.reextract:
+            with measure_stage(result.metrics, "lookup"):
+                up_to_date = cache.lookup(job.source_file, job.args, job.directory, job.graph_file_path, job.profile)
+            if up_to_date:
+                result.cached = True
+                return result
+
+        if not os.path.isdir(job.directory):
+            result.error = f"Le dossier d'exécution {job.directory} n'existe pas"
+            return result
+
+        ast_cache = ASTCache(job.ast_cache_dir) if job.ast_cache_dir is not None else None
+        pch = job.pch
+        while True:
+            # Les mesures d'un essai avec un PCH refusé ne sont pas gardées
+            timings = dict(result.metrics)
+            graph_records = [] if job.export_format == SQLITE_FORMAT else None
+            try:
+                create_ast_graph_from_file_with_args(job.source_file, job.args, job.export_dir, out_name=job.out_name, session=session, cache=cache, working_dir=job.directory, pch=pch, timings=timings, mode=job.mode, incomplete=job.incomplete, identity=job.identity, compress=job.compress, graph_records=graph_records, ast_cache=ast_cache)
+                result.used_pch = pch is not None
+                if graph_records is not None:
+                    result.graph_records = tuple(graph_records)
+            except Exception as e:
+                if pch is not None:
+                    pch = None
+                    continue
+                result.error = f"Erreur lors de la création du graphe AST pour le fichier {job.source_file}: {e}"
+            result.metrics = timings
+            result.parse_time = timings.get("parse")
+            result.ast_cached = timings.get("ast_cache_hits", 0) > 0
+            return result
+    finally:
+        if cache is not None:
+            result.cache_updates = cache.take_updates()
+
+def _build_pch(group_key: str, includes: list[str], args: list[str], directory: str, pch_dir: str, session: AnalysisSession) -> tuple:
+    try:
+        pch_path, build_time = build_group_pch(group_key, includes, args, directory, pch_dir, session)
+        return pch_path, build_time, None
+    except Exception as e:
+        return None, None, str(e)
+
+# Options de session et cache propres à chaque processus worker, fixés par _init_worker
+_worker_session_options = {}
+_worker_cache = None
+
+def _init_worker(session_options: dict, cache: Optional[AnalysisCache] = None):
+    global _worker_session_options, _worker_cache
+    _worker_session_options = session_options
+    _worker_cache = cache
+    get_thread_session(**session_options)
+
+def _run_worker_job(job: CompileJob) -> JobResult:
+    return process_compile_job(job, session=get_thread_session(**_worker_session_options), cache=_worker_cache)
+
+def _build_worker_pch(*pch_args) -> tuple:
+    return _build_pch(*pch_args, session=get_thread_session(**_worker_session_options))
+
+def _run_thread_job(job: CompileJob, session_options: dict, cache: Optional[AnalysisCache]) -> JobResult:
+    # Une session par thread du pool (ou celle du thread principal en mode séquentiel)
+    return process_compile_job(job, session=get_thread_session(**session_options), cache=cache)
+
+def _build_thread_pch(*pch_args, session_options: dict) -> tuple:
+    return _build_pch(*pch_args, session=get_thread_session(**session_options))
+
+class _SerialExecutor:
+    """
+    Exécuteur synchrone qui donne au mode séquentiel la même interface qu'un pool.
+    """
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+@dataclass
+class RunSummary:
+    """
+    Résultats d'une exécution complète du driver.
+    """
+    results: list[JobResult]
+    pch_groups: list[PchGroup] = field(default_factory=list)
+
+    @property
+    def failures(self) -> int:
+        return sum(1 for result in self.results if result.error)
+
+    @property
+    def cached(self) -> int:
+        return sum(1 for result in self.results if result.cached)
+
+    @property
+    def ast_cached(self) -> int:
+        return sum(1 for result in self.results if result.ast_cached)
+
+# Nombre de résultats après lequel le manifeste du cache est réécrit en cours d'exécution
+CACHE_SAVE_INTERVAL = 100
+
+# Unités soumises à la fois par worker : si un worker meurt, seules celles-ci sont à rejouer
+IN_FLIGHT_PER_WORKER = 2
+
+def run_compile_jobs(jobs: list[CompileJob], n_jobs: int = 1, cache: Optional[AnalysisCache] = None, use_threads: bool = False, session_options: Optional[dict] = None, pch_dir: Optional[str] = None, store: Optional[SqliteGraphStore] = None) -> RunSummary:
+    """
+    Analyse toutes les commandes, séquentiellement ou réparties sur n_jobs processus
+    (ou n_jobs threads du processus courant si use_threads, libclang relâchant le GIL
+    pendant le parsing). La progression est agrégée dans une seule barre tqdm. Les entrées
+    de cache produites par les workers sont fusionnées ici, seul ce processus écrit le manifeste.
+    session_options sont les paramètres des AnalysisSession créées par chaque worker.
+
+    Si pch_dir est fourni, les commandes aux options identiques qui partagent leurs includes
+    de tête sont regroupées : un PCH est construit par groupe dans pch_dir (en parallèle des
+    unités qui n'en ont pas besoin), puis les autres unités du groupe sont parsées avec.
+
+    Si store est fourni, les graphes renvoyés par les workers (jobs au format SQLite) y sont
+    écrits ici, au fil des résultats : ce processus est le seul écrivain de la base.
+    """
+    if session_options is None:
+        session_options = {}
+    summary = RunSummary([])
+    results = summary.results
+
+    def new_executor(workers: int):
+        if n_jobs <= 1:
+            return _SerialExecutor()
+        if use_threads:
+            return ThreadPoolExecutor(max_workers=workers)
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(session_options, cache))
+    in_process = n_jobs <= 1 or use_threads
+
+    def submit_job(executor, job: CompileJob) -> Future:
+        if in_process:
+            return executor.submit(_run_thread_job, job, session_options, cache)
+        return executor.submit(_run_worker_job, job)
+
+    def submit_pch(executor, group: PchGroup) -> Future:
+        reference = group.jobs[0]
+        pch_args = (group.key, group.includes, reference.args, reference.directory, pch_dir)
+        if in_process:
+            return executor.submit(_build_thread_pch, *pch_args, session_options=session_options)
+        return executor.submit(_build_worker_pch, *pch_args)
+
+    def collect(job: CompileJob, future: Future):
+        try:
+            result = future.result()
+        except Exception as e:
+            # Le worker lui-même a échoué (crash libclang, processus tué...)
+            result = JobResult(job.source_file, job.graph_file_path, error=f"Erreur du worker pour le fichier {job.source_file}: {e}")
+        if store is not None and result.graph_records is not None:
+            try:
+                with measure_stage(result.metrics, "store"):
+                    store.upsert_unit(job.out_name, *result.graph_records, source_file=os.path.join(job.directory, job.source_file))
+            except Exception as e:
+                result.error = f"Erreur lors de l'écriture du graph de {job.source_file} dans {store.database_path}: {e}"
+            # Le graph écrit n'est pas gardé dans le résumé de l'exécution
+            result.graph_records = None
+        results.append(result)
+        if result.error:
+            tqdm.write(result.error)
+        if cache is not None:
+            cache.merge(*result.cache_updates)
+            if len(results) % CACHE_SAVE_INTERVAL == 0:
+                cache.save()
+        progress.update(1)
+
+    def pch_built(group: PchGroup, future: Future) -> list[CompileJob]:
+        try:
+            group.pch_path, group.build_time, group.error = future.result()
+        except Exception as e:
+            group.error = str(e)
+        if group.error:
+            tqdm.write(f"Impossible de construire le PCH du groupe {group.key}: {group.error}")
+        return [replace(job, pch=group.pch_path) for job in group.jobs[1:]]
+
+    if pch_dir is not None:
+        summary.pch_groups = group_jobs_for_pch(jobs)
+    # Toutes les unités d'un groupe sauf sa référence attendent le PCH du groupe
+    waiting_for_pch = {id(job) for group in summary.pch_groups for job in group.jobs[1:]}
+
+    # Un worker qui meurt (crash de libclang, OOM...) casse tout son pool : les unités en cours
+    # sont rejouées une à une dans un pool d'un seul worker (isolation), où celle qui le fait
+    # encore mourir est la seule marquée en échec ; les autres continuent dans un pool neuf.
+    executor = new_executor(n_jobs)
+    isolation = None
+    window = max(n_jobs, 1) * IN_FLIGHT_PER_WORKER
+    # Unités (et PCH) pas encore soumises, unités à rejouer isolément
+    backlog = deque(summary.pch_groups)
+    backlog.extend(job for job in jobs if id(job) not in waiting_for_pch)
+    suspects = deque()
+
+    with tqdm(total=len(jobs), desc="Traitement des commandes de compilation") as progress:
+        try:
+            # Les futures terminées arrivent dans une file, dans leur ordre de fin
+            done = queue.Queue()
+            pending = {}
+
+            def replace_pool(pool):
+                nonlocal executor, isolation
+                pool.shutdown(wait=False)
+                if pool is executor:
+                    executor = new_executor(n_jobs)
+                    return executor
+                isolation = new_executor(1)
+                return isolation
+
+            def track(item, isolated: bool = False):
+                nonlocal isolation
+                if isolated and isolation is None:
+                    isolation = new_executor(1)
+                pool = isolation if isolated else executor
+                submit = submit_pch if isinstance(item, PchGroup) else submit_job
+                try:
+                    future = submit(pool, item)
+                except BrokenProcessPool:
+                    # Le pool a perdu un worker depuis le dernier résultat : ses futures le signaleront
+                    pool = replace_pool(pool)
+                    future = submit(pool, item)
+                pending[future] = (item, pool, isolated)
+                future.add_done_callback(done.put)
+
+            def fill():
+                in_flight = sum(1 for _, _, in_isolation in pending.values() if not in_isolation)
+                for _ in range(min(window - in_flight, len(backlog))):
+                    track(backlog.popleft())
+
+            fill()
+            while pending:
+                future = done.get()
+                item, pool, isolated = pending.pop(future)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    if pool is executor or pool is isolation:
+                        replace_pool(pool)
+                    if not isolated:
+                        # Le worker mort traitait peut-être une autre unité : celle-ci est rejouée seule
+                        suspects.append(item)
+                        if not any(in_isolation for _, _, in_isolation in pending.values()):
+                            track(suspects.popleft(), isolated=True)
+                        fill()
+                        continue
+                    # Seule dans son pool, l'unité a fait mourir le worker : elle est en échec
+                if isinstance(item, PchGroup):
+                    # Les unités du groupe partent dès que son PCH est prêt
+                    backlog.extendleft(reversed(pch_built(item, future)))
+                else:
+                    collect(item, future)
+                if isolated and suspects:
+                    track(suspects.popleft(), isolated=True)
+                fill()
+            return summary
+        finally:
+            for pool in (executor, isolation):
+                if pool is not None:
+                    pool.shutdown()
+            if cache is not None:
+                cache.save()
@@ -1,8 +1,365 @@
 # exporter.py
+import gzip
+import io
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Optional
 import networkx as nx
+from .ontologie import REFERENCE_NODE_TYPES
 
-def export_to_gml(graph: nx.DiGraph, output_file: str) -> None:
-    nx.write_gml(graph, output_file)
+GRAPHML_NAMESPACE = "http://graphml.graphdrawing.org/xmlns"
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+GRAPHML_SCHEMA_LOCATION = f"{GRAPHML_NAMESPACE} {GRAPHML_NAMESPACE}/1.0/graphml.xsd"
 
-def export_to_graphml(graph: nx.DiGraph, output_file: str) -> None:
-    nx.write_graphml(graph, output_file)
+# Types GraphML des attributs, comme networkx les déclare
+GRAPHML_TYPES = {str: "string", int: "long", float: "double", bool: "boolean"}
+
+# Taille du tampon d'écriture des exports
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Formats d'export des graphes d'unités de traduction
+GRAPHML_FORMAT = "graphml"
+SQLITE_FORMAT = "sqlite"
+EXPORT_FORMATS = (GRAPHML_FORMAT, SQLITE_FORMAT)
+
+SQLITE_DATABASE_NAME = "graph.sqlite"
+
+# Nombre d'identifiants de nœuds par requête de lecture de leurs clés
+SQLITE_BATCH_SIZE = 500
+
+def graph_file_extension(compress: bool = False) -> str:
+    """
+    Extension des graphes exportés : les graphes compressés gardent le format GraphML,
+    que nx.read_graphml relit directement d'après le suffixe .gz.
+    """
+    return ".graphml.gz" if compress else ".graphml"
+
+def _escape_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _escape_attribute(text: str) -> str:
+    return (_escape_text(text).replace("\"", "&quot;").replace("\r", "&#13;")
+            .replace("\n", "&#10;").replace("\t", "&#09;"))
+
+@contextmanager
+def open_export(output_file, compress: bool = False):
+    """
+    Ouvre la sortie d'un export en écriture binaire tamponnée : un chemin (compressé en gzip
+    si compress ou si le nom se termine par .gz) ou un fichier binaire déjà ouvert, qui n'est
+    pas fermé.
+    """
+    if isinstance(output_file, (str, os.PathLike)):
+        if compress or os.fspath(output_file).endswith(".gz"):
+            with gzip.open(output_file, "wb") as stream:
+                yield stream
+        else:
+            with open(output_file, "wb", buffering=WRITE_BUFFER_SIZE) as stream:
+                yield stream
+    elif compress:
+        with gzip.GzipFile(fileobj=output_file, mode="wb") as stream:
+            yield stream
+    else:
+        yield output_file
+
+def _graphml_keys(graph: nx.DiGraph) -> list[tuple]:
+    """
+    Premier passage sur les attributs (sans rien construire) : retourne les clés GraphML
+    (id, portée, nom, type, valeur par défaut) dans l'ordre d'attribution de networkx.
+    """
+    keys = {}
+    scopes = [("graph", {}, [{k: v for k, v in graph.graph.items() if k not in ("id", "node_default", "edge_default")}]),
+              ("node", graph.graph.get("node_default", {}), (data for _, data in graph.nodes(data=True))),
+              ("edge", graph.graph.get("edge_default", {}), (data for _, _, data in graph.edges(data=True)))]
+    for scope, default, attribute_dicts in scopes:
+        for data in attribute_dicts:
+            for name, value in data.items():
+                try:
+                    key = (str(name), GRAPHML_TYPES[type(value)], scope)
+                except KeyError:
+                    raise TypeError(f"GraphML does not support type {type(value)} as data values.") from None
+                if key not in keys:
+                    keys[key] = (f"d{len(keys)}", scope, str(name), key[1], default.get(name))
+    return list(keys.values())
+
+def _write_graphml_data(write, key_ids: dict, scope: str, data: dict, indent: str, closing_indent: str) -> None:
+    """
+    Écrit les éléments <data> d'un nœud, d'une arête ou du graph.
+    """
+    items = list(data.items())
+    for i, (name, value) in enumerate(items):
+        text = str(value)
+        key_id = key_ids[(str(name), GRAPHML_TYPES[type(value)], scope)]
+        element = f'<data key="{_escape_attribute(key_id)}">{_escape_text(text)}</data>' if text else f'<data key="{_escape_attribute(key_id)}" />'
+        write(element + (closing_indent if i == len(items) - 1 else indent))
+
+def export_to_gml(graph: nx.DiGraph, output_file, compress: bool = False) -> None:
+    """
+    Écrit le graph au format GML ligne par ligne, comme nx.write_gml.
+    """
+    with open_export(output_file, compress) as stream:
+        for line in nx.generate_gml(graph):
+            stream.write((line + "\n").encode("ascii"))
+
+def export_to_graphml(graph: nx.DiGraph, output_file, compress: bool = False) -> None:
+    """
+    Écrit le graph au format GraphML au fil des nœuds et des arêtes, sans construire l'arbre
+    XML complet en mémoire comme nx.write_graphml : les clés sont déclarées après un premier
+    passage sur les attributs. Le fichier produit est identique octet par octet à celui de
+    nx.write_graphml (écriture ElementTree, indentée).
+    """
+    keys = _graphml_keys(graph)
+    key_ids = {(name, attr_type, scope): key_id for key_id, scope, name, attr_type, _ in keys}
+    graph_data = {k: v for k, v in graph.graph.items() if k not in ("id", "node_default", "edge_default")}
+    graph_id = graph.graph.get("id")
+
+    with open_export(output_file, compress) as stream:
+        text_stream = io.TextIOWrapper(stream, encoding="utf-8", errors="xmlcharrefreplace", newline="", write_through=False)
+        write = text_stream.write
+        write("<?xml version='1.0' encoding='utf-8'?>\n")
+        write(f'<graphml xmlns="{GRAPHML_NAMESPACE}" xmlns:xsi="{XSI_NAMESPACE}" xsi:schemaLocation="{GRAPHML_SCHEMA_LOCATION}">\n  ')
+        # networkx insère chaque nouvelle clé en tête du document
+        for key_id, scope, name, attr_type, default in reversed(keys):
+            key = f'<key id="{key_id}" for="{scope}" attr.name="{_escape_attribute(name)}" attr.type="{attr_type}"'
+            if default is None:
+                write(key + " />\n  ")
+            else:
+                write(key + f">\n    <default>{_escape_text(str(default))}</default>\n  </key>\n  ")
+
+        graph_element = f'<graph edgedefault="{"directed" if graph.is_directed() else "undirected"}"'
+        if graph_id is not None:
+            graph_element += f' id="{_escape_attribute(str(graph_id))}"'
+        children = graph.number_of_nodes() + graph.number_of_edges() + len(graph_data)
+        if not children:
+            write(graph_element + " />\n</graphml>\n")
+            text_stream.flush()
+            text_stream.detach()
+            return
+        write(graph_element + ">\n    ")
+
+        written = 0
+        def element_tail() -> str:
+            nonlocal written
+            written += 1
+            return "\n  " if written == children else "\n    "
+
+        for node, data in graph.nodes(data=True):
+            element = f'<node id="{_escape_attribute(str(node))}"'
+            if data:
+                write(element + ">\n      ")
+                _write_graphml_data(write, key_ids, "node", data, "\n      ", "\n    ")
+                write("</node>" + element_tail())
+            else:
+                write(element + " />" + element_tail())
+        for u, v, data in graph.edges(data=True):
+            element = f'<edge source="{_escape_attribute(str(u))}" target="{_escape_attribute(str(v))}"'
+            if data:
+                write(element + ">\n      ")
+                _write_graphml_data(write, key_ids, "edge", data, "\n      ", "\n    ")
+                write("</edge>" + element_tail())
+            else:
+                write(element + " />" + element_tail())
+        # Les données du graph suivent ses nœuds et arêtes, comme avec networkx
+        if graph_data:
+            _write_graphml_data(write, key_ids, "graph", graph_data, "\n    ", "\n  ")
+        write("</graph>\n</graphml>\n")
+        text_stream.flush()
+        # Le fichier sous-jacent reste ouvert (fermé par open_export, ou par l'appelant)
+        text_stream.detach()
+
+# Tables de la base SQLite : un nœud est partagé par les unités qui le produisent (node_tus,
+# avec les attributs que chacune propose ; ceux de nodes en sont dérivés), une arête est
+# enregistrée pour chaque unité qui la produit. Les arêtes et la provenance
+# référencent les nœuds par leur clé entière, plus compacte à indexer que leur identifiant
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tus (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source_file TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    key INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    label TEXT,
+    declaration_file INTEGER REFERENCES files(id),
+    declaration_file_row INTEGER,
+    declaration_file_column INTEGER,
+    namespace_position TEXT,
+    node_type TEXT,
+    usr TEXT
+);
+CREATE TABLE IF NOT EXISTS node_tus (
+    node INTEGER NOT NULL REFERENCES nodes(key),
+    tu_id INTEGER NOT NULL REFERENCES tus(id),
+    label TEXT,
+    declaration_file INTEGER REFERENCES files(id),
+    declaration_file_row INTEGER,
+    declaration_file_column INTEGER,
+    namespace_position TEXT,
+    node_type TEXT,
+    usr TEXT,
+    PRIMARY KEY (node, tu_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS edges (
+    tu_id INTEGER NOT NULL REFERENCES tus(id),
+    source INTEGER NOT NULL REFERENCES nodes(key),
+    target INTEGER NOT NULL REFERENCES nodes(key),
+    relation TEXT,
+    PRIMARY KEY (tu_id, source, target)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS nodes_namespace_position ON nodes(namespace_position);
+CREATE INDEX IF NOT EXISTS nodes_declaration_file ON nodes(declaration_file);
+CREATE INDEX IF NOT EXISTS node_tus_tu ON node_tus(tu_id);
+CREATE INDEX IF NOT EXISTS edges_relation ON edges(relation);
+CREATE INDEX IF NOT EXISTS edges_source ON edges(source, relation);
+CREATE INDEX IF NOT EXISTS edges_target ON edges(target, relation);
+"""
+
+# Rang des attributs proposés pour un nœud (voir ontologie.replaces_attributes) : référence,
+# déclaration, déclaration d'un .cpp. Un nœud garde les attributs de rang le plus élevé parmi
+# ceux des unités qui le produisent ; entre attributs de même rang, l'ordre fixe des valeurs
+# départage, sans dépendre de l'ordre dans lequel les unités ont été écrites.
+_REFERENCE_TYPES_SQL = ", ".join(f"'{node_type}'" for node_type in REFERENCE_NODE_TYPES)
+_NODE_RANK_SQL = (f"CASE WHEN {{table}}.node_type IN ({_REFERENCE_TYPES_SQL}) THEN 0 "
+                  f"WHEN (SELECT substr(path, -4) FROM files WHERE id = {{table}}.declaration_file) = '.cpp' THEN 2 ELSE 1 END")
+
+_NODE_ATTRIBUTES_SQL = "label, declaration_file, declaration_file_row, declaration_file_column, namespace_position, node_type, usr"
+
+_REFRESH_NODES_SQL = f"""
+UPDATE nodes SET ({_NODE_ATTRIBUTES_SQL}) = (
+    SELECT {_NODE_ATTRIBUTES_SQL} FROM node_tus WHERE node_tus.node = nodes.key
+    ORDER BY {_NODE_RANK_SQL.format(table="node_tus")} DESC, (SELECT path FROM files WHERE id = node_tus.declaration_file),
+        declaration_file_row, declaration_file_column, namespace_position, label, node_type, usr
+    LIMIT 1)
+WHERE key IN ({{keys}})
+"""
+
+class SqliteGraphStore:
+    """
+    Base SQLite des graphes d'unités de traduction, interrogeable sans charger les graphes.
+
+    Chaque unité est écrite (ou réécrite) par upsert_unit en une transaction : ses anciennes
+    lignes sont retirées puis ses nœuds et arêtes insérés par lots (executemany), et les
+    attributs des nœuds qu'elle produisait ou produit sont redérivés de node_tus. SQLite
+    n'acceptant qu'un écrivain à la fois, un seul processus doit écrire dans la base : le
+    driver y écrit depuis le processus principal les graphes renvoyés par ses workers. La
+    base est en mode WAL : des lecteurs peuvent l'interroger pendant l'écriture.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        os.makedirs(os.path.dirname(database_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(database_path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SQLITE_SCHEMA)
+        # Identifiants des fichiers déjà connus (seul écrivain, le cache reste exact)
+        self.file_ids = {path: file_id for file_id, path in self.connection.execute("SELECT id, path FROM files")}
+
+    def _file_id(self, path) -> Optional[int]:
+        if path is None:
+            return None
+        path = str(path)
+        file_id = self.file_ids.get(path)
+        if file_id is None:
+            file_id = self.file_ids[path] = self.connection.execute("INSERT INTO files (path) VALUES (?)", (path,)).lastrowid
+        return file_id
+
+    def _unit_id(self, unit: str) -> Optional[int]:
+        row = self.connection.execute("SELECT id FROM tus WHERE name = ?", (unit,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _node_keys(self, node_ids: list) -> dict:
+        # Clés des nœuds par lots, sous la limite du nombre de paramètres d'une requête SQLite
+        keys = {}
+        for start in range(0, len(node_ids), SQLITE_BATCH_SIZE):
+            batch = node_ids[start:start + SQLITE_BATCH_SIZE]
+            keys.update(self.connection.execute(f"SELECT id, key FROM nodes WHERE id IN ({', '.join('?' * len(batch))})", batch))
+        return keys
+
+    def _delete_unit_rows(self, tu_id: int) -> list:
+        # Retourne les clés des nœuds que l'unité produisait, dont les attributs sont à redériver
+        self.connection.execute("DELETE FROM edges WHERE tu_id = ?", (tu_id,))
+        touched = [key for key, in self.connection.execute("SELECT node FROM node_tus WHERE tu_id = ?", (tu_id,))]
+        self.connection.execute("DELETE FROM node_tus WHERE tu_id = ?", (tu_id,))
+        return touched
+
+    def _refresh_nodes(self, keys: list) -> None:
+        """
+        Redérive les attributs des nœuds keys de ceux que proposent les unités qui les
+        produisent encore ; les nœuds qu'aucune unité ne produit plus disparaissent.
+        """
+        for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[start:start + SQLITE_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            self.connection.execute(f"DELETE FROM nodes WHERE key IN ({placeholders}) AND NOT EXISTS (SELECT 1 FROM node_tus WHERE node = nodes.key)", batch)
+            self.connection.execute(_REFRESH_NODES_SQL.format(keys=placeholders), batch)
+
+    def upsert_unit(self, unit: str, nodes: list, edges: list, source_file: Optional[str] = None) -> None:
+        """
+        Écrit le graph d'une unité de traduction (nœuds (id, attributs) et arêtes (u, v,
+        attributs)), en remplaçant ce qu'elle avait écrit précédemment.
+        """
+        with self.connection:
+            tu_id = self._unit_id(unit)
+            touched = []
+            if tu_id is None:
+                tu_id = self.connection.execute("INSERT INTO tus (name, source_file) VALUES (?, ?)", (unit, source_file)).lastrowid
+            else:
+                self.connection.execute("UPDATE tus SET source_file = ? WHERE id = ?", (source_file, tu_id))
+                touched = self._delete_unit_rows(tu_id)
+            self.connection.executemany("INSERT OR IGNORE INTO nodes (id) VALUES (?)", [(node,) for node, _ in nodes])
+            keys = self._node_keys([node for node, _ in nodes])
+            self.connection.executemany(f"INSERT OR IGNORE INTO node_tus (node, tu_id, {_NODE_ATTRIBUTES_SQL}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (keys[node], tu_id, data.get("label"), self._file_id(data.get("declaration_file")), data.get("declaration_file_row"),
+                 data.get("declaration_file_column"), data.get("namespace_position"), data.get("node_type"), data.get("usr"))
+                for node, data in nodes])
+            self.connection.executemany("INSERT OR IGNORE INTO edges (tu_id, source, target, relation) VALUES (?, ?, ?, ?)",
+                                        [(tu_id, keys[u], keys[v], data.get("relation")) for u, v, data in edges])
+            self._refresh_nodes(list(set(touched).union(keys.values())))
+
+    def remove_unit(self, unit: str) -> None:
+        """
+        Retire une unité de traduction et tout ce qu'elle seule avait écrit ; les nœuds
+        partagés reprennent les attributs des unités restantes.
+        """
+        with self.connection:
+            tu_id = self._unit_id(unit)
+            if tu_id is not None:
+                self._refresh_nodes(self._delete_unit_rows(tu_id))
+                self.connection.execute("DELETE FROM tus WHERE id = ?", (tu_id,))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+def export_to_sqlite(graph: nx.DiGraph, database_path: str, unit: str, source_file: Optional[str] = None) -> None:
+    """
+    Écrit (ou réécrit) le graph de l'unité de traduction unit dans la base SQLite database_path.
+    """
+    with SqliteGraphStore(database_path) as store:
+        store.upsert_unit(unit, list(graph.nodes(data=True)), list(graph.edges(data=True)), source_file)
+
+def open_in_directory(directory: str, file_name: str, mode: str = "wb"):
+    """
+    Ouvre file_name relativement à directory sans changer le répertoire courant du processus,
+    pour les chemins complets trop longs pour être ouverts directement.
+    """
+    if os.open in os.supports_dir_fd:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            return open(file_name, mode, opener=lambda path, flags: os.open(path, flags, 0o666, dir_fd=dir_fd))
+        finally:
+            os.close(dir_fd)
+    # Windows : le préfixe \\?\ lève la limite de longueur des chemins
+    return open("\\\\?\\" + os.path.abspath(os.path.join(directory, file_name)), mode)
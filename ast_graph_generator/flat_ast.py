@@ -0,0 +1,271 @@
+# flat_ast.py
+import ctypes
+from array import array
+from typing import Optional
+import clang.cindex
+from clang.cindex import conf, callbacks
+from .node_filters import FileFilter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Valeurs de retour du visiteur clang_visitChildren (CXChildVisitResult)
+VISIT_CONTINUE = 1
+VISIT_RECURSE = 2
+
+NO_INDEX = -1
+
+CALL_EXPR = clang.cindex.CursorKind.CALL_EXPR.value
+MEMBER_REF_EXPR = clang.cindex.CursorKind.MEMBER_REF_EXPR.value
+DECL_REF_EXPR = clang.cindex.CursorKind.DECL_REF_EXPR.value
+
+class FlatAST:
+    """
+    AST d'une unité de traduction capturé en colonnes : le curseur i est décrit par kind[i]
+    (CursorKind), parent[i] (indice de son parent, NO_INDEX pour la racine), file[i] (indice
+    dans files, NO_INDEX sans fichier), line[i], column[i], spelling[i] (indice dans
+    spellings) et referenced[i] (indice du curseur référencé s'il a été capturé, sinon
+    NO_INDEX). Les curseurs sont rangés dans l'ordre d'un parcours en profondeur préfixe.
+    Seuls les curseurs des fichiers autorisés sont capturés (un curseur refusé l'est avec
+    tout son sous-arbre). cursors[i] garde le curseur libclang des seuls genres demandés à
+    la capture (None pour les autres), pour les entités qui en lisent plus que ces colonnes.
+    scopes[i] est, pour une instruction ou expression gardée, son parent s'il est une
+    déclaration (None sinon) : le parent sémantique que lui donnerait Cursor.get_children.
+    """
+
+    def __init__(self):
+        self.kind = array("i")
+        self.parent = array("i")
+        self.file = array("i")
+        self.line = array("i")
+        self.column = array("i")
+        self.spelling = array("i")
+        self.referenced = array("i")
+        self.files = []
+        self.spellings = []
+        self.cursors = []
+        self.scopes = {}
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def cursor_kind(self, i: int) -> clang.cindex.CursorKind:
+        return clang.cindex.CursorKind.from_id(self.kind[i])
+
+    def spelling_of(self, i: int) -> str:
+        return self.spellings[self.spelling[i]]
+
+    def file_of(self, i: int) -> Optional[str]:
+        file = self.file[i]
+        return self.files[file] if file != NO_INDEX else None
+
+    def depths(self) -> array:
+        # Le parent d'un curseur le précède toujours
+        depth = array("i", [0]) * len(self)
+        for i in range(1, len(self)):
+            depth[i] = depth[self.parent[i]] + 1
+        return depth
+
+    def _columns(self, *names) -> tuple:
+        # Vues NumPy (sans copie) sur les colonnes
+        return tuple(numpy.frombuffer(getattr(self, name), dtype=numpy.intc) for name in names)
+
+    def indices_of_kinds(self, kind_ids) -> list[int]:
+        """
+        Indices, dans l'ordre, des curseurs dont le genre est dans kind_ids.
+        """
+        kind_ids = set(kind_ids)
+        if numpy is None or not len(self):
+            return [i for i, kind in enumerate(self.kind) if kind in kind_ids]
+        kind, = self._columns("kind")
+        return numpy.flatnonzero(numpy.isin(kind, list(kind_ids))).tolist()
+
+    def nearest_ancestors(self, kind_ids) -> list[int]:
+        """
+        Pour chaque curseur, indice de son plus proche ancêtre strict dont le genre est dans
+        kind_ids, la racine comptant comme telle (NO_INDEX pour la racine). Avec NumPy, calculé
+        pour tous les curseurs à la fois par sauts de pointeurs (log2 de la profondeur passes).
+        """
+        kind_ids = set(kind_ids)
+        if numpy is None or len(self) < 2:
+            owner = [0] * len(self)
+            for i in range(1, len(self)):
+                owner[i] = i if self.kind[i] in kind_ids else owner[self.parent[i]]
+            return [NO_INDEX] + [owner[self.parent[i]] for i in range(1, len(self))]
+
+        kind, parent = self._columns("kind", "parent")
+        indices = numpy.arange(len(self), dtype=numpy.intc)
+        # owner[i] : i s'il est du genre cherché, sinon un ancêtre, jusqu'au point fixe
+        owner = numpy.where(numpy.isin(kind, list(kind_ids)), indices, parent)
+        owner[0] = 0
+        while True:
+            jumped = owner[owner]
+            if numpy.array_equal(jumped, owner):
+                break
+            owner = jumped
+        nearest = owner[parent]
+        nearest[0] = NO_INDEX
+        return nearest.tolist()
+
+    def class_function_calls(self) -> set:
+        """
+        Indices des CALL_EXPR qui ont un enfant MEMBER_REF_EXPR lui-même parent d'un
+        DECL_REF_EXPR (voir node_filters.is_class_function_call).
+        """
+        if numpy is not None and len(self):
+            kind, parent = self._columns("kind", "parent")
+            # La racine n'est ni une expression ni son propre parent : son indice (0) remplace NO_INDEX
+            parent = numpy.maximum(parent, 0)
+            members = parent[kind == DECL_REF_EXPR]
+            members = members[kind[members] == MEMBER_REF_EXPR]
+            calls = parent[members]
+            return set(calls[kind[calls] == CALL_EXPR].tolist())
+
+        calls = set()
+        kind, parent = self.kind, self.parent
+        for i in range(len(self)):
+            if kind[i] == DECL_REF_EXPR:
+                member = parent[i]
+                if member != NO_INDEX and kind[member] == MEMBER_REF_EXPR:
+                    call = parent[member]
+                    if call != NO_INDEX and kind[call] == CALL_EXPR:
+                        calls.add(call)
+        return calls
+
+# Version des bindings Python de libclang dont _adopt_cursor reproduit le comportement
+# (vérifiée par test_graph_buildder.TestFlatAST.test_adopted_cursor_matches_get_children)
+BINDINGS_VERSION = "18.1"
+
+def _adopt_cursor(cursor: clang.cindex.Cursor, translation_unit: clang.cindex.TranslationUnit) -> clang.cindex.Cursor:
+    """
+    Rattache à son unité de traduction un curseur reçu par un visiteur clang_visitChildren,
+    comme le fait le visiteur de Cursor.get_children (child._tu = self._tu) : les curseurs
+    renvoyés par ses méthodes (referenced, semantic_parent, get_children...) la référencent
+    alors, et elle reste vivante tant qu'un de ses curseurs l'est. Seul endroit où la capture
+    écrit dans un Cursor.
+    """
+    cursor._tu = translation_unit
+    return cursor
+
+def _cursor_key(cursor: clang.cindex.Cursor) -> tuple:
+    # Une déclaration est identifiée par son genre et son pointeur Decl (data[0]) : même
+    # valeur pour le curseur visité et pour les curseurs qui la référencent
+    return cursor._kind_id, cursor.data[0]
+
+def capture_flat_ast(root: clang.cindex.Cursor, file_filter: FileFilter, keep_kinds=(), source_file: Optional[str] = None) -> FlatAST:
+    """
+    Capture l'AST sous root en un seul parcours clang_visitChildren récursif : pour chaque
+    curseur autorisé par file_filter, le genre, le parent, la localisation (un seul appel par
+    curseur), le spelling (interné) et, pour les références et expressions, le curseur
+    référencé. Le verdict du filtre, le nom et le caractère système de chaque fichier ne sont
+    calculés qu'une fois par fichier. Les curseurs des genres keep_kinds sont gardés, avec
+    pour les instructions et expressions leur portée (FlatAST.scopes).
+    source_file est le nom gardé pour la racine à la place de son spelling (le source tel que
+    nommé par la commande de compilation ; une unité rechargée le nomme par son chemin absolu).
+    """
+    flat = FlatAST()
+    keep = {kind.value for kind in keep_kinds}
+    kind_column, parent_column, file_column = flat.kind, flat.parent, flat.file
+    line_column, column_column, spelling_column, referenced_column = flat.line, flat.column, flat.spelling, flat.referenced
+    cursors = flat.cursors
+    spelling_ids = {}
+    # Pointeur CXFile -> (indice dans files, verdict du filtre)
+    file_ids = {}
+    # Curseur visité -> indice (parents), déclaration -> indice (références)
+    positions = {}
+    declarations = {}
+    # Références à une déclaration pas encore visitée (méthode déclarée plus loin dans sa classe)
+    pending = []
+    # Genre -> (curseur référencé lu, déclaration référençable, instruction ou expression)
+    kind_roles = {}
+    translation_unit = root.translation_unit
+    get_location = conf.lib.clang_getCursorLocation
+    get_spelling = conf.lib.clang_getCursorSpelling
+    # Sans la vérification du curseur nul de Cursor.from_result : un curseur nul n'est
+    # jamais une déclaration capturée
+    get_referenced = conf.lib["clang_getCursorReferenced"]
+    get_referenced.argtypes = [clang.cindex.Cursor]
+    get_referenced.restype = clang.cindex.Cursor
+
+    def roles(kind_id: int) -> tuple:
+        role = kind_roles.get(kind_id)
+        if role is None:
+            kind = clang.cindex.CursorKind.from_id(kind_id)
+            role = kind_roles[kind_id] = (kind.is_reference() or kind.is_expression(), kind.is_declaration(),
+                                          kind.is_statement() or kind.is_expression())
+        return role
+
+    def record(cursor: clang.cindex.Cursor, key: bytes, parent: Optional[clang.cindex.Cursor], parent_index: int, file, line: int, column: int, spelling: Optional[str] = None) -> int:
+        index = len(kind_column)
+        kind_id = cursor._kind_id
+        kind_column.append(kind_id)
+        parent_column.append(parent_index)
+        file_column.append(file)
+        line_column.append(line)
+        column_column.append(column)
+        if spelling is None:
+            spelling = get_spelling(cursor)
+        spelling_id = spelling_ids.get(spelling)
+        if spelling_id is None:
+            spelling_id = spelling_ids[spelling] = len(flat.spellings)
+            flat.spellings.append(spelling)
+        spelling_column.append(spelling_id)
+
+        reads_reference, is_declaration, in_body = roles(kind_id)
+        referenced_index = NO_INDEX
+        if reads_reference:
+            referenced_key = _cursor_key(get_referenced(cursor))
+            referenced_index = declarations.get(referenced_key, NO_INDEX)
+            if referenced_index == NO_INDEX:
+                pending.append((index, referenced_key))
+        elif is_declaration:
+            declarations[_cursor_key(cursor)] = index
+        referenced_column.append(referenced_index)
+
+        positions[key] = index
+        if kind_id in keep or parent_index == 0:
+            if in_body and parent is not None:
+                # Dans un parcours récursif, une instruction porte la déclaration qui l'englobe
+                # (son parent sémantique) ; Cursor.get_children ne la transmet qu'aux enfants
+                # directs d'une déclaration. La portée gardée est celle de ce dernier cas, pour
+                # que les entités voient les mêmes parents sémantiques.
+                flat.scopes[index] = _adopt_cursor(parent, translation_unit) if roles(parent._kind_id)[1] else None
+            cursors.append(_adopt_cursor(cursor, translation_unit))
+        else:
+            cursors.append(None)
+        return index
+
+    def visitor(child, parent, _):
+        location = get_location(child)
+        file, line, column = location.file, location.line, location.column
+        file_index = NO_INDEX
+        if file is not None:
+            key = ctypes.cast(file.obj, ctypes.c_void_p).value
+            known = file_ids.get(key)
+            if known is None:
+                allowed = not location.is_in_system_header and file_filter.is_allowed_file(file.name)
+                known = file_ids[key] = (len(flat.files), allowed)
+                flat.files.append(file.name)
+            file_index, allowed = known
+            if not allowed:
+                # Ni ce curseur ni son sous-arbre
+                return VISIT_CONTINUE
+        record(child, bytes(child), parent, positions.get(bytes(parent), 0), file_index, line, column)
+        return VISIT_RECURSE
+
+    root_location = root.location
+    root_file, root_line, root_column = root_location.file, root_location.line, root_location.column
+    root_file_index = NO_INDEX
+    if root_file is not None:
+        root_file_index = len(flat.files)
+        file_ids[ctypes.cast(root_file.obj, ctypes.c_void_p).value] = (root_file_index, True)
+        flat.files.append(root_file.name)
+    record(root, bytes(root), None, NO_INDEX, root_file_index, root_line, root_column, source_file)
+    # La racine est toujours gardée
+    cursors[0] = root
+    conf.lib.clang_visitChildren(root, callbacks["cursor_visit"](visitor), None)
+    for index, referenced_key in pending:
+        referenced_column[index] = declarations.get(referenced_key, NO_INDEX)
+    return flat
@@ -0,0 +1,455 @@
+# global_graph.py
+import argparse
+import heapq
+import operator
+import os
+import pickle
+import sys
+from collections import deque
+from functools import reduce
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import networkx as nx
+from tqdm import tqdm
+from .cache import ANALYZER_VERSION
+from .exporter import export_to_graphml, graph_file_extension
+from .graph_postprocessing import merge_nodes
+from .ontologie import NAME_IDENTITY, IDENTITY_MODES, REFERENCE_NODE_TYPES, replaces_attributes
+
+GLOBAL_GRAPH_NAME = "global_graph"
+
+# État du graph global (avec sa provenance) pour les mises à jour incrémentales, et version de
+# son format : un état d'un autre format est ignoré
+GLOBAL_STATE_NAME = "global_graph_state.pickle"
+GLOBAL_STATE_FORMAT = 2
+
+# Attribut des nœuds et arêtes exportés listant les unités de traduction qui les ont produits
+PROVENANCE_ATTRIBUTE = "translation_units"
+PROVENANCE_SEPARATOR = ";"
+
+# Attributs dont les valeurs se répètent d'un nœud ou d'une arête à l'autre : une seule chaîne
+# est gardée par valeur dans le graph global
+INTERNED_ATTRIBUTES = ("declaration_file", "node_type", "relation")
+
+def find_graph_files(export_root: str) -> list[str]:
+    """
+    Retourne les graphes d'unités de traduction (.graphml ou .graphml.gz) sous export_root,
+    dans un ordre stable, sans les graphes globaux déjà assemblés.
+    """
+    graph_files = []
+    for directory, _, files in os.walk(export_root):
+        for name in files:
+            if name.startswith(GLOBAL_GRAPH_NAME + "."):
+                continue
+            if name.endswith(graph_file_extension(False)) or name.endswith(graph_file_extension(True)):
+                graph_files.append(os.path.join(directory, name))
+    return sorted(graph_files)
+
+def read_graph_records(graph_file: str) -> tuple[list, list]:
+    """
+    Lit le graph d'une unité de traduction (dans un worker) et retourne ses nœuds et arêtes
+    sous forme de listes, seules transmises au processus principal.
+    """
+    graph = nx.read_graphml(graph_file)
+    return list(graph.nodes(data=True)), list(graph.edges(data=True))
+
+def file_stamp(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def format_units(units) -> str:
+    """
+    Valeur de l'attribut translation_units : les unités de traduction, triées, séparées par ';'.
+    """
+    return PROVENANCE_SEPARATOR.join(sorted(units))
+
+class GlobalGraph:
+    """
+    Graph global fusionné avec la provenance de chaque nœud et de chaque arête : l'ensemble des
+    unités de traduction (identifiées par leur fichier de graph) qui l'ont produit.
+
+    Chaque nœud et chaque arête garde une seule fois chaque ensemble d'attributs distinct qui
+    lui est proposé (en général un seul : une déclaration d'en-tête est la même pour toutes
+    les unités qui l'incluent), avec les unités qui le proposent sous forme d'un masque de bits
+    de leurs identifiants entiers : la mémoire dépend du nombre d'entités distinctes, la
+    provenance d'un bit par unité. Réanalyser une unité retire ses anciennes contributions et
+    ajoute les nouvelles en O(taille du graph de l'unité) : seuls les nœuds dont l'ensemble des
+    attributs proposés change sont réévalués.
+
+    Les attributs retenus pour un nœud sont ceux qui l'emportent selon replaces_attributes
+    parmi les attributs distincts proposés, parcourus dans un ordre fixe : le résultat ne
+    dépend pas de l'ordre dans lequel les unités ont été ajoutées ou mises à jour.
+    """
+
+    def __init__(self):
+        self.graph = nx.DiGraph()
+        # nœud ou arête (u, v) -> {attributs: masque des unités qui les proposent}
+        self.node_variants = {}
+        self.edge_variants = {}
+        # unité -> identifiant (bit de son masque), identifiants libérés par les unités retirées
+        self.unit_ids = {}
+        self.free_unit_ids = []
+        # unité -> nœuds et arêtes de son graph
+        self.unit_nodes = {}
+        self.unit_edges = {}
+        # unité -> (mtime, taille) de son fichier de graph lors de son ajout
+        self.unit_stamps = {}
+        # Attributs partagés : une seule instance par ensemble d'attributs distinct
+        self.attribute_variants = {}
+
+    @property
+    def units(self) -> set:
+        return set(self.unit_ids)
+
+    def _variant(self, attributes: dict) -> tuple:
+        for name in INTERNED_ATTRIBUTES:
+            value = attributes.get(name)
+            if isinstance(value, str):
+                attributes[name] = sys.intern(value)
+        variant = tuple(sorted(attributes.items()))
+        return self.attribute_variants.setdefault(variant, variant)
+
+    @staticmethod
+    def _unit_names(mask: int, names: dict) -> list:
+        # Unités d'un masque, names associant son identifiant à chaque unité
+        units = []
+        while mask:
+            low = mask & -mask
+            units.append(names[low.bit_length() - 1])
+            mask ^= low
+        return units
+
+    @staticmethod
+    def _winning_attributes(variants: dict) -> dict:
+        if len(variants) == 1:
+            return dict(next(iter(variants)))
+        winner = None
+        for variant in sorted(variants, key=repr):
+            attributes = dict(variant)
+            if winner is None or replaces_attributes(winner, attributes.get("node_type"), attributes.get("declaration_file", "")):
+                winner = attributes
+        return winner
+
+    @staticmethod
+    def _edge_attributes(variants: dict) -> dict:
+        # Une arête garde les premiers attributs dans l'ordre fixe des variantes
+        return dict(min(variants, key=repr))
+
+    @staticmethod
+    def _contribute(variants: dict, variant: tuple, bit: int) -> Optional[bool]:
+        """
+        Ajoute la contribution bit à variant ; None si l'unité contribuait déjà (élément en
+        double dans son graph), sinon vrai si l'ensemble des variantes change.
+        """
+        for mask in variants.values():
+            if mask & bit:
+                return None
+        mask = variants.get(variant)
+        variants[variant] = bit if mask is None else mask | bit
+        return mask is None
+
+    @staticmethod
+    def _withdraw(variants: dict, bit: int) -> bool:
+        # Retire la contribution bit ; vrai si l'ensemble des variantes change
+        for variant, mask in variants.items():
+            if mask & bit:
+                mask &= ~bit
+                if mask:
+                    variants[variant] = mask
+                    return False
+                del variants[variant]
+                return True
+        return False
+
+    def add_unit(self, unit: str, nodes: list, edges: list) -> None:
+        """
+        Ajoute les nœuds et arêtes du graph d'une unité de traduction, après avoir retiré ses
+        contributions précédentes si elle avait déjà été ajoutée.
+        """
+        unit = sys.intern(unit)
+        if unit in self.unit_ids:
+            self.remove_unit(unit)
+        # Les identifiants libérés sont réutilisés, les plus petits d'abord : les masques restent courts
+        unit_id = heapq.heappop(self.free_unit_ids) if self.free_unit_ids else len(self.unit_ids)
+        self.unit_ids[unit] = unit_id
+        bit = 1 << unit_id
+        unit_nodes, unit_edges = [], []
+        for node, attributes in nodes:
+            node = sys.intern(node)
+            variant = self._variant(attributes)
+            variants = self.node_variants.get(node)
+            if variants is None:
+                self.node_variants[node] = {variant: bit}
+                self.graph.add_node(node, **dict(variant))
+                unit_nodes.append(node)
+                continue
+            changed = self._contribute(variants, variant, bit)
+            if changed is None:
+                continue
+            unit_nodes.append(node)
+            if changed:
+                self._set_attributes(self.graph.nodes[node], self._winning_attributes(variants))
+        for u, v, attributes in edges:
+            # Les extrémités partagent la chaîne de l'identifiant du nœud
+            edge = (sys.intern(u), sys.intern(v))
+            variant = self._variant(attributes)
+            variants = self.edge_variants.get(edge)
+            if variants is None:
+                self.edge_variants[edge] = {variant: bit}
+                self.graph.add_edge(*edge, **dict(variant))
+                unit_edges.append(edge)
+                continue
+            changed = self._contribute(variants, variant, bit)
+            if changed is None:
+                continue
+            unit_edges.append(edge)
+            if changed:
+                self._set_attributes(self.graph.edges[edge], self._edge_attributes(variants))
+        self.unit_nodes[unit] = unit_nodes
+        self.unit_edges[unit] = unit_edges
+
+    def remove_unit(self, unit: str) -> None:
+        """
+        Retire les contributions d'une unité de traduction : les nœuds et arêtes qu'elle seule
+        avait produits disparaissent, les autres reprennent les attributs des unités restantes.
+        """
+        unit_id = self.unit_ids.pop(unit, None)
+        if unit_id is None:
+            return
+        heapq.heappush(self.free_unit_ids, unit_id)
+        bit = 1 << unit_id
+        # Les arêtes d'une unité relient des nœuds de la même unité : elles sont retirées d'abord
+        for edge in self.unit_edges.pop(unit, ()):
+            variants = self.edge_variants[edge]
+            if self._withdraw(variants, bit):
+                if not variants:
+                    del self.edge_variants[edge]
+                    self.graph.remove_edge(*edge)
+                else:
+                    self._set_attributes(self.graph.edges[edge], self._edge_attributes(variants))
+        self.unit_stamps.pop(unit, None)
+        for node in self.unit_nodes.pop(unit, ()):
+            variants = self.node_variants[node]
+            if self._withdraw(variants, bit):
+                if not variants:
+                    del self.node_variants[node]
+                    self.graph.remove_node(node)
+                else:
+                    self._set_attributes(self.graph.nodes[node], self._winning_attributes(variants))
+
+    def changed_units(self, graph_files: list[str]) -> list[str]:
+        """
+        Retourne les fichiers de graph_files à (re)lire : unités inconnues ou dont le fichier
+        a changé (date ou taille) depuis leur ajout.
+        """
+        return [graph_file for graph_file in graph_files
+                if graph_file not in self.unit_stamps or self.unit_stamps[graph_file] != file_stamp(graph_file)]
+
+    @staticmethod
+    def _set_attributes(attributes: dict, values: dict) -> None:
+        attributes.clear()
+        attributes.update(values)
+
+    def to_graph(self, identity: str = NAME_IDENTITY) -> nx.DiGraph:
+        """
+        Retourne le graph global exportable : une copie où, en identité "name", les références
+        sont redirigées vers les définitions trouvées dans d'autres unités (resolve_definitions).
+        Chaque nœud et chaque arête porte l'attribut translation_units (voir format_units),
+        réunion des provenances des nœuds et arêtes fusionnés.
+        """
+        canonical = resolve_definitions(self.graph) if identity == NAME_IDENTITY else {}
+        graph = merge_nodes(self.graph.copy(), canonical)
+
+        node_units = {}
+        for node, variants in self.node_variants.items():
+            merged = canonical.get(node, node)
+            node_units[merged] = node_units.get(merged, 0) | reduce(operator.or_, variants.values())
+        edge_units = {}
+        for (u, v), variants in self.edge_variants.items():
+            merged = (canonical.get(u, u), canonical.get(v, v))
+            edge_units[merged] = edge_units.get(merged, 0) | reduce(operator.or_, variants.values())
+
+        # Une seule chaîne par ensemble d'unités distinct
+        names = {unit_id: unit for unit, unit_id in self.unit_ids.items()}
+        provenances = {}
+
+        def provenance(mask: int) -> str:
+            formatted = provenances.get(mask)
+            if formatted is None:
+                formatted = provenances[mask] = format_units(self._unit_names(mask, names))
+            return formatted
+
+        for node, attributes in graph.nodes(data=True):
+            attributes[PROVENANCE_ATTRIBUTE] = provenance(node_units[node])
+        for u, v, attributes in graph.edges(data=True):
+            attributes[PROVENANCE_ATTRIBUTE] = provenance(edge_units[(u, v)])
+        return graph
+
+    @classmethod
+    def load(cls, state_path: str) -> "GlobalGraph":
+        """
+        Charge l'état sauvegardé par save ; un état absent, illisible, d'une autre version
+        de l'analyseur ou d'un autre format donne un graph global vide.
+        """
+        try:
+            with open(state_path, "rb") as f:
+                version, global_graph = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError):
+            return cls()
+        if version != (ANALYZER_VERSION, GLOBAL_STATE_FORMAT) or not isinstance(global_graph, cls):
+            return cls()
+        return global_graph
+
+    def save(self, state_path: str) -> None:
+        """
+        Écrit l'état de façon atomique (fichier temporaire puis renommage).
+        """
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(((ANALYZER_VERSION, GLOBAL_STATE_FORMAT), self), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, state_path)
+
+def _call_name(position: str) -> str:
+    # Un appel est nommé sans ses paramètres (ns::f), une définition avec (ns::f(int x))
+    return position.split("(", 1)[0]
+
+def _split_name(name: str) -> tuple[str, str]:
+    # Portée et nom non qualifié : ("ns::Shape", "area") pour ns::Shape::area
+    scope, _, unqualified = name.rpartition("::")
+    return scope, unqualified
+
+def _unqualified_definitions(graph: nx.DiGraph, node: str, name: str, by_scoped_name: dict) -> Optional[list]:
+    """
+    Définitions candidates d'un appel non résolu, nommé sans namespace : pour chaque appelant,
+    celles de ce nom dans la portée la plus proche de l'appelant qui en contient (sa portée,
+    puis les portées englobantes). Tous les appelants doivent trouver les mêmes.
+    """
+    found = None
+    for caller in graph.predecessors(node):
+        scope, _ = _split_name(_call_name(graph.nodes[caller].get("namespace_position") or ""))
+        candidates = by_scoped_name.get((scope, name))
+        while candidates is None and scope:
+            scope, _ = _split_name(scope)
+            candidates = by_scoped_name.get((scope, name))
+        if candidates is None or (found is not None and candidates is not found):
+            return None
+        found = candidates
+    return found
+
+def resolve_definitions(graph: nx.DiGraph) -> dict:
+    """
+    En identité "name", une fonction appelée depuis une autre unité de traduction que celle
+    qui la définit n'y est connue que par sa déclaration, ou par le seul nom de l'appel si
+    libclang n'a pas résolu la définition (position sans namespace). Retourne, pour chaque
+    nœud dont la définition a été trouvée, ce nœud de définition : la seule déclaration d'un
+    .cpp de même position (namespace_position) ou, pour une référence, de même nom sans les
+    paramètres. Un appel non résolu n'est rattaché qu'à une définition de la portée de ses
+    appelants (voir _unqualified_definitions), jamais d'un autre namespace. Un nom défini
+    dans plusieurs .cpp (surcharges, fonctions static, namespaces anonymes...) est ambigu et
+    n'est pas résolu.
+    """
+    by_position, by_name, by_scoped_name = {}, {}, {}
+    for node, attributes in graph.nodes(data=True):
+        position = attributes.get("namespace_position")
+        if position is None or attributes.get("node_type") in REFERENCE_NODE_TYPES:
+            continue
+        if str(attributes.get("declaration_file", "")).endswith(".cpp"):
+            name = _call_name(position)
+            by_position.setdefault(position, []).append(node)
+            by_name.setdefault(name, []).append(node)
+            by_scoped_name.setdefault(_split_name(name), []).append(node)
+
+    canonical = {}
+    for node, attributes in graph.nodes(data=True):
+        position = attributes.get("namespace_position")
+        if position is None:
+            continue
+        definitions = by_position.get(position)
+        if definitions is None and attributes.get("node_type") in REFERENCE_NODE_TYPES:
+            name = _call_name(position)
+            definitions = by_name.get(name) if "::" in name else _unqualified_definitions(graph, node, name, by_scoped_name)
+        if definitions is not None and len(definitions) == 1 and definitions[0] != node:
+            canonical[node] = definitions[0]
+    return canonical
+
+def update_global_graph(global_graph: GlobalGraph, graph_files: list[str], n_jobs: int = 1) -> GlobalGraph:
+    """
+    Ajoute (ou remplace) dans global_graph les unités de traduction de graph_files. Les
+    fichiers sont lus par n_jobs processus ; le processus principal les ajoute dans l'ordre de
+    graph_files, au plus 2 * n_jobs fichiers lus étant en attente : la mémoire dépend du nombre
+    d'entités distinctes et non de la somme des graphes.
+    """
+    def ingest(graph_file: str, records) -> None:
+        try:
+            stamp = file_stamp(graph_file)
+            global_graph.add_unit(graph_file, *records())
+            global_graph.unit_stamps[graph_file] = stamp
+        except Exception as e:
+            tqdm.write(f"Erreur lors de la lecture du graph {graph_file}: {e}")
+        progress.update(1)
+
+    with tqdm(total=len(graph_files), desc="Assemblage du graph global") as progress:
+        if n_jobs <= 1:
+            for graph_file in graph_files:
+                ingest(graph_file, lambda: read_graph_records(graph_file))
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                pending = deque()
+                for graph_file in graph_files:
+                    pending.append((graph_file, executor.submit(read_graph_records, graph_file)))
+                    if len(pending) < 2 * n_jobs:
+                        continue
+                    done_file, future = pending.popleft()
+                    ingest(done_file, future.result)
+                while pending:
+                    done_file, future = pending.popleft()
+                    ingest(done_file, future.result)
+    return global_graph
+
+def assemble_global_graph(graph_files: list[str], n_jobs: int = 1, identity: str = NAME_IDENTITY) -> nx.DiGraph:
+    """
+    Assemble le graph global du programme à partir des graphes de chaque unité de traduction
+    (voir update_global_graph et GlobalGraph.to_graph). En identité "usr", déclarations et
+    définitions partagent déjà leur USR d'une unité à l'autre.
+    """
+    return update_global_graph(GlobalGraph(), graph_files, n_jobs).to_graph(identity)
+
+def refresh_global_graph(state_path: str, graph_files: list[str], n_jobs: int = 1) -> GlobalGraph:
+    """
+    Met à jour le graph global sauvegardé dans state_path pour qu'il corresponde à graph_files :
+    les unités qui n'y figurent plus sont retirées, seules les unités nouvelles ou dont le
+    graph a changé sont relues. L'état mis à jour est sauvegardé.
+    """
+    global_graph = GlobalGraph.load(state_path)
+    for unit in global_graph.units - set(graph_files):
+        global_graph.remove_unit(unit)
+    update_global_graph(global_graph, global_graph.changed_units(graph_files), n_jobs)
+    global_graph.save(state_path)
+    return global_graph
+
+def main():
+    parser = argparse.ArgumentParser(description="Assemble le graph global du programme à partir des graphes de chaque unité de traduction.")
+    parser.add_argument('export_root', help="Dossier contenant les graphes des unités de traduction (.graphml, .graphml.gz)")
+    parser.add_argument('--output', default=None, help="Fichier du graph global (par défaut export_root/global_graph.graphml)")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Nombre de processus lisant les graphes")
+    parser.add_argument('--identity', choices=IDENTITY_MODES, default=NAME_IDENTITY, help="Identité des nœuds des graphes lus")
+    parser.add_argument('--compress', action='store_true', help="Écrit le graph global compressé en gzip")
+    parser.add_argument('--incremental', action='store_true', help="Ne relit que les graphes modifiés depuis le dernier assemblage")
+    cli_args = parser.parse_args()
+
+    output = cli_args.output or os.path.join(cli_args.export_root, GLOBAL_GRAPH_NAME + graph_file_extension(cli_args.compress))
+    graph_files = find_graph_files(cli_args.export_root)
+    if cli_args.incremental:
+        global_graph = refresh_global_graph(os.path.join(cli_args.export_root, GLOBAL_STATE_NAME), graph_files, cli_args.jobs)
+        graph = global_graph.to_graph(cli_args.identity)
+    else:
+        graph = assemble_global_graph(graph_files, cli_args.jobs, cli_args.identity)
+    export_to_graphml(graph, output, cli_args.compress)
+    print(f"Graph global de {len(graph_files)} unités : {graph.number_of_nodes()} nœuds, {graph.number_of_edges()} arêtes, exporté vers {output}")
+
+if __name__ == "__main__":
+    main()
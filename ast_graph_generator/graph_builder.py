@@ -1,70 +1,157 @@
 # graph_builder.py
+import logging
 import networkx as nx
 import clang.cindex
-from .ontologie import Entity, FunctionEntity, FunctionCallEntity, TypeRefEntity, ClassFunctionCallEntity
-from .node_filters import is_class,  uses_custom_type, is_function, is_namespace, is_struct, is_custom_type, is_function_call, is_allowed_node, is_class_function_call
+from .ontologie import Entity, EntityContext, FunctionEntity, FunctionCallEntity, TypeRefEntity, ClassFunctionCallEntity, TranslationUnitEntity
+from .node_filters import FileFilter, is_class_function_call
+from .flat_ast import FlatAST, CALL_EXPR
 
-def build_hierarchy_graph(node: clang.cindex.Cursor, graph: nx.DiGraph, ALLOWED_PATHS: list[str], parent_node: str = None) -> None:
-    """
-    Parcours récursif de l'AST pour construire un graphe hiérarchique.
-    """
-    # Par exemple, gérer les namespaces, classes, fonctions, etc.
+def _declaration_handler(child: clang.cindex.Cursor, kind: clang.cindex.CursorKind, context: EntityContext):
+    return Entity(child, context), f'contains_{kind.name.lower()}', False
 
-    old_parent = parent_node
+def _function_handler(child: clang.cindex.Cursor, kind: clang.cindex.CursorKind, context: EntityContext):
+    return FunctionEntity(child, context), 'contains_fun_decl', False
 
-    if parent_node is None:
-        entity = Entity(node)
-        node_type = f'{node.kind.name.lower()}'
-        entity.add_to_graph(graph, node_type)
-        parent_node = entity.name
+def _call_handler(child: clang.cindex.Cursor, kind: clang.cindex.CursorKind, context: EntityContext):
+    return _call_entity(child, kind, context, is_class_function_call(child))
 
-    for child in node.get_children():
-        if child is not None : 
-            if not is_allowed_node(child, ALLOWED_PATHS):
-                continue
+def _call_entity(child: clang.cindex.Cursor, kind: clang.cindex.CursorKind, context: EntityContext, class_function_call: bool):
+    if class_function_call:
+        logging.debug("Appel de fonction de classe (type référencé par une classe)")
+        return ClassFunctionCallEntity(child, context), f'contains_{kind.name.lower()}', True
+    return FunctionCallEntity(child, context), 'calls_function', True
+
+def _member_ref_handler(child: clang.cindex.Cursor, kind: clang.cindex.CursorKind, context: EntityContext):
+    return FunctionCallEntity(child, context), 'calls_function', True
+
+def _type_ref_handler(child: clang.cindex.Cursor, kind: clang.cindex.CursorKind, context: EntityContext):
+    return TypeRefEntity(child, context), 'uses_custom_type', False
 
-        if is_class(child) or uses_custom_type(child) or is_function(child) or is_namespace(child) or is_struct(child) or is_custom_type(child) or is_function_call(child):
+# Un handler retourne l'entité du curseur, la relation avec son parent, et True si les enfants
+# du curseur sont rattachés au parent de la fonction englobante (appels chaînés func1().func2())
+STRUCTURE_HANDLERS = {
+    clang.cindex.CursorKind.NAMESPACE: _declaration_handler,
+    clang.cindex.CursorKind.CLASS_DECL: _declaration_handler,
+    clang.cindex.CursorKind.STRUCT_DECL: _declaration_handler,
+    clang.cindex.CursorKind.TYPE_ALIAS_DECL: _declaration_handler,
+    clang.cindex.CursorKind.CONSTRUCTOR: _function_handler,
+    clang.cindex.CursorKind.CXX_METHOD: _function_handler,
+    clang.cindex.CursorKind.FUNCTION_DECL: _function_handler,
+}
+
+HANDLERS = {
+    **STRUCTURE_HANDLERS,
+    clang.cindex.CursorKind.CALL_EXPR: _call_handler,
+    clang.cindex.CursorKind.MEMBER_REF_EXPR: _member_ref_handler,
+    clang.cindex.CursorKind.TYPE_REF: _type_ref_handler,
+}
+
+# Genres dont le handler rattache les enfants au parent englobant (valeur True retournée)
+ATTACHED_KINDS = {clang.cindex.CursorKind.CALL_EXPR.value, clang.cindex.CursorKind.MEMBER_REF_EXPR.value}
+
+def build_hierarchy_graph(node: clang.cindex.Cursor, graph: nx.DiGraph, ALLOWED_PATHS: list[str], parent_node: str = None, context: EntityContext = None, structure_only: bool = False, file_filter: FileFilter = None) -> None:
+    """
+    Parcours de l'AST en profondeur pour construire un graphe hiérarchique.
+    Le parcours utilise une pile explicite (pas de limite de récursion sur les expressions
+    profondes), lit le kind de chaque curseur une seule fois et choisit son traitement dans
+    la table HANDLERS. Si structure_only, seules les déclarations et les arêtes contains_*
+    sont ajoutées (ni appels de fonctions, ni types utilisés).
+    file_filter est le FileFilter de l'unité de traduction (construit depuis ALLOWED_PATHS s'il
+    n'est pas fourni).
+    """
+    if context is None:
+        context = EntityContext()
+    if file_filter is None:
+        file_filter = FileFilter(ALLOWED_PATHS, context.working_dir)
+    handlers = STRUCTURE_HANDLERS if structure_only else HANDLERS
 
-            relation = f'contains_{child.kind.name.lower()}'
-            node_type = f'{child.kind.name.lower()}'
+    def open_node(cursor: clang.cindex.Cursor, parent: str) -> tuple:
+        # Parent des enfants du curseur, et parent de la fonction englobante pour les appels
+        old_parent = parent
+        if parent is None:
+            entity = Entity(cursor, context)
+            entity.add_to_graph(graph, f'{cursor.kind.name.lower()}')
+            parent = entity.name
+        return parent, old_parent
 
-            if is_class_function_call(child): # Doit etre mis avant le check is_function()
-                print("a trouve un class typeref")
-                child_entity = ClassFunctionCallEntity(child)
+    # Chaque élément de la pile est un curseur à traiter avec le parent et le parent
+    # englobant de son noeud parent ; les enfants sont empilés à l'envers pour garder l'ordre
+    stack = []
+    parent, old_parent = open_node(node, parent_node)
+    stack.extend((child, parent, old_parent) for child in reversed(list(node.get_children())))
 
-            elif is_function(child): 
-                child_entity = FunctionEntity(child)
-                relation = f'contains_fun_decl'
+    while stack:
+        child, parent, old_parent = stack.pop()
+        if child is not None:
+            if not file_filter(child):
+                continue
 
-            elif is_function_call(child):
-                child_entity = FunctionCallEntity(child)
-                relation = f'calls_function'
+        kind = child.kind
+        handler = handlers.get(kind)
+        if handler is None:
+            child_parent = parent
+        else:
+            child_entity, relation, attach_to_old_parent = handler(child, kind, context)
+            child_entity.add_to_graph(graph, f'{kind.name.lower()}')
+            graph.add_edge(parent, child_entity.name, relation=relation)
+            child_parent = old_parent if attach_to_old_parent else child_entity.name
 
-            elif uses_custom_type(child):
-                child_entity = TypeRefEntity(child)
-                relation = f'uses_custom_type'
+        child_parent, grand_parent = open_node(child, child_parent)
+        stack.extend((grand_child, child_parent, grand_parent) for grand_child in reversed(list(child.get_children())))
 
-            else : 
-                child_entity = Entity(child)
-                
-            child_entity.add_to_graph(graph, node_type)
+def build_hierarchy_graph_from_flat_ast(flat: FlatAST, graph: nx.DiGraph, context: EntityContext = None, structure_only: bool = False) -> None:
+    """
+    Même graphe que build_hierarchy_graph, construit depuis l'AST capturé (voir
+    flat_ast.capture_flat_ast, déjà filtré par fichier). Le classement des curseurs est fait
+    sur les colonnes pour toute l'unité de traduction (NumPy s'il est installé) : curseurs
+    traités par un handler, et pour chacun son plus proche ancêtre qui est un nœud parent du
+    graph (racine ou handler qui ne rattache pas ses enfants au parent englobant). Seuls les
+    curseurs traités sont ensuite parcourus, dans l'ordre, pour créer leurs entités.
+    """
+    if context is None:
+        context = EntityContext()
+    handlers = STRUCTURE_HANDLERS if structure_only else HANDLERS
+    handlers_by_id = {kind.value: (kind, handler) for kind, handler in handlers.items()}
+    cursors = flat.cursors
 
-            graph.add_edge(parent_node, child_entity.name, relation=relation)
+    handled = flat.indices_of_kinds(handlers_by_id)
+    anchors = flat.nearest_ancestors(kind_id for kind_id in handlers_by_id if kind_id not in ATTACHED_KINDS)
+    class_function_calls = flat.class_function_calls() if CALL_EXPR in handlers_by_id else set()
 
-            #Dans le cas ou des fonctions sont appelées a la suite func1().func2() pour eviter qu'une fonction inclue une autre
-            if is_function_call(child):
-                build_hierarchy_graph(child, graph, ALLOWED_PATHS, parent_node=old_parent)
-            else: 
-                build_hierarchy_graph(child, graph, ALLOWED_PATHS, parent_node=child_entity.name)
+    root = cursors[0]
+    # La racine garde le nom donné à la capture
+    root_entity = TranslationUnitEntity(root, context, flat.spelling_of(0))
+    root_entity.add_to_graph(graph, f'{root.kind.name.lower()}')
+    # Indice d'un nœud parent du graph -> nom de son entité
+    names = {0: root_entity.name}
+    for i in handled:
+        kind, handler = handlers_by_id[flat.kind[i]]
+        child = cursors[i]
+        if i in flat.scopes:
+            context.semantic_parents[child] = flat.scopes[i]
+        if handler is _call_handler:
+            child_entity, relation, attach_to_old_parent = _call_entity(child, kind, context, i in class_function_calls)
         else:
-            build_hierarchy_graph(child, graph, ALLOWED_PATHS, parent_node)
-    
-def build_graph_from_ast(root: clang.cindex.Cursor, ALLOWED_PATHS: list[str]) -> nx.DiGraph:
+            child_entity, relation, attach_to_old_parent = handler(child, kind, context)
+        child_entity.add_to_graph(graph, f'{kind.name.lower()}')
+        graph.add_edge(names[anchors[i]], child_entity.name, relation=relation)
+        if not attach_to_old_parent:
+            names[i] = child_entity.name
+
+def build_graph_from_ast(root: clang.cindex.Cursor, ALLOWED_PATHS: list[str], context: EntityContext = None, structure_only: bool = False, file_filter: FileFilter = None) -> nx.DiGraph:
     """
     Crée et retourne un graphe à partir du noeud racine de l'AST.
     """
     graph = nx.DiGraph()
-    build_hierarchy_graph(root, graph, ALLOWED_PATHS)
+    build_hierarchy_graph(root, graph, ALLOWED_PATHS, context=context, structure_only=structure_only, file_filter=file_filter)
+    return graph
+
+def build_graph_from_flat_ast(flat: FlatAST, context: EntityContext = None, structure_only: bool = False) -> nx.DiGraph:
+    """
+    Crée et retourne un graphe à partir de l'AST capturé (voir build_hierarchy_graph_from_flat_ast).
+    """
+    graph = nx.DiGraph()
+    build_hierarchy_graph_from_flat_ast(flat, graph, context=context, structure_only=structure_only)
     return graph
 
 
@@ -1,47 +1,55 @@
 # graph_postprocessing.py
 import networkx as nx
 
-def merge_duplicate_nodes(graph: nx.DiGraph) -> nx.DiGraph:
+def _canonical_nodes(graph: nx.DiGraph, key_attribute: str) -> dict:
     """
-    Fusionne les nœuds du graphe qui partagent le même 'namespace_position'.
-    Pour chaque groupe de doublons, le nœud dont le fichier de déclaration se termine par ".cpp"
-    est privilégié. On redirige ensuite les arêtes vers ce nœud canonique avant de supprimer les doublons.
+    Regroupe les nœuds par key_attribute en un seul passage et retourne, pour chaque doublon,
+    le nœud canonique de son groupe : le premier dont le fichier de déclaration se termine par
+    ".cpp", sinon le premier du groupe.
     """
-    # Regrouper les nœuds par 'namespace_position'
     groups = {}
-    for node in list(graph.nodes):
-        canonical_key = graph.nodes[node].get("namespace_position", node)
-        groups.setdefault(canonical_key, []).append(node)
-    
-    nodes_to_remove = set()
-    
-    for key, nodes in groups.items():
+    for node, attributes in graph.nodes(data=True):
+        groups.setdefault(attributes.get(key_attribute, node), []).append(node)
+
+    canonical = {}
+    for nodes in groups.values():
         if len(nodes) < 2:
             continue  # Pas de doublon dans ce groupe
-
-        # Choisir le nœud canonique : celui dont le fichier de déclaration se termine par ".cpp", sinon le premier
-        canonical_node = None
+        canonical_node = next((node for node in nodes if str(graph.nodes[node].get("declaration_file", "")).endswith(".cpp")), nodes[0])
         for node in nodes:
-            file_attr = graph.nodes[node].get("declration_file", "")
-            if file_attr.endswith(".cpp"):
-                canonical_node = node
-                break
-        if canonical_node is None:
-            canonical_node = nodes[0]
-        
-        # Fusionner les autres nœuds dans le nœud canonique
-        for node in nodes:
-            if node == canonical_node:
-                continue
-            # Rediriger les arêtes entrantes du nœud à fusionner vers le nœud canonique
-            for pred, _, data in list(graph.in_edges(node, data=True)):
-                if pred != canonical_node and not graph.has_edge(pred, canonical_node):
-                    graph.add_edge(pred, canonical_node, **data)
-            # Rediriger les arêtes sortantes du nœud à fusionner depuis le nœud canonique
-            for _, succ, data in list(graph.out_edges(node, data=True)):
-                if succ != canonical_node and not graph.has_edge(canonical_node, succ):
-                    graph.add_edge(canonical_node, succ, **data)
-            nodes_to_remove.add(node)
-    
-    graph.remove_nodes_from(nodes_to_remove)
+            if node != canonical_node:
+                canonical[node] = canonical_node
+    return canonical
+
+def merge_duplicate_nodes(graph: nx.DiGraph, key_attribute: str = "namespace_position") -> nx.DiGraph:
+    """
+    Fusionne les nœuds du graphe qui partagent le même 'namespace_position'.
+    Pour chaque groupe de doublons, le nœud dont le fichier de déclaration se termine par ".cpp"
+    est privilégié. Les doublons sont fusionnés en une seule opération (merge_nodes) : une arête
+    déjà présente entre deux nœuds canoniques garde ses attributs, et les boucles créées par la
+    fusion sont ignorées.
+    key_attribute est l'attribut de regroupement (l'identifiant du nœud s'il est absent) : en
+    identité "usr", les nœuds sont déjà indexés par USR et le regroupement ne fusionne rien.
+    """
+    return merge_nodes(graph, _canonical_nodes(graph, key_attribute))
+
+def merge_nodes(graph: nx.DiGraph, canonical: dict) -> nx.DiGraph:
+    """
+    Fusionne chaque nœud de canonical dans son nœud canonique : ses arêtes sont redirigées
+    vers les nœuds canoniques de leurs extrémités, en une seule opération après suppression
+    des nœuds fusionnés.
+    """
+    if not canonical:
+        return graph
+
+    # Arêtes des doublons, réécrites entre nœuds canoniques (la première rencontrée l'emporte)
+    redirected = {}
+    for node in canonical:
+        for pred, data in graph.pred[node].items():
+            redirected.setdefault((canonical.get(pred, pred), canonical[node]), data)
+        for succ, data in graph.succ[node].items():
+            redirected.setdefault((canonical[node], canonical.get(succ, succ)), data)
+
+    graph.remove_nodes_from(canonical)
+    graph.add_edges_from((u, v, data) for (u, v), data in redirected.items() if u != v and not graph.has_edge(u, v))
     return graph
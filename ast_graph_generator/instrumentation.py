@@ -0,0 +1,116 @@
+# instrumentation.py
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Étapes mesurées pour chaque unité de traduction, dans l'ordre du traitement
+STAGES = ("lookup", "parse", "load_ast", "ast_store", "capture", "build", "merge", "export", "record", "store")
+
+# Compteurs relevés pour chaque unité de traduction
+COUNTERS = ("cursors", "nodes", "edges", "output_bytes", "diagnostics", "ast_cache_hits")
+
+CPU_SUFFIX = "_cpu"
+
+RUN_REPORT_NAME = "run_report"
+
+@contextmanager
+def measure_stage(timings: Optional[dict], stage: str):
+    """
+    Ajoute à timings le temps réel de l'étape sous la clé stage et son temps CPU sous
+    stage + "_cpu". Le temps CPU est celui du processus (libclang parse sur un thread à lui) :
+    avec des workers threads, il compte aussi les unités traitées en même temps.
+    Sans timings, le bloc s'exécute sans mesure.
+    """
+    if timings is None:
+        yield
+        return
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - wall_start
+        timings[stage + CPU_SUFFIX] = timings.get(stage + CPU_SUFFIX, 0.0) + time.process_time() - cpu_start
+
+def count(timings: Optional[dict], counter: str, value: int) -> None:
+    if timings is not None:
+        timings[counter] = timings.get(counter, 0) + value
+
+def unit_status(result) -> str:
+    if result.error:
+        return "error"
+    return "cached" if result.cached else "analysed"
+
+def aggregate_metrics(results: list) -> dict:
+    """
+    Totaux d'une exécution à partir des mesures renvoyées par les workers (JobResult.metrics) :
+    pour chaque étape, nombre d'unités, temps réel et CPU cumulés et temps réel maximal ;
+    pour chaque compteur, la somme.
+    """
+    stages = {}
+    for stage in STAGES:
+        walls = [result.metrics[stage] for result in results if stage in result.metrics]
+        if walls:
+            stages[stage] = {
+                "units": len(walls),
+                "wall": sum(walls),
+                "cpu": sum(result.metrics.get(stage + CPU_SUFFIX, 0.0) for result in results),
+                "max_wall": max(walls),
+            }
+    counters = {counter: sum(result.metrics.get(counter, 0) for result in results) for counter in COUNTERS}
+    statuses = {}
+    for result in results:
+        status = unit_status(result)
+        statuses[status] = statuses.get(status, 0) + 1
+    return {"units": len(results), "statuses": statuses, "stages": stages, "counters": counters}
+
+def build_run_report(results: list, run_stages: Optional[dict] = None) -> dict:
+    """
+    Rapport d'exécution : mesures de chaque unité et totaux. run_stages sont les temps des
+    étapes globales du processus principal (analyse de toutes les unités, assemblage...).
+    """
+    units = []
+    for result in results:
+        units.append({
+            "source_file": result.source_file,
+            "graph_file_path": result.graph_file_path,
+            "status": unit_status(result),
+            "ast_cached": result.ast_cached,
+            "used_pch": result.used_pch,
+            "error": result.error,
+            "metrics": result.metrics,
+        })
+    return {"run_stages": run_stages or {}, "totals": aggregate_metrics(results), "units": units}
+
+def write_run_report(report: dict, directory: str, name: str = RUN_REPORT_NAME) -> tuple[str, str]:
+    """
+    Écrit le rapport en JSON (complet) et en CSV (une ligne par unité : temps réel et CPU de
+    chaque étape, compteurs). Retourne les chemins des deux fichiers.
+    """
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, name + ".json")
+    with open(json_path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    csv_path = os.path.join(directory, name + ".csv")
+    columns = [column for stage in STAGES for column in (stage, stage + CPU_SUFFIX)] + list(COUNTERS)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source_file", "graph_file_path", "status", "ast_cached", "used_pch"] + columns)
+        for unit in report["units"]:
+            metrics = unit["metrics"]
+            writer.writerow([unit["source_file"], unit["graph_file_path"], unit["status"], unit["ast_cached"], unit["used_pch"]]
+                            + [metrics.get(column, "") for column in columns])
+    return json_path, csv_path
+
+def format_stage_report(totals: dict) -> list[str]:
+    """
+    Lignes du résumé : temps réel et CPU cumulés de chaque étape, puis les compteurs.
+    """
+    lines = []
+    for stage, measure in totals["stages"].items():
+        lines.append(f"{stage:<10} {measure['units']:>6} unités {measure['wall']:>10.2f}s réel {measure['cpu']:>10.2f}s CPU (max {measure['max_wall']:.2f}s)")
+    lines.append(", ".join(f"{counter}={value}" for counter, value in totals["counters"].items()))
+    return lines
@@ -2,20 +2,51 @@ import argparse
 import logging
 import os
 import clang.cindex
-from .debug_util import setup_logging, print_ast  # Assurez-vous que print_ast est défini dans debug_util.py
+from .debug_util import setup_logging, print_ast, print_flat_ast  # Assurez-vous que print_ast est défini dans debug_util.py
 from .utils import setup_for_os
 from .graph_postprocessing import merge_duplicate_nodes
-from .ast_parser import parse_source, get_root_cursor
-from .graph_builder import build_graph_from_ast
-from .exporter import export_to_gml, export_to_graphml
-from .ontologie import Entity, FunctionEntity, FunctionCallEntity, TypeRefEntity
-
-def create_ast_graph_from_file_with_args(source_file: str, args: list[str], export_dir: str, out_name = "graph_output"):
+from .ast_parser import parse_source, get_root_cursor, parse_options_for_mode, extraction_profile, FULL_MODE, STRUCTURE_MODE
+from .graph_builder import build_graph_from_ast, build_graph_from_flat_ast, HANDLERS
+from .flat_ast import capture_flat_ast
+from .node_filters import FileFilter
+from .exporter import export_to_gml, export_to_graphml, export_to_sqlite, open_in_directory, graph_file_extension
+from .ontologie import Entity, EntityContext, FunctionEntity, FunctionCallEntity, TypeRefEntity, NAME_IDENTITY, USR_IDENTITY
+from .cache import AnalysisCache, ASTCache
+from .instrumentation import measure_stage, count
+from .session import AnalysisSession
+
+def create_ast_graph_from_file_with_args(source_file: str, args: list[str], export_dir: str, out_name = "graph_output", session: AnalysisSession = None, cache: AnalysisCache = None, working_dir: str = None, pch: str = None, timings: dict = None, mode: str = FULL_MODE, incomplete: bool = False, identity: str = NAME_IDENTITY, compress: bool = False, graph_records: list = None, ast_cache: ASTCache = None):
     """
     Crée l'AST, construit le graph, effectue le post-traitement, 
     et exporte le graph dans le dossier 'ast_gen'. En mode debug, 
     l'AST est aussi exporté dans 'ast_gen/debug' avec un nom modifié.
+    Une session peut être fournie pour réutiliser son index libclang d'un fichier à l'autre.
+    Si un cache est fourni, l'unité de traduction y est enregistrée avec ses includes.
+    working_dir est le dossier d'exécution de la commande de compilation (par défaut le
+    répertoire courant) : le répertoire courant du processus n'est jamais modifié, ce qui
+    permet d'appeler cette fonction depuis plusieurs threads.
+    pch est un en-tête précompilé construit avec les mêmes options, inclus avant le source.
+    Si timings est fourni, les mesures de l'unité y sont ajoutées (voir instrumentation) :
+    temps réel et CPU de chaque étape (parsing sous la clé "parse", capture, construction,
+    fusion, export...) et compteurs (curseurs, nœuds, arêtes, octets écrits, diagnostics).
+    mode est le mode d'extraction (voir ast_parser.EXTRACTION_MODES) : en mode "structure",
+    les corps de fonctions ne sont pas parsés et seules les déclarations sont extraites ;
+    en mode "skip_header_bodies", seuls les corps de fonctions des includes de tête sont ignorés.
+    incomplete ajoute PARSE_INCOMPLETE aux options de parsing.
+    identity est le mode d'identité des nœuds (voir ontologie.IDENTITY_MODES) : en identité
+    "usr", les nœuds sont indexés par leur USR et le nom lisible est gardé dans 'label'.
+    compress écrit le graph GraphML compressé en gzip (extension .graphml.gz).
+    Si graph_records est fourni, le graph n'est pas exporté en GraphML : ses nœuds puis ses
+    arêtes y sont ajoutés, pour être écrits par l'appelant (export SQLite).
+    Si ast_cache est fourni, l'unité de traduction y est rechargée si son source et ses headers
+    n'ont pas changé, sinon elle est parsée puis sérialisée dans le cache (la vérification et
+    le chargement sont mesurés sous la clé "load_ast", les unités rechargées comptées sous
+    "ast_cache_hits").
+    Retourne le chemin du graph exporté.
     """
+    if working_dir is None:
+        working_dir = os.getcwd()
+
     logging.debug("Démarrage de la génération du graph")
 
     logging.info(f"Génération du graph pour le fichier {source_file}")
@@ -24,13 +55,43 @@ def create_ast_graph_from_file_with_args(source_file: str, args: list[str], expo
     ALLOWED_PATHS.append(source_file)
     logging.debug(f"ALLOWED_PATHS={ALLOWED_PATHS}")
 
-    args = ["-std=c++11"] + args
+    cache_args = args
+    args = ["-std=c++11"] + args + ["-working-directory", working_dir]
+    if pch is not None:
+        args += ["-include-pch", pch]
     logging.info(f"args={args}")
 
     # Parsing du fichier source pour obtenir l'AST
-    index = clang.cindex.Index.create()
-    tu = index.parse(source_file, args = args)
+    if session is None:
+        session = AnalysisSession()
+    options = parse_options_for_mode(mode, incomplete)
+    tu = None
+    if ast_cache is not None:
+        ast_key = ast_cache.key(source_file, cache_args, working_dir, options)
+        with measure_stage(timings, "load_ast"):
+            tu = ast_cache.load(ast_key, session)
+        count(timings, "ast_cache_hits", int(tu is not None))
+    loaded = tu is not None
+    if not loaded:
+        with measure_stage(timings, "parse"):
+            tu = session.parse(source_file, args, options=options)
+    count(timings, "diagnostics", len(tu.diagnostics))
+    # Une unité parsée avec un PCH dépend de ce PCH (temporaire) : elle n'est pas sérialisée
+    if ast_cache is not None and not loaded and pch is None:
+        try:
+            with measure_stage(timings, "ast_store"):
+                ast_cache.store(ast_key, tu, source_file, working_dir)
+        except (OSError, clang.cindex.TranslationUnitSaveError) as e:
+            logging.warning(f"L'AST de {source_file} n'a pas été mis en cache: {e}")
     root = get_root_cursor(tu)
+    file_filter = FileFilter(ALLOWED_PATHS, working_dir)
+    context = EntityContext(working_dir, identity)
+    # Un seul parcours de l'AST, partagé par la construction du graph et l'export debug
+    with measure_stage(timings, "capture"):
+        # Une unité rechargée nomme son source par son chemin absolu : la racine garde le nom
+        # de la commande, comme après un parsing
+        flat = capture_flat_ast(root, file_filter, HANDLERS, source_file)
+    count(timings, "cursors", len(flat))
 
     # Si mode debug, écrire l'AST dans le dossier ast_gen/debug/
     if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
@@ -40,29 +101,50 @@ def create_ast_graph_from_file_with_args(source_file: str, args: list[str], expo
         debug_file_name = source_file.replace("/", "#").replace("\\", "#")
         ast_file_path = os.path.join(debug_dir, debug_file_name)
         with open(ast_file_path, "w") as ast_file:
-            print_ast(root, ALLOWED_PATHS, depth=0, file=ast_file)
+            print_flat_ast(flat, file=ast_file)
         logging.debug(f"L'AST a été écrit dans {ast_file_path}")
 
     # Construction et post-traitement du graph
-    graph = build_graph_from_ast(root, ALLOWED_PATHS)
-    graph = merge_duplicate_nodes(graph)
+    with measure_stage(timings, "build"):
+        graph = build_graph_from_flat_ast(flat, context, structure_only=mode == STRUCTURE_MODE)
+    with measure_stage(timings, "merge"):
+        graph = merge_duplicate_nodes(graph, key_attribute="usr" if identity == USR_IDENTITY else "namespace_position")
+    count(timings, "nodes", graph.number_of_nodes())
+    count(timings, "edges", graph.number_of_edges())
 
     # Exporter le graph dans le dossier ast_gen/
     
-    os.makedirs(export_dir, exist_ok=True)
-    try:
-        graph_file_path = os.path.join(export_dir, out_name + ".graphml")
-        export_to_graphml(graph, graph_file_path)
-    except : 
-        #si le nom de fichier a créer trop grand
-        curr_dir = os.getcwd()
-        os.chdir(export_dir)
-        graph_file_path = os.path.join(out_name + ".graphml")
-        export_to_graphml(graph, graph_file_path)
-        os.chdir(curr_dir)
-
+    graph_file_name = out_name + graph_file_extension(compress)
+    graph_file_path = os.path.join(export_dir, graph_file_name)
+    with measure_stage(timings, "export"):
+        if graph_records is not None:
+            graph_records.extend((list(graph.nodes(data=True)), list(graph.edges(data=True))))
+        else:
+            os.makedirs(export_dir, exist_ok=True)
+            try:
+                export_to_graphml(graph, graph_file_path, compress)
+            except : 
+                #si le nom de fichier a créer trop grand
+                with open_in_directory(export_dir, graph_file_name) as graph_file:
+                    export_to_graphml(graph, graph_file, compress)
+    if graph_records is None:
+        try:
+            count(timings, "output_bytes", os.path.getsize(graph_file_path))
+        except OSError:
+            pass
+
+
+    if cache is not None:
+        with measure_stage(timings, "record"):
+            cache.record(source_file, cache_args, working_dir, graph_file_path, tu, profile=extraction_profile(mode, incomplete, identity))
+
+    # Libère l'unité de traduction sans attendre le prochain parsing : les curseurs gardés
+    # par l'AST capturé, le filtre et les caches du contexte la référencent aussi
+    del root, tu, flat, file_filter, context
+    session.release()
 
     logging.info(f"Graph exporté vers {graph_file_path}")
+    return graph_file_path
 
 def create_ast_graph_from_file(source_file: str, include_paths: list[str], library_paths: list[str]):
     """
@@ -107,7 +189,7 @@ def main():
         description="Parser l'AST d'un fichier source et l'exporter en format graphique (lib.py)."
     )
     parser.add_argument('--source', required=True, help="Chemin vers le fichier source à analyser")
-    parser.add_argument('--export', choices=['gml', 'graphml'], default='graphml', help="Format d'export")
+    parser.add_argument('--export', choices=['gml', 'graphml', 'sqlite'], default='graphml', help="Format d'export")
     parser.add_argument('--output', default="graph_output", help="Nom de base du fichier de sortie (sans extension)")
     parser.add_argument('--includes', nargs='+', default=[], help="Les includes nécessaires à la compilation du fichier")
     parser.add_argument('--libraries', nargs='+', default=[], help="Les librairies nécessaires à la compilation du fichier")
@@ -132,6 +214,9 @@ def main():
     if args.export == 'gml':
         graph_file_path = os.path.join(export_dir, args.output + ".gml")
         export_to_gml(graph, graph_file_path)
+    elif args.export == 'sqlite':
+        graph_file_path = os.path.join(export_dir, args.output + ".sqlite")
+        export_to_sqlite(graph, graph_file_path, args.source, args.source)
     else:
         graph_file_path = os.path.join(export_dir, args.output + ".graphml")
         export_to_graphml(graph, graph_file_path)
@@ -1,4 +1,5 @@
 # node_filters.py
+import ctypes
 import clang.cindex
 import os
 
@@ -35,7 +36,7 @@ def is_class_function_call(node: clang.cindex.Cursor) -> bool:
                         return True
     return False
 
-def is_allowed_node(node, ALLOWED_PATHS):
+def is_allowed_node(node, ALLOWED_PATHS, working_dir=None):
     """
     Retourne True si le nœud appartient à l'un des fichiers autorisés.
     Si le nœud n'a pas de localisation (par exemple la racine), on le considère autorisé.
@@ -43,35 +44,66 @@ def is_allowed_node(node, ALLOWED_PATHS):
     d'un chemin autorisé, on accepte également.
     Si le nœud appartient à un fichier d'en-tête, il est autorisé si le fichier source
     correspondant est autorisé.
+    Les chemins relatifs sont résolus depuis working_dir (par défaut le répertoire courant).
+    Pour filtrer tous les nœuds d'une unité de traduction, utiliser plutôt FileFilter.
     """
     if node.location and node.location.file:
-        # Normalisation du chemin absolu du fichier du nœud
-        file_path = os.path.normpath(os.path.abspath(node.location.file.name))
-        base_name = os.path.basename(file_path)
+        return FileFilter(ALLOWED_PATHS, working_dir).is_allowed_file(node.location.file.name)
+    return True
+
+class FileFilter:
+    """
+    Filtre des nœuds par fichier, construit une fois par unité de traduction : mêmes règles
+    que is_allowed_node, mais les chemins autorisés sont normalisés une seule fois et le
+    verdict est mémorisé pour chaque fichier de l'unité. Les nœuds des en-têtes système
+    sont refusés sans examiner leur chemin.
+    """
+
+    def __init__(self, ALLOWED_PATHS, working_dir=None):
+        if working_dir is None:
+            working_dir = os.getcwd()
+        self.working_dir = working_dir
+        self.allowed = []
         for allowed in ALLOWED_PATHS:
             # Normalisation du chemin absolu autorisé
-            allowed_abs = os.path.normpath(os.path.abspath(allowed))
-            allowed_base_name = os.path.basename(allowed_abs)
+            allowed_abs = os.path.normpath(os.path.join(working_dir, allowed))
+            self.allowed.append((allowed_abs, os.path.dirname(allowed_abs), os.path.basename(allowed_abs)))
+        # Verdict par fichier, indexé par le pointeur CXFile (unique dans une unité de traduction)
+        self.verdicts = {}
+
+    def is_allowed_file(self, file_name):
+        """
+        Retourne True si le fichier file_name (tel que nommé par libclang) est autorisé.
+        """
+        # Normalisation du chemin absolu du fichier du nœud
+        file_path = os.path.normpath(os.path.join(self.working_dir, file_name))
+        base_name = os.path.basename(file_path)
+        is_header = file_path.endswith('.h')
+        if is_header:
+            cpp_base_name = os.path.basename(file_path.replace('.h', '.cpp'))
+            c_base_name = os.path.basename(file_path.replace('.h', '.c'))
+        for allowed_abs, allowed_dir, allowed_base_name in self.allowed:
             # Option stricte : le chemin complet correspond ou est dans le même répertoire
-            if file_path == allowed_abs or file_path.startswith(os.path.dirname(allowed_abs)):
+            if file_path == allowed_abs or file_path.startswith(allowed_dir):
                 return True
             # Option plus flexible : le nom du fichier correspond (pour gérer les cas src/../Include)
             if base_name == allowed_base_name:
                 return True
-            # Vérification du fichier source correspondant pour les fichiers d'en-tête
-            if file_path.endswith('.h'):
-                corresponding_source = file_path.replace('.h', '.cpp')
-                corresponding_source_base_name = os.path.basename(corresponding_source)
-                if corresponding_source_base_name == allowed_base_name:
-                    return True
-                # Option pour d'autres extensions de fichiers source
-                corresponding_source = file_path.replace('.h', '.c')
-                corresponding_source_base_name = os.path.basename(corresponding_source)
-                if corresponding_source_base_name == allowed_base_name:
-                    return True
+            # Vérification du fichier source correspondant (.cpp ou .c) pour les fichiers d'en-tête
+            if is_header and allowed_base_name in (cpp_base_name, c_base_name):
+                return True
         return False
-    return True
-
-
-import clang.cindex
 
+    def __call__(self, node):
+        """
+        Retourne True si le nœud appartient à un fichier autorisé (ou n'a pas de fichier).
+        """
+        location = node.location
+        file = location.file
+        if file is None:
+            return True
+        key = ctypes.cast(file.obj, ctypes.c_void_p).value
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            verdict = self.verdicts[key] = not location.is_in_system_header and self.is_allowed_file(file.name)
+        return verdict
@@ -1,77 +1,242 @@
 # ontologie.py
 from dataclasses import dataclass, field
-from .utils import get_correct_path
+from .utils import get_correct_path, canonical_file_path
 import networkx as nx
 from typing import Optional
 import clang.cindex
+import logging
 import os
 
+# Identité des nœuds du graph : "name" indexe les nœuds par fichier#position dans le namespace,
+# "usr" par l'USR libclang de l'entité (identique d'une unité de traduction à l'autre)
+NAME_IDENTITY = "name"
+USR_IDENTITY = "usr"
+IDENTITY_MODES = (NAME_IDENTITY, USR_IDENTITY)
+
+# Types des nœuds créés par une référence (appel, type utilisé) plutôt que par une déclaration
+REFERENCE_NODE_TYPES = ("call_expr", "member_ref_expr", "type_ref")
+
 @dataclass
+class EntityContext:
+    """
+    Contexte d'extraction propre à une unité de traduction, partagé par toutes ses entités.
+    working_dir est le dossier d'exécution de la commande de compilation : les chemins
+    relatifs renvoyés par libclang sont résolus depuis ce dossier et non depuis le
+    répertoire courant du processus, ce qui permet d'analyser plusieurs unités en parallèle.
+    identity est le mode d'identité des nœuds (voir IDENTITY_MODES).
+    namespace_prefixes mémorise, pour chaque parent sémantique déjà rencontré, la liste des
+    namespaces et classes qui le contiennent (None désactive la mémorisation).
+    resolutions mémorise la Resolution de chaque curseur référencé (None la désactive).
+    semantic_parents donne le parent sémantique de curseurs dont il est connu sans le lire de
+    libclang (portées relevées par flat_ast.capture_flat_ast, voir FlatAST.scopes).
+    """
+    working_dir: str = field(default_factory=os.getcwd)
+    identity: str = NAME_IDENTITY
+    namespace_prefixes: Optional[dict] = field(default_factory=dict, repr=False)
+    resolutions: Optional[dict] = field(default_factory=dict, repr=False)
+    semantic_parents: dict = field(default_factory=dict, repr=False)
+
+@dataclass
+class Resolution:
+    """
+    Résolution d'un curseur référencé par un appel ou un type : sa définition (à défaut sa
+    déclaration, declaration_only est alors vrai ; None si aucune n'est trouvée) et les
+    attributs des entités déjà construites depuis ce curseur, par (classe d'entité, signature).
+    """
+    definition: Optional[clang.cindex.Cursor]
+    declaration_only: bool = False
+    entities: dict = field(default_factory=dict)
+
+def resolve_reference(referenced: clang.cindex.Cursor, cache: Optional[dict] = None) -> Resolution:
+    """
+    Résout la définition d'un curseur référencé, une seule fois par unité de traduction
+    si un cache (EntityContext.resolutions) est fourni.
+    """
+    if cache is not None:
+        resolution = cache.get(referenced)
+        if resolution is not None:
+            return resolution
+    definition = referenced.get_definition()
+    declaration_only = False
+    if definition is None:
+        try :
+            definition = referenced.get_declaration()
+            declaration_only = definition is not None
+        except : 
+            pass
+    resolution = Resolution(definition, declaration_only)
+    if cache is not None:
+        cache[referenced] = resolution
+    return resolution
+
 class Entity:
-    name: str = field(init=False)
-    decl_file: Optional[str] = field(init=False)
-    decl_file_row: int = field(init=False)
-    decl_file_column: int = field(init=False)
-    namespace_position: Optional[str] = field(init=False)
+    """
+    Entité du graph construite à partir d'un node de l'AST : nom, fichier, ligne, colonne et
+    position dans le namespace. Chaque attribut n'est calculé qu'à sa première lecture (par
+    add_to_graph ou pour le nom du nœud) puis gardé dans les slots de l'entité : en identité
+    "usr", une référence vers un nœud déjà présent ne lit ni sa localisation ni ses parents.
+    """
+    __slots__ = ("context", "node", "scope_node", "usr_cursor", "_short_name", "_decl_file",
+                 "_decl_file_row", "_decl_file_column", "_qualified_name", "_label", "_usr")
 
-    def __init__(self, node: clang.cindex.Cursor):
+    context: EntityContext
+    # Curseur dont la localisation est reprise
+    node: clang.cindex.Cursor
+    # Curseur dont les parents sémantiques donnent la position dans le namespace
+    scope_node: clang.cindex.Cursor
+    # Curseur dont l'USR identifie l'entité en identité "usr"
+    usr_cursor: Optional[clang.cindex.Cursor]
+    _short_name: Optional[str]
+    _decl_file: Optional[str]
+    _decl_file_row: Optional[int]
+    _decl_file_column: Optional[int]
+    _qualified_name: Optional[str]
+    _label: Optional[str]
+    _usr: Optional[str]
+
+    def __init__(self, node: clang.cindex.Cursor, context: Optional[EntityContext] = None):
         """
-        Initialise l'entité à partir d'un node de l'AST.
-        Extraction automatique du nom, fichier, ligne, colonne et position dans le namespace.
+        Initialise l'entité à partir d'un node de l'AST, sans rien lire de libclang.
         """
+        if context is None:
+            context = EntityContext()
+        self.context = context
+        self.node = node
+        self.scope_node = node
+        self.usr_cursor = node
+        self._short_name = None
+        self._decl_file = None
+        self._decl_file_row = None
+        self._decl_file_column = None
+        self._qualified_name = None
+        self._label = None
+        self._usr = None
 
-        # Extraction des informations de localisation
-        self.decl_file_row = node.location.line if node.location else "Decl file non trouvée"
-        self.decl_file_column = node.location.column if node.location else "Decl file non trouvée"
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(name={self.name!r})"
 
-        file = node.location.file
+    def _locate(self) -> None:
+        """
+        Extraction des informations de localisation, en une seule lecture de la location.
+        """
+        location = self.node.location
+        self._decl_file_row = location.line
+        self._decl_file_column = location.column
 
+        file = location.file
         if file :
-            # self.decl_file = os.path.normpath(file.name)
-            self.decl_file = get_correct_path(os.path.normpath(file.name))
+            self._decl_file = canonical_file_path(file.name, self.context.working_dir)
 
-        elif self.decl_file_row == 0 and (file is None) : 
+        elif self._decl_file_row == 0 : 
             # En general quand le file n'est par trouvé c'est prsq le node est le root du fichier
-            # self.decl_file = node.spelling
-            self.decl_file = get_correct_path(node.spelling)
+            self._decl_file = get_correct_path(self.node.spelling, self.context.working_dir)
             
         else : 
-            self.decl_file = 'Decl_file non trouvée'
+            self._decl_file = 'Decl_file non trouvée'
+
+    @property
+    def decl_file(self) -> str:
+        if self._decl_file is None:
+            self._locate()
+        return self._decl_file
 
-        self.name = node.spelling
+    @property
+    def decl_file_row(self) -> int:
+        if self._decl_file_row is None:
+            self._locate()
+        return self._decl_file_row
 
-        # Construction de la hiérarchie du namespace
-        self.namespace_position = self._build_namespace_position(node)
-        
-        if '::' in self.name :
-            self.name = self.name.split('::')[-1]
+    @property
+    def decl_file_column(self) -> int:
+        if self._decl_file_column is None:
+            self._locate()
+        return self._decl_file_column
 
-        #if self.decl_file != self.name: # Si on est sur le root pour eviter file.cpp#file.cpp
-        self.name = f"{self.decl_file}#{self.namespace_position}"
+    @property
+    def short_name(self) -> str:
+        """
+        Nom de l'entité dans son scope (la signature complète pour une fonction).
+        """
+        if self._short_name is None:
+            self._short_name = self._compute_short_name()
+        return self._short_name
+
+    def _compute_short_name(self) -> str:
+        return self.node.spelling
+
+    def _scoped_name(self) -> str:
+        if self._qualified_name is None:
+            self._qualified_name = self._build_namespace_position(self.scope_node, self.short_name)
+        return self._qualified_name
+
+    @property
+    def namespace_position(self) -> str:
+        return self._scoped_name()
+
+    @property
+    def label(self) -> str:
+        if self._label is None:
+            self._label = f"{self.decl_file}#{self._scoped_name()}"
+        return self._label
+
+    @property
+    def usr(self) -> str:
+        """
+        USR de usr_cursor en identité "usr" ; vide sinon, ou pour une entité sans USR
+        (racine, appel non résolu) qui garde alors son label comme identité.
+        """
+        if self._usr is None:
+            self._usr = ""
+            if self.context.identity == USR_IDENTITY and self.usr_cursor is not None:
+                self._usr = self.usr_cursor.get_usr()
+        return self._usr
 
-    def _build_namespace_position(self, node: clang.cindex.Cursor) -> Optional[str]:
+    @property
+    def name(self) -> str:
         """
-        Parcourt les parents du node pour reconstituer la position dans la hiérarchie
-        des namespaces et classes (ex: Namespace::Class::...).
+        Identité du nœud dans le graph : l'USR s'il est utilisé, sinon le label.
         """
-        parts = []
-        parent = node.semantic_parent
+        return self.usr or self.label
 
-        # On parcourt jusqu'au niveau de translation unit pour construire le chemin complet
-        while parent and parent.kind != clang.cindex.CursorKind.TRANSLATION_UNIT:
-            if parent.kind in [
-                clang.cindex.CursorKind.NAMESPACE, 
-                clang.cindex.CursorKind.CLASS_DECL, 
-                clang.cindex.CursorKind.STRUCT_DECL
-            ]:
-                # On insère en début de liste pour avoir l'ordre hiérarchique
-                parts.insert(0, parent.spelling)
-            parent = parent.semantic_parent
+    def _restore(self, resolution: Optional[Resolution], key: tuple) -> bool:
+        """
+        Reprend les attributs d'une entité déjà construite depuis la même définition.
+        """
+        if resolution is None or key not in resolution.entities:
+            return False
+        for slot, value in zip(Entity.__slots__[1:], resolution.entities[key]):
+            setattr(self, slot, value)
+        return True
+
+    def _remember(self, resolution: Optional[Resolution], key: tuple) -> None:
+        """
+        Mémorise les attributs de l'entité, s'ils ne dépendent que de la définition résolue
+        (et pas de la position de la référence elle-même). Ils sont tous calculés une fois
+        ici, et gardés sans le contexte : le cache du contexte ne doit pas le référencer.
+        """
+        if self.context.resolutions is not None and resolution is not None and resolution.definition is not None:
+            # Les propriétés paresseuses remplissent les slots à la première lecture : elles sont
+            # lues avant la copie des slots, qui sinon garderait des valeurs non calculées
+            for name in ("label", "namespace_position", "usr"):
+                getattr(self, name)
+            resolution.entities[key] = tuple(getattr(self, slot) for slot in Entity.__slots__[1:])
+
+    def _build_namespace_position(self, node: clang.cindex.Cursor, name: str) -> str:
+        """
+        Reconstitue la position du node dans la hiérarchie des namespaces et classes
+        (ex: Namespace::Class::name) à partir de ses parents sémantiques.
+        """
+        semantic_parents = self.context.semantic_parents
+        if semantic_parents and node in semantic_parents:
+            parent = semantic_parents[node]
+        else:
+            parent = node.semantic_parent
+        parts = namespace_prefix(parent, self.context.namespace_prefixes)
 
         if parts :
-            namespace_position = f"{'::'.join(parts)}::{self.name}"
+            namespace_position = f"{'::'.join(parts)}::{name}"
         else :
-            namespace_position = self.name
+            namespace_position = name
 
         namespace_position = namespace_position.split('class ')[-1]
 
@@ -80,29 +245,102 @@ class Entity:
     def add_to_graph(self, graph: nx.DiGraph, node_type):
         """
         Ajoute L'entitée au graph, avec tout ses attributs
+        En identité "usr", le nœud d'une entité déjà présente n'est mis à jour que selon _replaces.
         """
-        graph.add_node(
-            self.name,
-            label = self.name, 
+        if self.usr:
+            existing = graph.nodes.get(self.name)
+            if existing is not None and not self._replaces(existing, node_type):
+                return
+        attributes = dict(
+            label = self.label,
             declaration_file = self.decl_file, 
             declaration_file_row = self.decl_file_row,
             declaration_file_column = self.decl_file_column,
             namespace_position = self.namespace_position,
             node_type = node_type
             )
+        if self.usr:
+            attributes["usr"] = self.usr
+        graph.add_node(self.name, **attributes)
+
+    def _replaces(self, existing: dict, node_type: str) -> bool:
+        """
+        En identité "usr", un appel ou un type utilisé partage le nœud de l'entité référencée :
+        une déclaration remplace les attributs d'une référence, jamais l'inverse, et entre
+        deux déclarations (en-tête puis définition) celle d'un .cpp est privilégiée.
+        """
+        if node_type in REFERENCE_NODE_TYPES:
+            # Sans lire la localisation de la référence
+            return False
+        return replaces_attributes(existing, node_type, self.decl_file)
     
-@dataclass
 class FunctionEntity(Entity):
-    def __init__(self, node: clang.cindex.Cursor):
-        # On calcule la signature complète avant d'initialiser le reste
-        signature = get_function_signature(node)
-        # Appel à l'initialisation de la classe parente pour récupérer les autres attributs
-        super().__init__(node)
+    __slots__ = ()
+
+    def _compute_short_name(self) -> str:
         # On remplace le nom par la signature complète
-        self.name = signature
-        self.namespace_position = self._build_namespace_position(node)
-        self.name = f"{self.decl_file}#{self.namespace_position}"
+        return get_function_signature(self.node)
     
+def replaces_attributes(existing: dict, node_type: str, declaration_file: str) -> bool:
+    """
+    Vrai si les attributs d'un nœud de type node_type déclaré dans declaration_file doivent
+    remplacer ceux d'un nœud existant de même identité (voir Entity._replaces).
+    """
+    if node_type in REFERENCE_NODE_TYPES:
+        return False
+    if existing.get("node_type") in REFERENCE_NODE_TYPES:
+        return True
+    return str(declaration_file).endswith(".cpp") and not str(existing.get("declaration_file", "")).endswith(".cpp")
+
+class TranslationUnitEntity(Entity):
+    """
+    Racine du graph : l'unité de traduction, nommée par source_file s'il est donné plutôt que
+    par le spelling de son curseur (une unité rechargée nomme son source par son chemin absolu).
+    """
+    __slots__ = ("source_file",)
+
+    def __init__(self, node: clang.cindex.Cursor, context: Optional[EntityContext] = None, source_file: Optional[str] = None):
+        super().__init__(node, context)
+        self.source_file = source_file
+
+    def _compute_short_name(self) -> str:
+        return self.source_file if self.source_file is not None else self.node.spelling
+
+    def _locate(self) -> None:
+        super()._locate()
+        if self.source_file is not None:
+            self._decl_file = get_correct_path(self.source_file, self.context.working_dir)
+
+# Parents sémantiques qui apparaissent dans la position d'une entité
+SCOPE_KINDS = (clang.cindex.CursorKind.NAMESPACE, clang.cindex.CursorKind.CLASS_DECL, clang.cindex.CursorKind.STRUCT_DECL)
+
+def namespace_prefix(parent: Optional[clang.cindex.Cursor], cache: Optional[dict] = None) -> tuple:
+    """
+    Retourne les noms des namespaces et classes englobant parent (inclus), du plus externe
+    au plus interne, en remontant les parents sémantiques jusqu'à l'unité de traduction.
+    Avec un cache, chaque parent n'est remonté qu'une fois par unité de traduction : les
+    ancêtres déjà connus sont réutilisés.
+    """
+    # Remonte jusqu'à l'unité de traduction ou jusqu'au premier ancêtre déjà connu
+    chain = []
+    prefix = ()
+    while parent and parent.kind != clang.cindex.CursorKind.TRANSLATION_UNIT:
+        if cache is not None:
+            known = cache.get(parent)
+            if known is not None:
+                prefix = known
+                break
+        chain.append(parent)
+        parent = parent.semantic_parent
+
+    # Redescend en complétant le préfixe de chaque ancêtre parcouru
+    for ancestor in reversed(chain):
+        if ancestor.kind in SCOPE_KINDS:
+            prefix = prefix + (ancestor.spelling,)
+        if cache is not None:
+            cache[ancestor] = prefix
+    return prefix
+
 def get_function_signature(node: clang.cindex.Cursor) -> str:
     """
     Construit la signature complète d'une fonction, incluant son nom et ses paramètres.
@@ -123,86 +361,97 @@ def get_function_signature(node: clang.cindex.Cursor) -> str:
     return signature
 
 
-@dataclass
 class FunctionCallEntity(Entity):
-    def __init__(self, node: clang.cindex.Cursor):
-        # On calcule la signature complète avant d'initialiser le reste
+    __slots__ = ()
+
+    def __init__(self, node: clang.cindex.Cursor, context: Optional[EntityContext] = None):
+        if context is None:
+            context = EntityContext()
+        # On calcule la signature complète (nom de l'appel) avant d'initialiser le reste
         signature = get_function_signature(node)
+        referenced = node.referenced
 
-        if node.referenced: 
-            new_node = node.referenced.get_definition()
-            if new_node is None:
-                try :
-                    new_node = node.referenced.get_declaration()
-                    if new_node is None:
-                        node = node
-                    else : 
-                        node = new_node
-                except : 
-                    #print(f"From func {node.spelling}")
-                    pass
-            else : 
-                node = new_node
-
-        # Appel à l'initialisation de la classe parente pour récupérer les autres attributs
-        super().__init__(node)
-        # On remplace le nom par la signature complète
-        self.name = signature
-        self.namespace_position = self._build_namespace_position(node)
-        self.name = f"{self.decl_file}#{self.namespace_position}"
+        resolution = None
+        definition = None
+        if referenced: 
+            # Une fonction appelée plusieurs fois n'est résolue et construite qu'une fois
+            resolution = resolve_reference(referenced, context.resolutions)
+            if self._restore(resolution, (FunctionCallEntity, signature)):
+                self.context = context
+                return
+            definition = resolution.definition
+
+        # La localisation et la position sont celles de la fonction appelée, si elle est trouvée
+        super().__init__(definition if definition is not None else node, context)
+        self._short_name = signature
+        # L'identité est celle de la fonction appelée, même si seule sa déclaration est connue
+        self.usr_cursor = referenced or node
+        self._remember(resolution, (FunctionCallEntity, signature))
 
-@dataclass
 class TypeRefEntity(Entity):
-    def __init__(self, node: clang.cindex.Cursor):
-        # On calcule la signature complète avant d'initialiser le reste
+    __slots__ = ()
 
-        if node.referenced: 
-            new_node = node.referenced.get_definition()
-            if new_node is None:
-                try :
-                    new_node = node.referenced.get_declaration()
-                    if new_node is None:
-                        node = node
-                    else : 
-                        node = new_node
-                except : 
-                    #print(f"From Type {node.spelling}")
-                    pass
-            else : 
-                node = new_node
-
-
-        # Appel à l'initialisation de la classe parente pour récupérer les autres attributs
-        super().__init__(node)
-        # On remplace le nom par la signature complète
-        self.namespace_position = self.name
+    def __init__(self, node: clang.cindex.Cursor, context: Optional[EntityContext] = None):
+        if context is None:
+            context = EntityContext()
+        referenced = node.referenced
+
+        resolution = None
+        definition = None
+        if referenced: 
+            resolution = resolve_reference(referenced, context.resolutions)
+            if self._restore(resolution, (TypeRefEntity,)):
+                self.context = context
+                return
+            definition = resolution.definition
+
+        super().__init__(definition if definition is not None else node, context)
+        # L'identité est celle du type référencé, même si seule sa déclaration est connue
+        self.usr_cursor = referenced or node
+        self._remember(resolution, (TypeRefEntity,))
+
+    @property
+    def namespace_position(self) -> str:
+        # La position d'un type utilisé est son label complet (fichier#namespace)
+        return self.label
 
-@dataclass
 class ClassFunctionCallEntity(TypeRefEntity):
-    def __init__(self, node: clang.cindex.Cursor):
+    __slots__ = ()
+
+    def __init__(self, node: clang.cindex.Cursor, context: Optional[EntityContext] = None):
+        if context is None:
+            context = EntityContext()
         # On calcule la signature complète avant d'initialiser le reste
         signature = get_function_signature(node)
 
-        class_node = get_class_node(node)
+        class_node = get_class_node(node, context.resolutions)
 
-        # Appel à l'initialisation de la classe parente pour récupérer les autres attributs
-        super().__init__(class_node) # Initialise correctement decl_file row et columns
-        # On remplace le nom par la signature complète
-        self.name = signature
-        self.namespace_position = self._build_namespace_position(node)
-        self.name = f"{self.decl_file}#{self.namespace_position}"
+        # La localisation est celle de la définition de la classe (comme un TypeRefEntity)
+        location_node = class_node
+        if class_node.referenced:
+            definition = resolve_reference(class_node.referenced, context.resolutions).definition
+            if definition is not None:
+                location_node = definition
+        Entity.__init__(self, location_node, context)
+        # Le nom et la position sont ceux de l'appel
+        self.scope_node = node
+        self._short_name = signature
+        # L'identité est celle de la méthode appelée
+        self.usr_cursor = node.referenced
+
+    namespace_position = Entity.namespace_position
 
 
-def get_class_node(node):
+def get_class_node(node, resolutions: Optional[dict] = None):
     if node.kind == clang.cindex.CursorKind.CALL_EXPR:
             for child in node.get_children():
                 if child.kind == clang.cindex.CursorKind.MEMBER_REF_EXPR:
                     for sub_child_1 in child.get_children():
                         if sub_child_1.kind == clang.cindex.CursorKind.DECL_REF_EXPR:
-                            for sub_child_2 in sub_child_1.referenced.get_definition().get_children():
+                            for sub_child_2 in resolve_reference(sub_child_1.referenced, resolutions).definition.get_children():
                                 if sub_child_2.kind == clang.cindex.CursorKind.TYPE_REF:
                                     return sub_child_2
-    print("N'est pas une fonction d'une custom class", node.spelling)
+    logging.debug(f"N'est pas une fonction d'une custom class: {node.spelling}")
     return node
                                     
                             
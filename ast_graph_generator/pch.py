@@ -0,0 +1,213 @@
+# pch.py
+import hashlib
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional
+from .cache import normalize_args
+from .session import AnalysisSession
+
+INCLUDE_RE = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]')
+
+# Nombre minimal d'unités de traduction pour qu'un PCH soit rentable
+# (la première unité du groupe est parsée sans PCH)
+MIN_GROUP_SIZE = 3
+
+@dataclass
+class PchGroup:
+    """
+    Unités de traduction compilées avec les mêmes options et partageant les mêmes
+    includes de tête : ces includes sont précompilés une seule fois pour tout le groupe.
+    Le premier job du groupe est parsé sans PCH et sert de référence de temps.
+    """
+    key: str
+    jobs: list
+    includes: list[str]
+    pch_path: Optional[str] = None
+    build_time: Optional[float] = None
+    error: Optional[str] = None
+
+def pch_group_key(args: list[str], directory: str) -> str:
+    """
+    Clé de regroupement : le dossier d'exécution et les options normalisées, sans les warnings
+    qui n'affectent pas l'AST. Un PCH n'est valide que pour des options de compilation identiques,
+    interprétées depuis le même dossier (macros et chemins relatifs).
+    """
+    flags = [arg for arg in normalize_args(args, directory) if not arg.startswith('-W')]
+    return hashlib.sha1("\0".join([os.path.normpath(directory)] + flags).encode()).hexdigest()[:16]
+
+GUARD_RE = re.compile(r'^\s*#\s*(?:pragma\s+once|ifndef\s+(\w+)|if\s+!\s*defined\s*\(?\s*(\w+))')
+
+def has_include_guard(header_path: str) -> bool:
+    """
+    Vérifie que l'en-tête est protégé (#pragma once ou #ifndef/#define en tête de fichier) :
+    inclus une première fois par le PCH puis une seconde fois par le source, un en-tête non
+    protégé produirait des redéfinitions.
+    """
+    try:
+        with open(header_path, "r", errors="replace") as f:
+            lines = [line.strip() for line in f if line.strip() and not line.strip().startswith("//")]
+    except OSError:
+        return False
+    for i, line in enumerate(lines[:50]):
+        if line.startswith("/*") or line.startswith("*"):
+            continue
+        match = GUARD_RE.match(line)
+        if match is None:
+            return False
+        guard = match.group(1) or match.group(2)
+        if guard is None:
+            return True
+        return i + 1 < len(lines) and re.match(rf'^#\s*define\s+{guard}\b', lines[i + 1]) is not None
+    return False
+
+def include_dirs(args: list[str], directory: str) -> tuple[list[str], list[str]]:
+    """
+    Retourne les dossiers de recherche des includes entre guillemets et entre chevrons.
+    """
+    quote_dirs, angle_dirs = [], []
+    normalized = normalize_args(args, directory)
+    for i, arg in enumerate(normalized):
+        for option, targets in (('-iquote', (quote_dirs,)), ('-I', (quote_dirs, angle_dirs)), ('-isystem', (quote_dirs, angle_dirs))):
+            if arg == option and i + 1 < len(normalized):
+                path = normalized[i + 1]
+            elif arg.startswith(option) and len(arg) > len(option) and not arg.startswith('-include'):
+                path = arg[len(option):]
+            else:
+                continue
+            for target in targets:
+                target.append(path)
+            break
+    return quote_dirs, angle_dirs
+
+def scan_preamble_includes(source_file: str, directory: Optional[str] = None, quote_dirs: list[str] = (), angle_dirs: list[str] = ()) -> list[str]:
+    """
+    Retourne les #include du début du fichier, jusqu'à la première ligne de code, autre
+    directive ou en-tête non protégé. Un include entre chevrons introuvable dans angle_dirs
+    est un en-tête système.
+
+    Les en-têtes trouvés sont désignés par leur chemin absolu, comme libclang les enregistre
+    de toute façon dans le PCH.
+    """
+    if directory is None:
+        directory = os.getcwd()
+    source_path = os.path.join(directory, source_file)
+    source_dir = os.path.dirname(source_path)
+    includes = []
+    in_comment = False
+    with open(source_path, "r", errors="replace") as f:
+        for line in f:
+            stripped = line.strip()
+            if in_comment:
+                in_comment = "*/" not in stripped
+                continue
+            if not stripped or stripped.startswith("//"):
+                continue
+            if stripped.startswith("/*"):
+                in_comment = "*/" not in stripped
+                continue
+            match = INCLUDE_RE.match(stripped)
+            if match is None:
+                break
+            delimiter, name = match.groups()
+            search_dirs = ([source_dir] + list(quote_dirs)) if delimiter == '"' else list(angle_dirs)
+            header_path = next((os.path.normpath(os.path.join(d, name)) for d in search_dirs
+                                if os.path.isfile(os.path.join(d, name))), None)
+            if header_path is None and delimiter == '"':
+                break
+            if header_path is None:
+                includes.append(f'#include <{name}>')
+            elif has_include_guard(header_path):
+                includes.append(f'#include "{header_path}"')
+            else:
+                break
+    return includes
+
+def common_preamble(include_lists: list[list[str]]) -> list[str]:
+    """
+    Plus long préfixe commun des listes d'includes : seul un préfixe garantit que le PCH
+    est inclus dans le même ordre que dans chaque source.
+    """
+    if not include_lists:
+        return []
+    prefix = include_lists[0]
+    for includes in include_lists[1:]:
+        length = 0
+        while length < min(len(prefix), len(includes)) and prefix[length] == includes[length]:
+            length += 1
+        prefix = prefix[:length]
+    return prefix
+
+def group_jobs_for_pch(jobs: list, min_group_size: int = MIN_GROUP_SIZE) -> list[PchGroup]:
+    """
+    Regroupe les jobs par options de compilation et garde les groupes assez grands
+    qui partagent au moins un include de tête.
+    """
+    by_key = {}
+    for job in jobs:
+        by_key.setdefault(pch_group_key(job.args, job.directory), []).append(job)
+
+    groups = []
+    for key, group_jobs in by_key.items():
+        if len(group_jobs) < min_group_size:
+            continue
+        # Les options sont identiques dans le groupe, seuls les -I relatifs dépendent du dossier
+        include_lists = []
+        for job in group_jobs:
+            try:
+                quote_dirs, angle_dirs = include_dirs(job.args, job.directory)
+                include_lists.append(scan_preamble_includes(job.source_file, job.directory, quote_dirs, angle_dirs))
+            except OSError:
+                include_lists.append([])
+        includes = common_preamble(include_lists)
+        if includes:
+            groups.append(PchGroup(key, group_jobs, includes))
+    return groups
+
+def build_group_pch(key: str, includes: list[str], args: list[str], directory: str, pch_dir: str, session: AnalysisSession) -> tuple[str, float]:
+    """
+    Écrit l'en-tête regroupant les includes communs puis le précompile avec les options du groupe.
+    Retourne le chemin du PCH et le temps de construction ; lève une exception en cas d'échec.
+    """
+    os.makedirs(pch_dir, exist_ok=True)
+    header_path = os.path.join(pch_dir, f"{key}.h")
+    pch_path = os.path.join(pch_dir, f"{key}.pch")
+    with open(header_path, "w") as f:
+        f.write("\n".join(includes) + "\n")
+
+    start = time.perf_counter()
+    # Mêmes options que create_ast_graph_from_file_with_args, sinon le PCH est refusé
+    pch_args = ["-std=c++11"] + args + ["-working-directory", directory, "-x", "c++-header"]
+    translation_unit = session.parse(header_path, pch_args)
+    translation_unit.save(pch_path)
+    build_time = time.perf_counter() - start
+    del translation_unit
+    session.release()
+    return pch_path, build_time
+
+def format_pch_report(groups: list[PchGroup], results: list) -> list[str]:
+    """
+    Lignes du résumé : pour chaque groupe, temps de construction du PCH, temps de parsing
+    moyen avec PCH et gain estimé par rapport au temps de parsing de l'unité de référence.
+    """
+    by_output = {result.graph_file_path: result for result in results}
+    lines = []
+    for group in groups:
+        if group.pch_path is None:
+            lines.append(f"PCH {group.key}: {len(group.jobs)} unités, non construit ({group.error})")
+            continue
+        reference = by_output.get(group.jobs[0].graph_file_path)
+        reference_time = reference.parse_time if reference is not None else None
+        with_pch = [by_output[job.graph_file_path].parse_time for job in group.jobs[1:]
+                    if job.graph_file_path in by_output and by_output[job.graph_file_path].used_pch]
+        if reference_time is None or not with_pch:
+            lines.append(f"PCH {group.key}: {len(group.jobs)} unités, construit en {group.build_time:.2f}s, gain non mesurable")
+            continue
+        saving = len(with_pch) * reference_time - sum(with_pch) - group.build_time
+        lines.append(
+            f"PCH {group.key}: {len(group.jobs)} unités, {len(group.includes)} includes, "
+            f"construit en {group.build_time:.2f}s, parsing {reference_time:.2f}s sans PCH / "
+            f"{sum(with_pch) / len(with_pch):.2f}s avec PCH, gain estimé {saving:.2f}s"
+        )
+    return lines
@@ -0,0 +1,292 @@
+# query_daemon.py
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from stat import S_ISSOCK
+from typing import Optional
+import networkx as nx
+from .global_graph import assemble_global_graph, find_graph_files
+
+DEFAULT_SOCKET_NAME = "graph_query.sock"
+
+# Intervalle de vérification du fichier du snapshot (secondes)
+WATCH_INTERVAL = 2.0
+
+CALLS = "calls_function"
+USES_CUSTOM_TYPE = "uses_custom_type"
+# Toutes les relations contains_* sont regroupées sous CONTAINS
+CONTAINS = "contains"
+
+# Requête -> (relation, sens) : "out" suit les arêtes depuis le nœud demandé, "in" vers lui
+QUERIES = {
+    "callers": (CALLS, "in"),
+    "callees": (CALLS, "out"),
+    "contains": (CONTAINS, "out"),
+    "uses_custom_type": (USES_CUSTOM_TYPE, "out"),
+}
+
+def _relation_group(relation: Optional[str]) -> Optional[str]:
+    if relation is not None and relation.startswith("contains_"):
+        return CONTAINS
+    return relation
+
+def _search_names(position: str) -> tuple:
+    # ns::Shape::area() -> ns::Shape::area, area
+    qualified = position.split("(", 1)[0]
+    return qualified, qualified.rsplit("::", 1)[-1]
+
+class GraphIndex:
+    """
+    Index en mémoire du graph global, construit une fois par snapshot : les nœuds sont
+    numérotés, les arêtes rangées par relation et par sens en listes d'adjacence, et les
+    nœuds retrouvés par identifiant, namespace_position, label ou nom sans paramètres.
+    L'index n'est jamais modifié après sa construction : il est partagé sans verrou entre
+    les requêtes, un nouveau snapshot remplaçant l'index entier.
+    """
+
+    def __init__(self, graph: nx.DiGraph, source: str = ""):
+        self.source = source
+        self.loaded_at = time.time()
+        self.ids = list(graph.nodes)
+        self.attributes = [data for _, data in graph.nodes(data=True)]
+        self.positions = {node: i for i, node in enumerate(self.ids)}
+
+        self.names = {}
+        for i, data in enumerate(self.attributes):
+            keys = {self.ids[i], data.get("label"), data.get("namespace_position")}
+            if data.get("namespace_position"):
+                keys.update(_search_names(data["namespace_position"]))
+            for key in keys:
+                if key:
+                    self.names.setdefault(key, []).append(i)
+
+        self.adjacency = {(relation, direction): {} for relation, direction in QUERIES.values()}
+        for u, v, relation in graph.edges(data="relation"):
+            group = _relation_group(relation)
+            source, target = self.positions[u], self.positions[v]
+            if (group, "out") in self.adjacency:
+                self.adjacency[(group, "out")].setdefault(source, []).append(target)
+            if (group, "in") in self.adjacency:
+                self.adjacency[(group, "in")].setdefault(target, []).append(source)
+        self.edge_count = graph.number_of_edges()
+
+    def find(self, name: str) -> list[int]:
+        """
+        Nœuds désignés par name : identifiant exact, sinon namespace_position ou label, sinon
+        nom sans paramètres (toutes les surcharges), qualifié ou non (tous les namespaces).
+        """
+        if name in self.positions:
+            return [self.positions[name]]
+        return self.names.get(name, [])
+
+    def describe(self, i: int) -> dict:
+        data = self.attributes[i]
+        return {
+            "id": self.ids[i],
+            "label": data.get("label"),
+            "node_type": data.get("node_type"),
+            "declaration_file": data.get("declaration_file"),
+            "declaration_file_row": data.get("declaration_file_row"),
+        }
+
+    def query(self, query: str, name: str) -> dict:
+        """
+        Répond à une requête de QUERIES pour les nœuds désignés par name.
+        """
+        if query not in QUERIES:
+            raise ValueError(f"Requête inconnue {query!r} (attendu : {', '.join(QUERIES)})")
+        adjacency = self.adjacency[QUERIES[query]]
+        matches = self.find(name)
+        results, seen = [], set()
+        for i in matches:
+            for j in adjacency.get(i, ()):
+                if j not in seen:
+                    seen.add(j)
+                    results.append(j)
+        return {"matches": [self.ids[i] for i in matches], "results": [self.describe(j) for j in results]}
+
+    def stats(self) -> dict:
+        return {"source": self.source, "loaded_at": self.loaded_at, "nodes": len(self.ids), "edges": self.edge_count}
+
+def load_snapshot(source: str, n_jobs: int = 1) -> GraphIndex:
+    """
+    Construit l'index d'un snapshot : un graph global (.graphml ou .graphml.gz), ou un dossier
+    de graphes d'unités de traduction assemblés à la volée (voir global_graph).
+    """
+    if os.path.isdir(source):
+        graph = assemble_global_graph(find_graph_files(source), n_jobs)
+    else:
+        graph = nx.read_graphml(source)
+    return GraphIndex(graph, source)
+
+def _snapshot_stamp(source: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    Retire la socket laissée par un démon arrêté sans l'avoir supprimée (connexion refusée).
+    Une socket sur laquelle un démon écoute encore, ou un fichier qui n'est pas une socket,
+    est laissé en place : FileExistsError.
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} existe et n'est pas une socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+        except FileNotFoundError:
+            return
+    raise FileExistsError(f"Un démon écoute déjà sur {socket_path}")
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serveur de requêtes sur une socket Unix locale (accessible au seul propriétaire). Chaque
+    connexion envoie des requêtes JSON, une par ligne, et reçoit une réponse JSON par ligne :
+      {"query": "callers", "name": "ns::f"}   -> {"ok": true, "matches": [...], "results": [...]}
+      {"query": "stats"}                      -> {"ok": true, "nodes": ..., "edges": ..., ...}
+      {"query": "reload", "source": "..."}    -> recharge le snapshot (source facultative)
+    Le snapshot est rechargé en arrière-plan et remplace l'index d'un seul coup : les requêtes
+    en cours finissent sur l'ancien index, les suivantes utilisent le nouveau.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, source: str, n_jobs: int = 1):
+        # Avant le chargement du snapshot : un démon déjà lancé sur cette socket n'est pas remplacé
+        _remove_stale_socket(socket_path)
+        self.socket_path = socket_path
+        self.source = source
+        self.n_jobs = n_jobs
+        self.index = load_snapshot(source, n_jobs)
+        self.stamp = _snapshot_stamp(source)
+        self.reload_lock = threading.Lock()
+        # Socket créée sans droits pour les autres utilisateurs
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, QueryHandler)
+        finally:
+            os.umask(umask)
+
+    def reload(self, source: Optional[str] = None) -> GraphIndex:
+        """
+        Construit l'index du nouveau snapshot puis le substitue à l'index courant.
+        """
+        with self.reload_lock:
+            source = source or self.source
+            stamp = _snapshot_stamp(source)
+            index = load_snapshot(source, self.n_jobs)
+            self.source, self.stamp, self.index = source, stamp, index
+            return index
+
+    def watch(self, interval: float = WATCH_INTERVAL) -> threading.Thread:
+        """
+        Recharge le snapshot dès que son fichier change (fin d'une exécution de l'analyseur).
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                stamp = _snapshot_stamp(self.source)
+                if stamp is not None and stamp != self.stamp:
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        # Fichier en cours d'écriture : nouvel essai au prochain passage
+                        print(f"Erreur lors du rechargement de {self.source}: {e}")
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = {"ok": True, **self.answer(json.loads(line))}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    def answer(self, request: dict) -> dict:
+        query = request.get("query")
+        if query == "stats":
+            return self.server.index.stats()
+        if query == "reload":
+            return self.server.reload(request.get("source")).stats()
+        # Un seul index par requête, même si un rechargement a lieu pendant la réponse
+        index = self.server.index
+        return index.query(query, request.get("name", ""))
+
+def send_request(socket_path: str, request: dict, timeout: Optional[float] = None) -> dict:
+    """
+    Envoie une requête au démon et retourne sa réponse.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as stream:
+            response = json.loads(stream.readline())
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error"))
+    return response
+
+def main():
+    parser = argparse.ArgumentParser(description="Démon de requêtes sur le graph global (socket Unix locale).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="Charge le snapshot et répond aux requêtes")
+    serve.add_argument('source', help="Graph global (.graphml, .graphml.gz) ou dossier des graphes d'unités de traduction")
+    serve.add_argument('--socket', default=DEFAULT_SOCKET_NAME, help="Chemin de la socket Unix")
+    serve.add_argument('--jobs', '-j', type=int, default=1, help="Nombre de processus lisant les graphes d'un dossier")
+    serve.add_argument('--no-watch', action='store_true', help="Ne recharge le snapshot que sur requête 'reload'")
+    client = subparsers.add_parser("query", help="Interroge un démon lancé")
+    client.add_argument('query', choices=list(QUERIES) + ["stats", "reload"])
+    client.add_argument('name', nargs='?', default="", help="Identifiant, position ou nom de l'entité (source du snapshot pour 'reload')")
+    client.add_argument('--socket', default=DEFAULT_SOCKET_NAME, help="Chemin de la socket Unix")
+    cli_args = parser.parse_args()
+
+    if cli_args.command == "query":
+        request = {"query": cli_args.query}
+        if cli_args.query == "reload":
+            if cli_args.name:
+                request["source"] = cli_args.name
+        else:
+            request["name"] = cli_args.name
+        print(json.dumps(send_request(cli_args.socket, request), indent=2, ensure_ascii=False))
+        return
+
+    try:
+        server = QueryServer(cli_args.socket, cli_args.source, cli_args.jobs)
+    except FileExistsError as e:
+        parser.exit(1, f"{e}\n")
+    with server:
+        if not cli_args.no_watch:
+            server.watch()
+        stats = server.index.stats()
+        print(f"Snapshot {stats['source']} chargé : {stats['nodes']} nœuds, {stats['edges']} arêtes, en écoute sur {cli_args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# session.py
+import logging
+import os
+import threading
+from typing import Optional
+import clang.cindex
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Retourne la mémoire résidente actuelle du processus en Mo, ou None si elle n'est pas mesurable.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+class AnalysisSession:
+    """
+    Session d'analyse propre à un worker : un seul Index libclang réutilisé pour toutes
+    les unités de traduction du worker.
+
+    La mémoire de libclang croît au fil des parsings ; la session recrée donc son Index
+    après max_translation_units unités ou lorsque la mémoire résidente dépasse max_rss_mb.
+    """
+
+    def __init__(self, exclude_decls: bool = False, max_translation_units: Optional[int] = None, max_rss_mb: Optional[float] = None):
+        self.exclude_decls = exclude_decls
+        self.max_translation_units = max_translation_units
+        self.max_rss_mb = max_rss_mb
+        self.index = None
+        self.parsed_since_recycle = 0
+        self.parsed_total = 0
+        self.recycle_count = 0
+        self._create_index()
+
+    def _create_index(self) -> None:
+        self.index = clang.cindex.Index.create(excludeDecls=self.exclude_decls)
+        self.parsed_since_recycle = 0
+
+    def parse(self, source_file: str, args: list[str], options: int = 0) -> clang.cindex.TranslationUnit:
+        """
+        Parse une unité de traduction avec l'Index de la session.
+        """
+        translation_unit = self.index.parse(source_file, args = args, options = options)
+        self.parsed_since_recycle += 1
+        self.parsed_total += 1
+        return translation_unit
+
+    def read(self, ast_path: str) -> clang.cindex.TranslationUnit:
+        """
+        Recharge une unité de traduction sérialisée (TranslationUnit.save) avec l'Index de la
+        session ; comptée comme un parsing pour le recyclage de l'Index.
+        """
+        translation_unit = clang.cindex.TranslationUnit.from_ast_file(ast_path, self.index)
+        self.parsed_since_recycle += 1
+        self.parsed_total += 1
+        return translation_unit
+
+    def should_recycle(self) -> bool:
+        if self.max_translation_units is not None and self.parsed_since_recycle >= self.max_translation_units:
+            return True
+        if self.max_rss_mb is not None:
+            rss = current_rss_mb()
+            if rss is not None and rss >= self.max_rss_mb:
+                return True
+        return False
+
+    def release(self) -> None:
+        """
+        A appeler une fois le graph extrait, après avoir supprimé toute référence vers
+        l'unité de traduction et ses curseurs (elle est alors libérée immédiatement
+        plutôt qu'au prochain parsing). Recrée l'Index si un seuil est atteint.
+        """
+        if self.should_recycle():
+            self.recycle()
+
+    def recycle(self) -> None:
+        logging.debug(f"Recyclage de l'index libclang après {self.parsed_since_recycle} unités de traduction")
+        # L'ancien Index est libéré dès que la dernière unité de traduction qui le référence l'est
+        self.index = None
+        self._create_index()
+        self.recycle_count += 1
+
+# Une session par thread : un Index libclang ne doit pas être partagé entre parsings concurrents
+_thread_state = threading.local()
+
+def get_thread_session(**options) -> AnalysisSession:
+    """
+    Retourne la session du thread courant, créée au premier appel avec les options données.
+    Dans un processus worker, c'est donc la session du worker.
+    """
+    session = getattr(_thread_state, "session", None)
+    if session is None:
+        session = _thread_state.session = AnalysisSession(**options)
+    return session
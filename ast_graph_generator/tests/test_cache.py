@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+import clang.cindex
+from ast_graph_generator.cache import AnalysisCache, ASTCache, normalize_args
+from ast_graph_generator.session import AnalysisSession
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        os.makedirs(os.path.join(self.dir, "include"))
+        self.write("include/header.h", "namespace NS { class A {}; }\n")
+        self.write("main.cpp", '#include "header.h"\nnamespace NS { void f() {} }\n')
+        self.output = os.path.join(self.dir, "main.graphml")
+        self.write("main.graphml", "")
+        self.args = ["-Iinclude"]
+        self.manifest = os.path.join(self.dir, "manifest.json")
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), "w") as f:
+            f.write(content)
+
+    def record(self):
+        cache = AnalysisCache.load(self.manifest)
+        tu = clang.cindex.Index.create().parse(os.path.join(self.dir, "main.cpp"), args=["-I" + os.path.join(self.dir, "include")])
+        cache.record("main.cpp", self.args, self.dir, self.output, tu)
+        cache.save()
+
+    def test_normalize_args(self):
+        self.assertEqual(normalize_args(["-Iinc", "-isystem", "sys", "-DX"], "/base"),
+                         ["-I/base/inc", "-isystem", "/base/sys", "-DX"])
+
+    def test_unchanged_unit_is_reused(self):
+        self.record()
+        cache = AnalysisCache.load(self.manifest)
+        self.assertTrue(cache.lookup("main.cpp", self.args, self.dir, self.output))
+
+    def test_changes_invalidate_entry(self):
+        self.record()
+        cache = AnalysisCache.load(self.manifest)
+        self.assertFalse(cache.lookup("main.cpp", self.args + ["-DNEW"], self.dir, self.output),
+                         "Des arguments différents doivent invalider l'entrée")
+        self.assertFalse(cache.lookup("main.cpp", self.args, self.dir, self.output, profile="structure"),
+                         "Un graph produit dans un autre mode d'extraction ne doit pas être réutilisé")
+        self.write("include/header.h", "namespace NS { class B {}; }\n")
+        self.assertFalse(cache.lookup("main.cpp", self.args, self.dir, self.output),
+                         "Un header modifié doit invalider l'entrée")
+
+class TestASTCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        os.makedirs(os.path.join(self.dir, "include"))
+        self.write("include/header.h", "namespace NS { class A {}; }\n")
+        self.write("main.cpp", '#include "header.h"\nnamespace NS { void f() { A a; } }\n')
+        self.args = ["-Iinclude"]
+        self.cache = ASTCache(os.path.join(self.dir, "ast_cache"))
+        self.session = AnalysisSession()
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), "w") as f:
+            f.write(content)
+
+    def store(self):
+        key = self.cache.key("main.cpp", self.args, self.dir)
+        tu = self.session.parse("main.cpp", self.args + ["-working-directory", self.dir])
+        self.cache.store(key, tu, "main.cpp", self.dir)
+        return key
+
+    def test_unchanged_unit_is_reloaded(self):
+        key = self.store()
+        tu = self.cache.load(key, self.session)
+        self.assertIsNotNone(tu)
+        spellings = [cursor.spelling for cursor in tu.cursor.walk_preorder() if cursor.kind == clang.cindex.CursorKind.FUNCTION_DECL]
+        self.assertEqual(spellings, ["f"])
+
+    def test_changes_invalidate_unit(self):
+        key = self.store()
+        self.assertNotEqual(self.cache.key("main.cpp", self.args + ["-DNEW"], self.dir), key)
+        self.assertNotEqual(self.cache.key("main.cpp", self.args, self.dir, clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES), key,
+                            "Une unité parsée avec d'autres options ne doit pas être rechargée")
+        self.write("include/header.h", "namespace NS { class B {}; }\n")
+        self.assertIsNone(self.cache.load(key, self.session), "Un header modifié doit invalider l'unité")
+
+if __name__ == "__main__":
+    unittest.main()
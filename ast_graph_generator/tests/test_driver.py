@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from dataclasses import replace
+from unittest import mock
+import config
+from ast_graph_generator.cache import AnalysisCache, MANIFEST_NAME
+from ast_graph_generator import driver
+from ast_graph_generator.driver import CompileJob, parse_args, run_compile_jobs
+from ast_graph_generator.exporter import SqliteGraphStore, SQLITE_FORMAT
+
+_run_worker_job = driver._run_worker_job
+
+def _crashing_worker_job(job):
+    # Simule un crash de libclang : le processus worker meurt sans pouvoir répondre
+    if job.out_name == "crash":
+        os._exit(11)
+    return _run_worker_job(job)
+
+class TestDriver(unittest.TestCase):
+    def test_parse_args(self):
+        args = ["g++", "-o", "out.os", "-c", "-fPIC", "-Iinclude", "-DFOO", "src/file.cpp"]
+        # Les 4 premiers arguments (compilateur, -o, sortie, -c) et le fichier source sont retirés
+        self.assertEqual(parse_args(args), ["-Iinclude", "-DFOO"])
+
+    def test_failed_job_does_not_stop_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "ok.cpp")
+            with open(source, "w") as f:
+                f.write("namespace NS { void f() {} }\n")
+            jobs = [
+                CompileJob("ok.cpp", [], tmp, os.path.join(tmp, "out"), "ok"),
+                CompileJob("missing.cpp", [], os.path.join(tmp, "n_existe_pas"), os.path.join(tmp, "out"), "missing"),
+            ]
+            cwd = os.getcwd()
+            for n_jobs, use_threads in ((1, False), (2, False), (2, True)):
+                summary = run_compile_jobs(jobs, n_jobs=n_jobs, use_threads=use_threads)
+                failures = [result.source_file for result in summary.results if result.error]
+                self.assertEqual(failures, ["missing.cpp"], f"Un seul échec attendu avec {n_jobs} worker(s)")
+                self.assertTrue(os.path.exists(os.path.join(tmp, "out", "ok.graphml")))
+                self.assertEqual(os.getcwd(), cwd, "Le répertoire courant ne doit pas être modifié")
+
+    def test_crashing_worker_fails_only_its_job(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # L'unité qui fait mourir son worker part parmi les premières, les autres attendent encore
+            names = ["u0", "crash"] + [f"u{i}" for i in range(1, 10)]
+            for name in names:
+                with open(os.path.join(tmp, f"{name}.cpp"), "w") as f:
+                    f.write(f"namespace NS {{ void {name}() {{}} }}\n")
+            jobs = [CompileJob(f"{name}.cpp", [], tmp, os.path.join(tmp, "out"), name) for name in names]
+            with mock.patch.object(driver, "_run_worker_job", _crashing_worker_job):
+                summary = run_compile_jobs(jobs, n_jobs=2)
+            self.assertEqual(len(summary.results), len(jobs))
+            self.assertEqual([result.source_file for result in summary.results if result.error], ["crash.cpp"])
+            for name in names:
+                if name != "crash":
+                    self.assertTrue(os.path.exists(os.path.join(tmp, "out", f"{name}.graphml")), name)
+
+    def test_incremental_run_reuses_graph(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "ok.cpp"), "w") as f:
+                f.write("namespace NS { void f() {} }\n")
+            jobs = [CompileJob("ok.cpp", [], tmp, os.path.join(tmp, "out"), "ok")]
+            manifest = os.path.join(tmp, "out", MANIFEST_NAME)
+            first = run_compile_jobs(jobs, cache=AnalysisCache.load(manifest))
+            second = run_compile_jobs(jobs, n_jobs=2, cache=AnalysisCache.load(manifest))
+            self.assertFalse(first.results[0].cached)
+            self.assertTrue(second.results[0].cached, "Une unité de traduction inchangée doit être réutilisée")
+
+    def test_workers_write_into_one_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("a", "b"):
+                with open(os.path.join(tmp, f"{name}.cpp"), "w") as f:
+                    f.write(f"namespace NS {{ void {name}() {{}} }}\n")
+            jobs = [CompileJob(f"{name}.cpp", [], tmp, os.path.join(tmp, "out"), name, export_format=SQLITE_FORMAT) for name in ("a", "b")]
+            database = os.path.join(tmp, "out", "graph.sqlite")
+            for n_jobs in (1, 2):
+                with SqliteGraphStore(database) as store:
+                    summary = run_compile_jobs(jobs, n_jobs=n_jobs, store=store)
+                self.assertFalse([result.error for result in summary.results if result.error])
+                self.assertFalse(os.path.exists(os.path.join(tmp, "out", "a.graphml")), "Pas de GraphML avec l'export SQLite")
+                with sqlite3.connect(database) as reader:
+                    self.assertEqual(sorted(reader.execute("SELECT name FROM tus")), [("a",), ("b",)])
+                    positions = {row[0] for row in reader.execute("SELECT namespace_position FROM nodes")}
+                    self.assertLessEqual({"NS", "NS::a()", "NS::b()"}, positions)
+
+    def test_reextract_rebuilds_graphs_from_ast_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Les sources analysés sont sous TALIOS_PATH (chemins de déclaration relatifs)
+            self.enterContext(mock.patch.object(config, "TALIOS_PATH", tmp))
+            with open(os.path.join(tmp, "ok.cpp"), "w") as f:
+                f.write("namespace NS { int g() { return 1; } void f() { g(); } }\n")
+            ast_cache_dir = os.path.join(tmp, "out", "ast_cache")
+            manifest = os.path.join(tmp, "out", MANIFEST_NAME)
+            jobs = [CompileJob("ok.cpp", [], tmp, os.path.join(tmp, "out"), "ok", ast_cache_dir=ast_cache_dir)]
+            first = run_compile_jobs(jobs, cache=AnalysisCache.load(manifest))
+            with open(jobs[0].graph_file_path) as f:
+                parsed_graph = f.read()
+
+            reextract = [replace(job, reextract=True) for job in jobs]
+            second = run_compile_jobs(reextract, n_jobs=2, cache=AnalysisCache.load(manifest))
+            self.assertFalse(first.results[0].ast_cached)
+            self.assertFalse(second.results[0].cached, "En mode reextract, le graph est reconstruit")
+            self.assertTrue(second.results[0].ast_cached, "L'unité inchangée doit être rechargée sans parsing")
+            with open(jobs[0].graph_file_path) as f:
+                self.assertEqual(f.read(), parsed_graph)
+
+if __name__ == "__main__":
+    unittest.main()
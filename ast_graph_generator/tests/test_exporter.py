@@ -0,0 +1,127 @@
+import gzip
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+import networkx as nx
+from ast_graph_generator.exporter import export_to_graphml, export_to_gml, open_in_directory, SqliteGraphStore
+
+class TestExporter(unittest.TestCase):
+    def test_open_in_directory_keeps_cwd(self):
+        graph = nx.DiGraph()
+        graph.add_edge("a", "b", relation="contains_class_decl")
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            with open_in_directory(tmp, "graph.graphml") as f:
+                export_to_graphml(graph, f)
+            self.assertEqual(os.getcwd(), cwd)
+            loaded = nx.read_graphml(os.path.join(tmp, "graph.graphml"))
+            self.assertEqual(list(loaded.edges(data=True)), [("a", "b", {"relation": "contains_class_decl"})])
+
+class TestStreamingExport(unittest.TestCase):
+    def build(self):
+        graph = nx.DiGraph()
+        graph.add_node('a.cpp#ns::f(const A<int> &a)', label='a.cpp#ns::f(const A<int> &a)', declaration_file_row=3, node_type="function_decl", empty="")
+        graph.add_node("a.h#ns::A", label="a.h#ns::A", declaration_file_row="3", usr="c:@N@ns@S@A")
+        graph.add_node("isolé\t\"x\"")
+        graph.add_edge('a.cpp#ns::f(const A<int> &a)', "a.h#ns::A", relation="uses_custom_type")
+        graph.add_edge("a.h#ns::A", "isolé\t\"x\"")
+        return graph
+
+    def test_graphml_is_byte_compatible_with_networkx(self):
+        for graph in (nx.DiGraph(), self.build()):
+            expected, written = io.BytesIO(), io.BytesIO()
+            nx.write_graphml(graph.copy(), expected)
+            export_to_graphml(graph, written)
+            self.assertEqual(written.getvalue(), expected.getvalue())
+
+    def test_gml_is_byte_compatible_with_networkx(self):
+        expected, written = io.BytesIO(), io.BytesIO()
+        nx.write_gml(self.build(), expected)
+        export_to_gml(self.build(), written)
+        self.assertEqual(written.getvalue(), expected.getvalue())
+
+    def test_compressed_graphml_is_read_back(self):
+        graph = self.build()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "graph.graphml.gz")
+            export_to_graphml(graph, path)
+            expected = io.BytesIO()
+            nx.write_graphml(graph.copy(), expected)
+            with gzip.open(path, "rb") as f:
+                self.assertEqual(f.read(), expected.getvalue())
+            self.assertEqual(list(nx.read_graphml(path).edges), list(graph.edges))
+
+class TestSqliteGraphStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = SqliteGraphStore(os.path.join(self.tmp.name, "graph.sqlite"))
+        self.addCleanup(self.store.close)
+
+    def unit(self, source, callee_file, callee_type="function_decl"):
+        nodes = [
+            (f"{source}#main()", {"label": f"{source}#main()", "declaration_file": source, "declaration_file_row": 1,
+                                  "declaration_file_column": 5, "namespace_position": "main()", "node_type": "function_decl"}),
+            ("a.h#ns::f()", {"label": "a.h#ns::f()", "declaration_file": callee_file, "declaration_file_row": 2,
+                             "declaration_file_column": 5, "namespace_position": "ns::f()", "node_type": callee_type}),
+        ]
+        return nodes, [(f"{source}#main()", "a.h#ns::f()", {"relation": "calls_function"})]
+
+    def query(self, sql, *parameters):
+        return self.store.connection.execute(sql, parameters).fetchall()
+
+    def test_units_share_nodes_and_keep_their_edges(self):
+        self.store.upsert_unit("a", *self.unit("a.cpp", "a.cpp"), source_file="src/a.cpp")
+        self.store.upsert_unit("b", *self.unit("b.cpp", "a.h", "call_expr"))
+        self.assertEqual(self.query("SELECT count(*) FROM nodes"), [(3,)])
+        # La déclaration du .cpp n'est pas remplacée par la référence vue par b
+        self.assertEqual(self.query("SELECT path, node_type FROM nodes JOIN files ON files.id = nodes.declaration_file WHERE nodes.id = 'a.h#ns::f()'"),
+                         [("a.cpp", "function_decl")])
+        self.assertEqual(sorted(self.query("""
+            SELECT source.id, tus.name FROM edges JOIN tus ON tus.id = edges.tu_id
+            JOIN nodes AS source ON source.key = edges.source JOIN nodes AS target ON target.key = edges.target
+            WHERE target.id = ? AND edges.relation = 'calls_function'""", "a.h#ns::f()")),
+            [("a.cpp#main()", "a"), ("b.cpp#main()", "b")])
+        with sqlite3.connect(self.store.database_path) as reader:
+            self.assertEqual(reader.execute("SELECT source_file FROM tus WHERE name = 'a'").fetchall(), [("src/a.cpp",)])
+
+    def test_upsert_replaces_previous_unit_rows(self):
+        self.store.upsert_unit("a", *self.unit("a.cpp", "a.cpp"))
+        self.store.upsert_unit("b", *self.unit("b.cpp", "a.h", "call_expr"))
+        nodes, _ = self.unit("a.cpp", "a.cpp")
+        self.store.upsert_unit("a", nodes[:1], [])
+        self.assertEqual(self.query("SELECT count(*) FROM edges"), [(1,)])
+        self.assertEqual(self.query("SELECT node_type FROM nodes WHERE id = 'a.h#ns::f()'"), [("call_expr",)],
+                         "Un nœud encore produit par une autre unité est gardé, avec les attributs de celle-ci")
+        self.store.remove_unit("b")
+        self.assertEqual(self.query("SELECT id FROM nodes"), [("a.cpp#main()",)])
+        self.assertEqual(self.query("SELECT name FROM tus"), [("a",)])
+
+    def declaration_of(self, node):
+        return self.query("SELECT path, declaration_file_row FROM nodes JOIN files ON files.id = nodes.declaration_file WHERE nodes.id = ?", node)
+
+    def test_shared_node_takes_back_remaining_unit_attributes(self):
+        self.store.upsert_unit("b", *self.unit("b.cpp", "a.h"))
+        self.store.upsert_unit("a", *self.unit("a.cpp", "a.cpp"))
+        self.assertEqual(self.declaration_of("a.h#ns::f()"), [("a.cpp", 2)])
+        self.store.remove_unit("a")
+        self.assertEqual(self.declaration_of("a.h#ns::f()"), [("a.h", 2)], "La déclaration de l'unité retirée n'est pas gardée")
+        self.assertEqual(self.query("""
+            SELECT tus.name FROM node_tus JOIN tus ON tus.id = node_tus.tu_id JOIN nodes ON nodes.key = node_tus.node
+            WHERE nodes.id = 'a.h#ns::f()'"""), [("b",)])
+
+    def test_rewritten_unit_replaces_its_own_attributes(self):
+        self.store.upsert_unit("b", *self.unit("b.cpp", "a.h"))
+        self.store.upsert_unit("a", *self.unit("a.cpp", "a.cpp"))
+        # La définition de f a quitté a.cpp : la déclaration de l'en-tête (vue par a et b) l'emporte
+        self.store.upsert_unit("a", *self.unit("a.cpp", "a.h"))
+        self.assertEqual(self.declaration_of("a.h#ns::f()"), [("a.h", 2)])
+        nodes, edges = self.unit("a.cpp", "c.cpp")
+        nodes[1][1]["declaration_file_row"] = 7
+        self.store.upsert_unit("c", nodes, edges)
+        self.assertEqual(self.declaration_of("a.h#ns::f()"), [("c.cpp", 7)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from ast_graph_generator.global_graph import assemble_global_graph, find_graph_files, refresh_global_graph, update_global_graph, read_graph_records, GlobalGraph, GLOBAL_STATE_NAME
+from ast_graph_generator.lib import create_ast_graph_from_file_with_args
+
+FILES = {
+    "shape.h": "#pragma once\nint helper(int x);\nnamespace ns {\nint f(int x);\nclass Shape { public: int area(); };\n}\n",
+    "shape.cpp": '#include "shape.h"\nnamespace ns {\nint f(int x) { return x; }\nint Shape::area() { return f(2); }\n}\nnamespace util { int helper(int x) { return x; } }\n',
+    "app.cpp": '#include "shape.h"\nnamespace ns { int g() { Shape s; return f(1) + s.area() + helper(3); } }\n',
+}
+
+class TestGlobalGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, content in FILES.items():
+            with open(os.path.join(self.tmp.name, name), "w") as f:
+                f.write(content)
+        self.out_dir = os.path.join(self.tmp.name, "out")
+        for source in ("shape.cpp", "app.cpp"):
+            self.analyse(source)
+        self.graph_files = find_graph_files(self.out_dir)
+
+    def analyse(self, source):
+        return create_ast_graph_from_file_with_args(source, [], self.out_dir, out_name=source, working_dir=self.tmp.name)
+
+    def short(self, node):
+        # Fichier sans son chemin et position : shape.cpp#ns::f(int x)
+        return node.replace("\\", "/").split("/")[-1]
+
+    def test_find_graph_files_skips_global_graph(self):
+        open(os.path.join(self.out_dir, "global_graph.graphml"), "w").close()
+        self.assertEqual([os.path.basename(path) for path in find_graph_files(self.out_dir)], ["app.cpp.graphml", "shape.cpp.graphml"])
+
+    def test_calls_are_resolved_to_definitions_of_other_units(self):
+        graph = assemble_global_graph(self.graph_files)
+        nodes = [self.short(node) for node in graph.nodes]
+        # Les déclarations de l'en-tête sont fusionnées dans les définitions du .cpp
+        self.assertIn("shape.cpp#ns::f(int x)", nodes)
+        self.assertNotIn("shape.h#ns::f(int x)", nodes)
+        self.assertEqual(nodes.count("shape.h#ns::Shape"), 1)
+
+        calls = {(self.short(u), self.short(v)) for u, v, data in graph.edges(data=True) if data["relation"] == "calls_function"}
+        self.assertIn(("app.cpp#ns::g()", "shape.cpp#ns::f(int x)"), calls)
+        self.assertIn(("shape.cpp#ns::Shape::area()", "shape.cpp#ns::f(int x)"), calls)
+        # helper() n'est défini dans aucune unité : util::helper, d'un autre namespace, n'est pas retenu
+        self.assertIn(("app.cpp#ns::g()", "app.cpp#helper"), calls)
+        self.assertNotIn(("app.cpp#ns::g()", "shape.cpp#util::helper(int x)"), calls)
+
+    def test_parallel_ingest_gives_same_graph(self):
+        serial = assemble_global_graph(self.graph_files)
+        parallel = assemble_global_graph(self.graph_files, n_jobs=2)
+        self.assertEqual(list(parallel.nodes(data=True)), list(serial.nodes(data=True)))
+        self.assertEqual(list(parallel.edges(data=True)), list(serial.edges(data=True)))
+
+    def test_nodes_and_edges_carry_their_translation_units(self):
+        graph = assemble_global_graph(self.graph_files)
+        units = {self.short(node): {os.path.basename(unit) for unit in data["translation_units"].split(";")} for node, data in graph.nodes(data=True)}
+        self.assertEqual(units["shape.h#ns::Shape"], {"app.cpp.graphml", "shape.cpp.graphml"})
+        self.assertEqual(units["app.cpp#ns::g()"], {"app.cpp.graphml"})
+        # La définition fusionnée réunit la provenance de la déclaration vue par app.cpp
+        self.assertEqual(units["shape.cpp#ns::f(int x)"], {"app.cpp.graphml", "shape.cpp.graphml"})
+        edge = next(data for u, v, data in graph.edges(data=True) if self.short(u) == "app.cpp#ns::g()" and self.short(v) == "shape.cpp#ns::f(int x)")
+        self.assertEqual(os.path.basename(edge["translation_units"]), "app.cpp.graphml")
+
+    def test_shared_attributes_are_stored_once(self):
+        global_graph = update_global_graph(GlobalGraph(), self.graph_files)
+        shape = next(node for node in global_graph.graph if self.short(node) == "shape.h#ns::Shape")
+        # Mêmes attributs dans les deux unités : une seule variante, provenance en masque de bits
+        self.assertEqual(list(global_graph.node_variants[shape].values()), [0b11])
+        app, shape_unit = self.graph_files
+        global_graph.remove_unit(app)
+        self.assertEqual(list(global_graph.node_variants[shape].values()), [1 << global_graph.unit_ids[shape_unit]])
+        # L'identifiant libéré est réutilisé
+        global_graph.add_unit(app, *read_graph_records(app))
+        self.assertEqual(sorted(global_graph.unit_ids.values()), [0, 1])
+        self.assertEqual(list(global_graph.node_variants[shape].values()), [0b11])
+
+    def test_incremental_update_matches_full_assembly(self):
+        state_path = os.path.join(self.out_dir, GLOBAL_STATE_NAME)
+        refresh_global_graph(state_path, self.graph_files)
+
+        # app.cpp n'appelle plus area() et appelle une nouvelle fonction
+        with open(os.path.join(self.tmp.name, "app.cpp"), "w") as f:
+            f.write('#include "shape.h"\nint h() { return 3; }\nint g() { return ns::f(h()); }\n')
+        app_graph = self.analyse("app.cpp")
+        # Date différente même si le fichier est réécrit dans la même unité de temps
+        os.utime(app_graph, ns=(0, 0))
+        global_graph = refresh_global_graph(state_path, self.graph_files)
+        self.assertEqual(len(global_graph.unit_stamps), 2)
+
+        incremental, full = global_graph.to_graph(), assemble_global_graph(self.graph_files)
+        self.assertEqual(dict(incremental.nodes(data=True)), dict(full.nodes(data=True)))
+        self.assertEqual({(u, v): data for u, v, data in incremental.edges(data=True)}, {(u, v): data for u, v, data in full.edges(data=True)})
+        self.assertIn("app.cpp#h()", [self.short(node) for node in incremental.nodes])
+        self.assertNotIn(("app.cpp#g()", "shape.cpp#ns::Shape::area()"), {(self.short(u), self.short(v)) for u, v in incremental.edges})
+
+        # Une unité retirée n'apporte plus rien
+        shape_only = refresh_global_graph(state_path, self.graph_files[1:]).to_graph()
+        self.assertEqual(dict(shape_only.nodes(data=True)), dict(assemble_global_graph(self.graph_files[1:]).nodes(data=True)))
+
+if __name__ == "__main__":
+    unittest.main()
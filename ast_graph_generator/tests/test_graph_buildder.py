@@ -0,0 +1,202 @@
+import os
+import tempfile
+import sys
+import unittest
+from importlib import metadata
+import clang.cindex
+import networkx as nx
+from ast_graph_generator.graph_builder import build_graph_from_ast, build_graph_from_flat_ast, HANDLERS, ATTACHED_KINDS
+from ast_graph_generator import flat_ast
+from ast_graph_generator.flat_ast import capture_flat_ast, NO_INDEX
+from ast_graph_generator.node_filters import FileFilter
+from ast_graph_generator.ontologie import EntityContext, USR_IDENTITY
+from ast_graph_generator.lib import create_ast_graph_from_file_with_args
+from ast_graph_generator.ast_parser import STRUCTURE_MODE, SKIP_HEADER_BODIES_MODE
+
+SOURCE = """
+#include <vector>
+namespace Outer {
+    using Ids = std::vector<int>;
+    struct Point { int x; };
+    class Shape {
+    public:
+        Shape() {}
+        int area() const { return helper(); }
+        static int helper() { return 1; }
+    };
+    namespace Inner {
+        int total(const Shape& shape) { Point p; Ids ids; ids.push_back(shape.area()); return p.x; }
+    }
+}
+"""
+
+class TestStructureMode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with open(os.path.join(self.tmp.name, "shapes.cpp"), "w") as f:
+            f.write(SOURCE)
+
+    def build(self, **kwargs):
+        out_dir = os.path.join(self.tmp.name, "out")
+        out_name = kwargs.get("mode", "full")
+        path = create_ast_graph_from_file_with_args("shapes.cpp", [], out_dir, out_name=out_name, working_dir=self.tmp.name, **kwargs)
+        return nx.read_graphml(path)
+
+    def test_structure_mode_keeps_only_declarations(self):
+        full = self.build()
+        structure = self.build(mode=STRUCTURE_MODE, incomplete=True)
+
+        relations = {data["relation"] for _, _, data in structure.edges(data=True)}
+        self.assertTrue(all(relation.startswith("contains_") for relation in relations), relations)
+        self.assertIn("calls_function", {data["relation"] for _, _, data in full.edges(data=True)})
+
+        # Mêmes déclarations et même hiérarchie que le graph complet, sans les appels de méthodes
+        full_contains = {(u, v) for u, v, data in full.edges(data=True)
+                         if data["relation"].startswith("contains_") and data["relation"] != "contains_call_expr"}
+        structure_contains = set(structure.edges())
+        self.assertEqual(structure_contains, full_contains)
+
+    def test_skip_header_bodies_keeps_main_file_calls(self):
+        # L'en-tête du même nom que le source est analysé avec lui
+        with open(os.path.join(self.tmp.name, "shapes.h"), "w") as f:
+            f.write("#pragma once\nnamespace Outer { inline int header_helper() { return 2; } inline int from_header() { return header_helper(); } }\n")
+        with open(os.path.join(self.tmp.name, "shapes.cpp"), "w") as f:
+            f.write('#include "shapes.h"\n' + SOURCE)
+        full = self.build()
+        skipped = self.build(mode=SKIP_HEADER_BODIES_MODE)
+
+        def callers(graph):
+            return {u.split("#")[-1] for u, _, data in graph.edges(data=True) if data["relation"] == "calls_function"}
+        self.assertIn("Outer::from_header()", callers(full))
+        self.assertNotIn("Outer::from_header()", callers(skipped), "Les corps des en-têtes ne doivent pas être parsés")
+        self.assertEqual(callers(skipped), callers(full) - {"Outer::from_header()"})
+
+class TestIterativeBuilder(unittest.TestCase):
+    def test_deep_expression_does_not_hit_recursion_limit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            depth = sys.getrecursionlimit() + 500
+            with open(os.path.join(tmp, "deep.cpp"), "w") as f:
+                f.write("int one() { return 1; }\nint total() { return " + " + ".join(["one()"] * depth) + "; }\n")
+            tu = clang.cindex.Index.create().parse("deep.cpp", args=["-working-directory", tmp])
+            graph = build_graph_from_ast(tu.cursor, ["deep.cpp"], EntityContext(tmp))
+            calls = {(u.split("#")[-1], v.split("#")[-1]) for u, v, data in graph.edges(data=True) if data["relation"] == "calls_function"}
+            self.assertEqual(calls, {("total()", "one")})
+
+class TestFlatAST(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with open(os.path.join(self.tmp.name, "shapes.cpp"), "w") as f:
+            f.write(SOURCE)
+        self.tu = clang.cindex.Index.create().parse("shapes.cpp", args=["-working-directory", self.tmp.name])
+
+    def capture(self):
+        return capture_flat_ast(self.tu.cursor, FileFilter(["shapes.cpp"], self.tmp.name), HANDLERS)
+
+    def test_flat_graph_matches_cursor_graph(self):
+        for identity in ("name", USR_IDENTITY):
+            expected = build_graph_from_ast(self.tu.cursor, ["shapes.cpp"], EntityContext(self.tmp.name, identity))
+            graph = build_graph_from_flat_ast(self.capture(), EntityContext(self.tmp.name, identity))
+            self.assertEqual(list(graph.nodes(data=True)), list(expected.nodes(data=True)))
+            self.assertEqual(list(graph.edges(data=True)), list(expected.edges(data=True)))
+
+    def test_columns_describe_the_filtered_tree(self):
+        flat = self.capture()
+        self.assertEqual(flat.parent[0], NO_INDEX)
+        # Préfixe : le parent précède ses enfants ; <vector> n'est pas capturé
+        self.assertTrue(all(0 <= flat.parent[i] < i for i in range(1, len(flat))))
+        self.assertEqual({flat.file_of(i) for i in range(1, len(flat))}, {"shapes.cpp"})
+        # helper() appelé dans area() référence la déclaration de helper
+        call = next(i for i in range(len(flat)) if flat.cursor_kind(i) == clang.cindex.CursorKind.CALL_EXPR and flat.spelling_of(i) == "helper")
+        target = flat.referenced[call]
+        self.assertEqual((flat.cursor_kind(target), flat.spelling_of(target)), (clang.cindex.CursorKind.CXX_METHOD, "helper"))
+        self.assertEqual(flat.line[target], 10)
+
+    def test_adopted_cursor_matches_get_children(self):
+        # _adopt_cursor reproduit le visiteur de Cursor.get_children : à revérifier à chaque version des bindings
+        try:
+            bindings_version = metadata.version("libclang")
+        except metadata.PackageNotFoundError:
+            bindings_version = metadata.version("clang")
+        self.assertTrue(bindings_version.startswith(flat_ast.BINDINGS_VERSION + "."),
+                        f"Bindings {bindings_version} : vérifier _adopt_cursor puis mettre à jour BINDINGS_VERSION")
+        child = next(self.tu.cursor.get_children())
+        self.assertIs(child._tu, self.tu, "Cursor.get_children ne rattache plus ses curseurs par _tu")
+        flat = self.capture()
+        for cursor in filter(None, flat.cursors):
+            self.assertIs(cursor.translation_unit, self.tu)
+        self.assertTrue(flat.scopes)
+        for i, scope in flat.scopes.items():
+            # La portée est le parent direct s'il est une déclaration, comme avec get_children
+            parent = flat.parent[i]
+            if flat.cursor_kind(parent).is_declaration():
+                self.assertEqual((scope.kind, scope.spelling), (flat.cursor_kind(parent), flat.spelling_of(parent)))
+            else:
+                self.assertIsNone(scope)
+
+    @unittest.skipIf(flat_ast.numpy is None, "NumPy n'est pas installé")
+    def test_vectorized_classification_matches_python(self):
+        flat = self.capture()
+        anchor_kinds = [kind.value for kind in HANDLERS if kind.value not in ATTACHED_KINDS]
+        vectorized = (flat.indices_of_kinds(kind.value for kind in HANDLERS), flat.nearest_ancestors(anchor_kinds), flat.class_function_calls())
+        numpy, flat_ast.numpy = flat_ast.numpy, None
+        self.addCleanup(setattr, flat_ast, "numpy", numpy)
+        python = (flat.indices_of_kinds(kind.value for kind in HANDLERS), flat.nearest_ancestors(anchor_kinds), flat.class_function_calls())
+        self.assertEqual(vectorized, python)
+        self.assertTrue(python[2], "shape.area() et ids.push_back() sont des appels de méthodes")
+
+    def test_flat_graph_matches_cursor_graph_in_structure_mode(self):
+        expected = build_graph_from_ast(self.tu.cursor, ["shapes.cpp"], EntityContext(self.tmp.name), structure_only=True)
+        graph = build_graph_from_flat_ast(self.capture(), EntityContext(self.tmp.name), structure_only=True)
+        self.assertEqual(list(graph.nodes(data=True)), list(expected.nodes(data=True)))
+        self.assertEqual(list(graph.edges(data=True)), list(expected.edges(data=True)))
+
+class TestUsrIdentity(unittest.TestCase):
+    def test_nodes_are_keyed_by_usr(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = {
+                "widget.h": "#pragma once\nnamespace ui { class Widget { public: int draw(int n); }; int helper(); }\n",
+                "widget.cpp": '#include "widget.h"\nnamespace ui { int helper() { return 1; } int Widget::draw(int n) { return n + helper(); } }\n',
+                "app.cpp": '#include "widget.h"\nint run() { ui::Widget w; return w.draw(2) + ui::helper(); }\n',
+            }
+            for name, content in files.items():
+                with open(os.path.join(tmp, name), "w") as f:
+                    f.write(content)
+            graphs = {}
+            for source in ("widget.cpp", "app.cpp"):
+                path = create_ast_graph_from_file_with_args(source, [], os.path.join(tmp, "out"), out_name=source, working_dir=tmp, identity=USR_IDENTITY)
+                graphs[source] = nx.read_graphml(path)
+
+            widget = graphs["widget.cpp"]
+            # Déclaration de l'en-tête et définition du .cpp : un seul nœud, avec les attributs de la définition
+            self.assertEqual(widget.nodes["c:@N@ui@F@helper#"]["declaration_file"].split("/")[-1], "widget.cpp")
+            self.assertTrue(widget.nodes["c:@N@ui@F@helper#"]["label"].endswith("#ui::helper()"))
+            # L'appel pointe vers la fonction elle-même
+            self.assertIn(("c:@N@ui@S@Widget@F@draw#I#", "c:@N@ui@F@helper#"), widget.edges)
+
+            # Les mêmes entités ont la même identité d'une unité de traduction à l'autre
+            app_calls = {v for _, v, data in graphs["app.cpp"].edges(data=True) if data["relation"] in ("calls_function", "contains_call_expr")}
+            self.assertLessEqual({"c:@N@ui@F@helper#", "c:@N@ui@S@Widget@F@draw#I#"}, app_calls)
+
+class TestResolutionCache(unittest.TestCase):
+    def test_callee_is_resolved_once(self):
+        code = "int helper(int x) { return x; }\nstruct Point { int x; };\n" \
+               "int run(Point p) { return helper(1) + helper(2) + helper(p.x); }\nint other(Point q) { return helper(3); }\n"
+        index = clang.cindex.Index.create()
+        tu = index.parse("tmp.cpp", args=["-std=c++11"], unsaved_files=[("tmp.cpp", code)])
+        context = EntityContext(os.getcwd())
+        graph = build_graph_from_ast(tu.cursor, ["tmp.cpp"], context)
+
+        # Une seule résolution par curseur référencé, quel que soit le nombre de références
+        self.assertEqual(sorted(cursor.spelling for cursor in context.resolutions), ["Point", "helper", "x"])
+        helper = next(resolution for cursor, resolution in context.resolutions.items() if cursor.spelling == "helper")
+        self.assertEqual(helper.definition.kind, clang.cindex.CursorKind.FUNCTION_DECL)
+        self.assertEqual(len(helper.entities), 1)
+        # Les appels mémorisés pointent vers le même nœud que sans cache
+        uncached = build_graph_from_ast(tu.cursor, ["tmp.cpp"], EntityContext(os.getcwd(), resolutions=None))
+        self.assertEqual(list(graph.nodes(data=True)), list(uncached.nodes(data=True)))
+        self.assertEqual(list(graph.edges(data=True)), list(uncached.edges(data=True)))
+
+if __name__ == "__main__":
+    unittest.main()
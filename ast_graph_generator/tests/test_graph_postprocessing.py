@@ -0,0 +1,32 @@
+import unittest
+import networkx as nx
+from ast_graph_generator.graph_postprocessing import merge_duplicate_nodes
+
+class TestMergeDuplicateNodes(unittest.TestCase):
+    def build(self):
+        graph = nx.DiGraph()
+        graph.add_node("main.cpp", namespace_position="main.cpp", declaration_file="main.cpp")
+        graph.add_node("a.h#ns::f()", namespace_position="ns::f()", declaration_file="a.h")
+        graph.add_node("a.cpp#ns::f()", namespace_position="ns::f()", declaration_file="a.cpp")
+        graph.add_node("a.h#ns::g()", namespace_position="ns::g()", declaration_file="a.h")
+        graph.add_node("b.h#ns::g()", namespace_position="ns::g()", declaration_file="b.h")
+        graph.add_edge("main.cpp", "a.h#ns::f()", relation="contains_fun_decl")
+        graph.add_edge("main.cpp", "a.cpp#ns::f()", relation="contains_fun_decl")
+        graph.add_edge("a.h#ns::f()", "b.h#ns::g()", relation="calls_function")
+        graph.add_edge("a.cpp#ns::f()", "a.h#ns::f()", relation="calls_function")
+        return graph
+
+    def test_cpp_declaration_is_canonical(self):
+        graph = merge_duplicate_nodes(self.build())
+        self.assertEqual(list(graph.nodes), ["main.cpp", "a.cpp#ns::f()", "a.h#ns::g()"])
+        self.assertEqual(graph.nodes["a.cpp#ns::f()"]["declaration_file"], "a.cpp")
+
+    def test_edges_are_redirected_between_canonical_nodes(self):
+        graph = merge_duplicate_nodes(self.build())
+        self.assertEqual(sorted(graph.edges(data="relation")), [
+            ("a.cpp#ns::f()", "a.h#ns::g()", "calls_function"),
+            ("main.cpp", "a.cpp#ns::f()", "contains_fun_decl"),
+        ], "Arêtes entre doublons redirigées en une fois, sans boucle créée par la fusion")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from ast_graph_generator.driver import CompileJob, run_compile_jobs
+from ast_graph_generator.instrumentation import measure_stage, build_run_report, write_run_report
+
+class TestInstrumentation(unittest.TestCase):
+    def test_measure_stage_accumulates(self):
+        timings = {}
+        for _ in range(2):
+            with measure_stage(timings, "build"):
+                sum(range(1000))
+        self.assertEqual(set(timings), {"build", "build_cpu"})
+        self.assertGreater(timings["build"], 0)
+        with measure_stage(None, "build"):
+            pass
+
+    def test_run_report_aggregates_worker_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("a", "b"):
+                with open(os.path.join(tmp, f"{name}.cpp"), "w") as f:
+                    f.write(f"namespace NS {{ int g() {{ return 1; }} void {name}() {{ g(); }} }}\n")
+            jobs = [CompileJob(f"{name}.cpp", [], tmp, os.path.join(tmp, "out"), name) for name in ("a", "b")]
+            jobs.append(CompileJob("missing.cpp", [], os.path.join(tmp, "n_existe_pas"), os.path.join(tmp, "out"), "missing"))
+            summary = run_compile_jobs(jobs, n_jobs=2)
+
+            for result in summary.results:
+                if not result.error:
+                    self.assertLessEqual({"parse", "parse_cpu", "capture", "build", "merge", "export"}, set(result.metrics))
+                    self.assertEqual(result.metrics["output_bytes"], os.path.getsize(result.graph_file_path))
+                    self.assertGreater(result.metrics["cursors"], result.metrics["nodes"])
+
+            report = build_run_report(summary.results, {"analyse": 1.0})
+            totals = report["totals"]
+            self.assertEqual(totals["statuses"], {"analysed": 2, "error": 1})
+            self.assertEqual(totals["stages"]["parse"]["units"], 2)
+            self.assertEqual(totals["counters"]["nodes"], sum(result.metrics.get("nodes", 0) for result in summary.results))
+
+            json_path, csv_path = write_run_report(report, os.path.join(tmp, "out"))
+            with open(json_path) as f:
+                self.assertEqual(json.load(f)["totals"], json.loads(json.dumps(totals)))
+            with open(csv_path, newline="") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(sorted(row["status"] for row in rows), ["analysed", "analysed", "error"])
+            self.assertEqual(sum(int(row["edges"] or 0) for row in rows), totals["counters"]["edges"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,9 @@
 import os
+import tempfile
 import unittest
 import clang.cindex
 from ast_graph_generator.ast_parser import parse_source, get_root_cursor
-from ast_graph_generator.node_filters import is_class, is_struct, is_function, is_namespace, is_custom_type
+from ast_graph_generator.node_filters import is_class, is_struct, is_function, is_namespace, is_custom_type, is_allowed_node, FileFilter
 
 # Si nécessaire, configurer le chemin de la librairie clang (adaptez le chemin à votre environnement)
 # clang.cindex.Config.set_library_file('/usr/lib/llvm-10/lib/libclang.so.1')
@@ -71,5 +72,37 @@ class TestRealCppEntities(unittest.TestCase):
         # - using StringVector = std::vector<std::string>; (dans le namespace AliasNS)
         self.assertEqual(total_custom_types, 3, f"Nombre de types custom incorrect dans {file_path}")
 
+class TestFileFilter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, content in (("src/main.cpp", '#include <vector>\n#include "../include/main.h"\n#include "../include/other.h"\nint f() { return g() + h(); }\n'),
+                              ("include/main.h", "#pragma once\ninline int g() { return 1; }\n"),
+                              ("include/other.h", "#pragma once\ninline int h() { return 2; }\n")):
+            os.makedirs(os.path.dirname(os.path.join(self.tmp.name, name)), exist_ok=True)
+            with open(os.path.join(self.tmp.name, name), "w") as f:
+                f.write(content)
+        tu = clang.cindex.Index.create().parse("src/main.cpp", args=["-std=c++11", "-working-directory", self.tmp.name])
+        self.cursors = list(tu.cursor.walk_preorder())
+
+    def test_same_verdict_as_is_allowed_node(self):
+        file_filter = FileFilter(["src/main.cpp"], self.tmp.name)
+        allowed_files = set()
+        for cursor in self.cursors:
+            if cursor.location.is_in_system_header:
+                self.assertFalse(file_filter(cursor), "Les en-têtes système sont refusés")
+                continue
+            self.assertEqual(file_filter(cursor), is_allowed_node(cursor, ["src/main.cpp"], self.tmp.name))
+            if file_filter(cursor) and cursor.location.file:
+                allowed_files.add(os.path.basename(cursor.location.file.name))
+        self.assertEqual(allowed_files, {"main.cpp", "main.h"}, "main.h correspond au source main.cpp, other.h non")
+
+    def test_verdict_is_computed_once_per_file(self):
+        file_filter = FileFilter(["src/main.cpp"], self.tmp.name)
+        for cursor in self.cursors:
+            file_filter(cursor)
+        files = {cursor.location.file.name for cursor in self.cursors if cursor.location.file}
+        self.assertEqual(len(file_filter.verdicts), len(files))
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,9 @@
 import os
+import tempfile
 import unittest
 import clang.cindex
-from ast_graph_generator.ontologie import Entity, FunctionEntity
+import networkx as nx
+from ast_graph_generator.ontologie import Entity, EntityContext, FunctionEntity, FunctionCallEntity, USR_IDENTITY, namespace_prefix
 
 # Optionnel : ajustez le chemin vers votre libclang si nécessaire
 # clang.cindex.Config.set_library_file('/usr/lib/llvm-10/lib/libclang.so.1')
@@ -96,5 +98,51 @@ class TestOntologieComplex(unittest.TestCase):
         self.assertEqual(inner_method_entity.namespace_position, "TestNS::InnerNS::InnerClass",
                          "Namespace de 'innerMethod' incorrect")
 
+class TestNamespacePrefix(unittest.TestCase):
+    def test_memoized_prefix_matches_parent_walk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "nested.cpp"), "w") as f:
+                f.write("namespace A { namespace B { struct S { class C { void m(); void n(); }; }; void f(); } }\n"
+                        "void A::B::S::C::m() {}\n")
+            tu = clang.cindex.Index.create().parse("nested.cpp", args=["-working-directory", tmp])
+            context = EntityContext(tmp)
+            positions = {}
+            for node in tu.cursor.walk_preorder():
+                if node.kind in (clang.cindex.CursorKind.CXX_METHOD, clang.cindex.CursorKind.FUNCTION_DECL):
+                    self.assertEqual(namespace_prefix(node.semantic_parent, context.namespace_prefixes), namespace_prefix(node.semantic_parent))
+                    positions.setdefault(node.spelling, set()).add(FunctionEntity(node, context).namespace_position)
+            self.assertEqual(positions, {"m": {"A::B::S::C::m()"}, "n": {"A::B::S::C::n()"}, "f": {"A::B::f()"}})
+            # Un seul passage par parent sémantique : A, B, S et C
+            self.assertEqual(sorted(context.namespace_prefixes.values(), key=len), [("A",), ("A", "B"), ("A", "B", "S"), ("A", "B", "S", "C")])
+
+class TestEntityRecord(unittest.TestCase):
+    def setUp(self):
+        code = "namespace ui { int helper(int n) { return n; } int run() { return helper(1) + helper(2); } }\n"
+        self.tu = clang.cindex.Index.create().parse("lazy.cpp", args=["-std=c++11"], unsaved_files=[("lazy.cpp", code)])
+        self.calls = [node for node in self.tu.cursor.walk_preorder() if node.kind == clang.cindex.CursorKind.CALL_EXPR]
+
+    def test_attributes_are_typed_and_computed_on_demand(self):
+        helper = next(node for node in self.tu.cursor.walk_preorder() if node.spelling == "helper")
+        entity = FunctionEntity(helper, EntityContext(os.getcwd()))
+        self.assertFalse(hasattr(entity, "__dict__"))
+        self.assertIsNone(entity._decl_file)
+        self.assertEqual(entity.namespace_position, "ui::helper(int n)")
+        # La localisation n'est lue que pour le label
+        self.assertIsNone(entity._decl_file_row)
+        self.assertTrue(entity.label.endswith("lazy.cpp#ui::helper(int n)"))
+        self.assertEqual((entity.decl_file_row, entity.decl_file_column), (1, 20))
+
+    def test_usr_reference_to_known_node_is_not_located(self):
+        context = EntityContext(os.getcwd(), USR_IDENTITY, resolutions=None)
+        graph = nx.DiGraph()
+        first, second = (FunctionCallEntity(call, context) for call in self.calls)
+        first.add_to_graph(graph, "call_expr")
+        second.add_to_graph(graph, "call_expr")
+        self.assertEqual(first.name, second.name)
+        self.assertEqual(graph.nodes[first.name]["namespace_position"], "ui::helper")
+        # Le second appel partage le nœud du premier sans lire sa localisation ni ses parents
+        self.assertIsNone(second._decl_file)
+        self.assertIsNone(second._qualified_name)
+
 if __name__ == "__main__":
     unittest.main()
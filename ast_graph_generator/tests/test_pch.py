@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import networkx as nx
+import config
+from ast_graph_generator.driver import CompileJob, run_compile_jobs
+from ast_graph_generator.pch import common_preamble, group_jobs_for_pch, scan_preamble_includes
+
+class TestPch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        self.write("shared.h", "#pragma once\nnamespace Shared { class Base { public: void run() {} }; }\n")
+        self.jobs = []
+        for i in range(3):
+            self.write(f"unit{i}.cpp", f'// unité {i}\n#include "shared.h"\nnamespace NS{i} {{ void f() {{ Shared::Base b; b.run(); }} }}\n')
+            self.jobs.append(CompileJob(f"unit{i}.cpp", ["-DSHARED"], self.dir, os.path.join(self.dir, "out"), f"unit{i}"))
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), "w") as f:
+            f.write(content)
+
+    def test_scan_preamble_includes(self):
+        self.write("other.cpp", '/* en-tête\n de fichier */\n#include <vector>\n#include "shared.h"\nint x;\n#include "late.h"\n')
+        includes = scan_preamble_includes("other.cpp", self.dir)
+        self.assertEqual(includes, ["#include <vector>", f'#include "{os.path.join(self.dir, "shared.h")}"'])
+
+    def test_scan_stops_at_unguarded_header(self):
+        self.write("guarded.h", "#ifndef GUARDED_H\n#define GUARDED_H\nint g;\n#endif\n")
+        self.write("unguarded.h", "int u;\n")
+        self.write("other.cpp", '#include "guarded.h"\n#include "unguarded.h"\n#include "shared.h"\n')
+        includes = scan_preamble_includes("other.cpp", self.dir)
+        self.assertEqual(includes, [f'#include "{os.path.join(self.dir, "guarded.h")}"'],
+                         "Un en-tête non protégé serait inclus deux fois avec le PCH")
+
+    def test_common_preamble_is_a_prefix(self):
+        self.assertEqual(common_preamble([["a", "b", "c"], ["a", "b", "d"], ["a", "b"]]), ["a", "b"])
+        self.assertEqual(common_preamble([["a", "b"], ["b", "a"]]), [])
+
+    def test_group_jobs(self):
+        jobs = self.jobs + [CompileJob("unit0.cpp", ["-DOTHER"], self.dir, self.dir, "other")]
+        groups = group_jobs_for_pch(jobs)
+        self.assertEqual(len(groups), 1, "Seules les unités aux options identiques sont regroupées")
+        self.assertEqual(groups[0].jobs, self.jobs)
+
+    def test_graphs_are_identical_with_pch(self):
+        # Les sources analysés sont sous TALIOS_PATH : les en-têtes y sont nommés relativement,
+        # qu'ils viennent du PCH (chemins absolus) ou du source
+        self.enterContext(mock.patch.object(config, "TALIOS_PATH", self.dir))
+        without_pch = run_compile_jobs(self.jobs)
+        graphs = {r.graph_file_path: nx.read_graphml(r.graph_file_path) for r in without_pch.results}
+        with_pch = run_compile_jobs(self.jobs, pch_dir=os.path.join(self.dir, "pch"))
+        self.assertEqual(len(with_pch.pch_groups), 1)
+        self.assertIsNotNone(with_pch.pch_groups[0].pch_path, with_pch.pch_groups[0].error)
+        self.assertEqual(sum(r.used_pch for r in with_pch.results), 2, "Toutes les unités sauf la référence utilisent le PCH")
+        for result in with_pch.results:
+            graph = nx.read_graphml(result.graph_file_path)
+            self.assertEqual(sorted(graph.nodes(data=True)), sorted(graphs[result.graph_file_path].nodes(data=True)))
+            self.assertEqual(sorted(graph.edges(data=True)), sorted(graphs[result.graph_file_path].edges(data=True)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import networkx as nx
+from ast_graph_generator.exporter import export_to_graphml
+from ast_graph_generator.query_daemon import GraphIndex, QueryServer, send_request
+
+def build_graph(extra_caller: bool = False) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node("a.cpp", label="a.cpp", namespace_position="a.cpp", node_type="translation_unit")
+    graph.add_node("a.cpp#ns", label="a.cpp#ns", namespace_position="ns", node_type="namespace")
+    graph.add_node("a.cpp#ns::Shape", label="a.cpp#ns::Shape", namespace_position="ns::Shape", node_type="class_decl")
+    graph.add_node("a.cpp#ns::Shape::area()", label="a.cpp#ns::Shape::area()", namespace_position="ns::Shape::area()", node_type="cxx_method")
+    graph.add_node("a.cpp#ns::f(int x)", label="a.cpp#ns::f(int x)", namespace_position="ns::f(int x)", node_type="function_decl")
+    graph.add_node("b.cpp#g()", label="b.cpp#g()", namespace_position="g()", node_type="function_decl")
+    graph.add_edge("a.cpp", "a.cpp#ns", relation="contains_namespace")
+    graph.add_edge("a.cpp#ns", "a.cpp#ns::Shape", relation="contains_class_decl")
+    graph.add_edge("a.cpp#ns::Shape", "a.cpp#ns::Shape::area()", relation="contains_fun_decl")
+    graph.add_edge("a.cpp#ns::Shape::area()", "a.cpp#ns::f(int x)", relation="calls_function")
+    graph.add_edge("b.cpp#g()", "a.cpp#ns::Shape::area()", relation="calls_function")
+    graph.add_edge("b.cpp#g()", "a.cpp#ns::Shape", relation="uses_custom_type")
+    if extra_caller:
+        graph.add_node("c.cpp#h()", label="c.cpp#h()", namespace_position="h()", node_type="function_decl")
+        graph.add_edge("c.cpp#h()", "a.cpp#ns::f(int x)", relation="calls_function")
+    return graph
+
+def ids(response: dict) -> list:
+    return [result["id"] for result in response["results"]]
+
+class TestGraphIndex(unittest.TestCase):
+    def test_queries(self):
+        index = GraphIndex(build_graph())
+        self.assertEqual(ids(index.query("callers", "ns::Shape::area()")), ["b.cpp#g()"])
+        self.assertEqual(ids(index.query("callees", "area")), ["a.cpp#ns::f(int x)"], "Nom non qualifié")
+        self.assertEqual(ids(index.query("callers", "ns::f")), ["a.cpp#ns::Shape::area()"], "Nom qualifié sans paramètres")
+        self.assertEqual(ids(index.query("contains", "a.cpp#ns::Shape")), ["a.cpp#ns::Shape::area()"])
+        self.assertEqual(ids(index.query("uses_custom_type", "g()")), ["a.cpp#ns::Shape"])
+        self.assertEqual(index.query("callers", "inconnu"), {"matches": [], "results": []})
+        with self.assertRaises(ValueError):
+            index.query("supprime", "g()")
+
+class TestQueryServer(unittest.TestCase):
+    def test_snapshot_is_hot_swapped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, "global_graph.graphml")
+            export_to_graphml(build_graph(), snapshot)
+            socket_path = os.path.join(tmp, "q.sock")
+            with QueryServer(socket_path, snapshot) as server:
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                try:
+                    self.assertEqual(ids(send_request(socket_path, {"query": "callers", "name": "ns::f"}, timeout=10)), ["a.cpp#ns::Shape::area()"])
+                    # Nouvelle exécution de l'analyseur : le snapshot est remplacé sans redémarrer
+                    export_to_graphml(build_graph(extra_caller=True), snapshot)
+                    self.assertEqual(send_request(socket_path, {"query": "reload"}, timeout=10)["nodes"], 7)
+                    self.assertEqual(ids(send_request(socket_path, {"query": "callers", "name": "ns::f"}, timeout=10)), ["a.cpp#ns::Shape::area()", "c.cpp#h()"])
+                    with self.assertRaises(RuntimeError):
+                        send_request(socket_path, {"query": "supprime"}, timeout=10)
+                finally:
+                    server.shutdown()
+            self.assertFalse(os.path.exists(socket_path))
+
+    def test_running_daemon_socket_is_not_taken_over(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, "global_graph.graphml")
+            export_to_graphml(build_graph(), snapshot)
+            socket_path = os.path.join(tmp, "q.sock")
+            # Socket d'un démon arrêté sans la supprimer : plus personne n'y écoute
+            stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stale.bind(socket_path)
+            stale.close()
+            with QueryServer(socket_path, snapshot) as server:
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                try:
+                    with self.assertRaises(FileExistsError):
+                        QueryServer(socket_path, snapshot)
+                    self.assertEqual(send_request(socket_path, {"query": "stats"}, timeout=10)["nodes"], 6)
+                finally:
+                    server.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
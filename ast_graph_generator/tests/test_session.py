@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+import weakref
+from ast_graph_generator.cache import ASTCache
+from ast_graph_generator.lib import create_ast_graph_from_file_with_args
+from ast_graph_generator.session import AnalysisSession, get_thread_session
+
+class TrackingSession(AnalysisSession):
+    """
+    Session qui note si la dernière unité de traduction est encore vivante quand elle est relâchée.
+    """
+
+    def parse(self, *args, **kwargs):
+        translation_unit = super().parse(*args, **kwargs)
+        self.last_unit = weakref.ref(translation_unit)
+        return translation_unit
+
+    def read(self, *args, **kwargs):
+        translation_unit = super().read(*args, **kwargs)
+        self.last_unit = weakref.ref(translation_unit)
+        return translation_unit
+
+    def release(self):
+        self.alive_at_release = self.last_unit() is not None
+        super().release()
+
+class TestAnalysisSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.source = os.path.join(cls.tmp.name, "file.cpp")
+        with open(cls.source, "w") as f:
+            f.write("namespace NS { class A {}; }\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_index_is_reused(self):
+        session = AnalysisSession()
+        index = session.index
+        for _ in range(3):
+            tu = session.parse(self.source, [])
+            self.assertIs(tu.index, index, "L'index doit être partagé entre les unités de traduction")
+            del tu
+            session.release()
+        self.assertEqual(session.recycle_count, 0)
+
+    def test_recycle_after_max_translation_units(self):
+        session = AnalysisSession(max_translation_units=2)
+        first_index = session.index
+        for _ in range(4):
+            session.parse(self.source, [])
+            session.release()
+        self.assertEqual(session.recycle_count, 2)
+        self.assertIsNot(session.index, first_index)
+
+    def test_translation_unit_is_freed_before_release(self):
+        export_dir = os.path.join(self.tmp.name, "out")
+        ast_cache = ASTCache(os.path.join(self.tmp.name, "ast_cache"))
+        # Parsé puis sérialisé, puis rechargé depuis le cache d'AST
+        for loaded in (False, True):
+            session = TrackingSession()
+            timings = {}
+            create_ast_graph_from_file_with_args("file.cpp", [], export_dir, session=session, working_dir=self.tmp.name, timings=timings, ast_cache=ast_cache)
+            self.assertEqual(timings["ast_cache_hits"], int(loaded))
+            self.assertFalse(session.alive_at_release, f"L'unité de traduction {'rechargée' if loaded else 'parsée'} doit être libérée avant release")
+            self.assertIsNone(session.last_unit())
+
+    def test_thread_session_is_shared(self):
+        self.assertIs(get_thread_session(), get_thread_session())
+
+if __name__ == "__main__":
+    unittest.main()
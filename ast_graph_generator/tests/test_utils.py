@@ -0,0 +1,27 @@
+import os
+import unittest
+from unittest import mock
+import config
+from ast_graph_generator.utils import get_correct_path, canonical_file_path
+
+class TestCanonicalPath(unittest.TestCase):
+    def test_paths_are_relative_to_talios_path(self):
+        with mock.patch.object(config, "TALIOS_PATH", "/projet"):
+            self.assertEqual(get_correct_path("src/a.cpp", "/projet/module"), "module/src/a.cpp")
+            self.assertEqual(canonical_file_path("/projet/module/../include/./a.h", "/projet/module"), "include/a.h")
+            self.assertEqual(get_correct_path("/usr/include/vector", "/projet/module"), "/usr/include/vector",
+                             "Les fichiers hors de TALIOS_PATH restent absolus")
+        with mock.patch.object(config, "TALIOS_PATH", "/projet/module"):
+            self.assertEqual(get_correct_path("src/a.cpp", "/projet/module"), "src/a.cpp",
+                             "Le cache ne doit pas masquer un changement de TALIOS_PATH")
+
+    def test_same_file_shares_one_string(self):
+        with mock.patch.object(config, "TALIOS_PATH", "/projet"):
+            # Deux noms bruts construits séparément, comme ceux renvoyés par libclang
+            first = canonical_file_path("".join(["/projet/include/", "shared.h"]), "/projet/module")
+            second = canonical_file_path("".join(["/projet/include/", "shared.h"]), "/projet/module")
+            self.assertIs(first, second)
+            self.assertIs(get_correct_path("../include/shared.h", "/projet/module"), first)
+
+if __name__ == "__main__":
+    unittest.main()
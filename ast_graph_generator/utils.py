@@ -1,6 +1,8 @@
 # utils.py
 import os
 import platform
+import sys
+from functools import lru_cache
 import clang.cindex
 import config
 
@@ -41,12 +43,35 @@ def is_subpath(base_path, full_path):
     # Check if the full_path starts with the base_path
     return full_path.startswith(base_path + os.sep)
 
-def get_correct_path(file_path):
+# Nombre de chemins canonisés gardés en mémoire (un par fichier distinct et dossier d'exécution)
+PATH_CACHE_SIZE = 65536
 
-    return_file_path = ""
-    current_path = os.getcwd()
+def get_correct_path(file_path, working_dir=None):
+    """
+    Retourne le chemin du fichier relatif à TALIOS_PATH (ou tel quel pour une librairie externe).
+    Les chemins relatifs sont résolus depuis working_dir, le dossier d'exécution de la
+    commande de compilation (par défaut le répertoire courant).
+    Le résultat est mémorisé et internalisé : toutes les entités d'un même fichier partagent
+    la même chaîne.
+    """
+    current_path = working_dir if working_dir is not None else os.getcwd()
+    return _correct_path(file_path, current_path, config.TALIOS_PATH)
+
+def canonical_file_path(file_name, working_dir=None):
+    """
+    Chemin de déclaration d'un fichier tel que nommé par libclang : normalisé puis passé
+    à get_correct_path, le tout mémorisé par (nom brut, dossier d'exécution).
+    """
+    current_path = working_dir if working_dir is not None else os.getcwd()
+    return _canonical_file_path(file_name, current_path, config.TALIOS_PATH)
 
-    TALIOS_PATH = config.TALIOS_PATH
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def _canonical_file_path(file_name, current_path, TALIOS_PATH):
+    return _correct_path(os.path.normpath(file_name), current_path, TALIOS_PATH)
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def _correct_path(file_path, current_path, TALIOS_PATH):
+    return_file_path = ""
 
     if os.path.isabs(file_path): 
         # le chemin correspond a un include d'un autre fichier
@@ -67,5 +92,4 @@ def get_correct_path(file_path):
         rel_file_path = os.path.relpath(abs_file_path, TALIOS_PATH)
         return_file_path = rel_file_path
         
-    return return_file_path
-    
+    return sys.intern(return_file_path)
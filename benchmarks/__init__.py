@@ -0,0 +1,7 @@
+# benchmarks
+# Mesures de performance de l'analyseur, à lancer depuis la racine du dépôt :
+#   python -m benchmarks.parse_profiles
+# Suite de bout en bout (pipeline complet et étapes, fixture SConsEx et projet synthétique),
+# comparable d'une branche à l'autre :
+#   python -m benchmarks.pipeline --output avant.json
+#   python -m benchmarks.pipeline --compare avant.json
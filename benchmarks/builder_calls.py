@@ -0,0 +1,156 @@
+# builder_calls.py
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+import clang.cindex
+import networkx as nx
+from ast_graph_generator.graph_builder import build_graph_from_ast
+from ast_graph_generator.node_filters import is_class, uses_custom_type, is_function, is_namespace, is_struct, is_custom_type, is_function_call, is_allowed_node, is_class_function_call
+from ast_graph_generator.ontologie import Entity, EntityContext, FunctionEntity, FunctionCallEntity, TypeRefEntity, ClassFunctionCallEntity
+from ast_graph_generator.session import AnalysisSession
+from .corpus import load_fixture_jobs, generate_heavy_header_corpus
+
+def legacy_build_hierarchy_graph(node, graph, ALLOWED_PATHS, parent_node=None, context=None):
+    """
+    Constructeur récursif d'origine (chaîne de prédicats), gardé comme référence de mesure.
+    """
+    old_parent = parent_node
+    if parent_node is None:
+        entity = Entity(node, context)
+        entity.add_to_graph(graph, f'{node.kind.name.lower()}')
+        parent_node = entity.name
+
+    for child in node.get_children():
+        if child is not None:
+            if not is_allowed_node(child, ALLOWED_PATHS, context.working_dir):
+                continue
+
+        if is_class(child) or uses_custom_type(child) or is_function(child) or is_namespace(child) or is_struct(child) or is_custom_type(child) or is_function_call(child):
+            relation = f'contains_{child.kind.name.lower()}'
+            node_type = f'{child.kind.name.lower()}'
+            if is_class_function_call(child):
+                print("a trouve un class typeref")
+                child_entity = ClassFunctionCallEntity(child, context)
+            elif is_function(child):
+                child_entity = FunctionEntity(child, context)
+                relation = 'contains_fun_decl'
+            elif is_function_call(child):
+                child_entity = FunctionCallEntity(child, context)
+                relation = 'calls_function'
+            elif uses_custom_type(child):
+                child_entity = TypeRefEntity(child, context)
+                relation = 'uses_custom_type'
+            else:
+                child_entity = Entity(child, context)
+            child_entity.add_to_graph(graph, node_type)
+            graph.add_edge(parent_node, child_entity.name, relation=relation)
+            if is_function_call(child):
+                legacy_build_hierarchy_graph(child, graph, ALLOWED_PATHS, parent_node=old_parent, context=context)
+            else:
+                legacy_build_hierarchy_graph(child, graph, ALLOWED_PATHS, parent_node=child_entity.name, context=context)
+        else:
+            legacy_build_hierarchy_graph(child, graph, ALLOWED_PATHS, parent_node, context=context)
+
+def legacy_build_graph_from_ast(root, ALLOWED_PATHS, context):
+    graph = nx.DiGraph()
+    legacy_build_hierarchy_graph(root, graph, ALLOWED_PATHS, context=context)
+    return graph
+
+@contextmanager
+def count_ctypes_calls():
+    """
+    Compte les appels aux fonctions libclang (par nom) et les lectures de Cursor.kind
+    (lecture du champ ctypes _kind_id) pendant le bloc.
+    """
+    counts = Counter()
+    lib = clang.cindex.conf.lib
+    originals = {}
+    for item in clang.cindex.functionList:
+        original = getattr(lib, item[0], None)
+        if original is None:
+            continue
+        originals[item[0]] = original
+
+        def counting(*args, _name=item[0], _original=original):
+            counts[_name] += 1
+            return _original(*args)
+        setattr(lib, item[0], counting)
+
+    kind_property = clang.cindex.Cursor.kind
+    def counting_kind(cursor):
+        counts["Cursor.kind"] += 1
+        return kind_property.fget(cursor)
+    clang.cindex.Cursor.kind = property(counting_kind)
+    try:
+        yield counts
+    finally:
+        clang.cindex.Cursor.kind = kind_property
+        for name, original in originals.items():
+            setattr(lib, name, original)
+
+def count_visited_cursors(root: clang.cindex.Cursor, ALLOWED_PATHS: list[str], working_dir: str) -> int:
+    """
+    Nombre de curseurs visités par le constructeur : les sous-arbres des fichiers non autorisés
+    ne sont pas parcourus.
+    """
+    visited = 0
+    stack = [root]
+    while stack:
+        cursor = stack.pop()
+        visited += 1
+        stack.extend(child for child in cursor.get_children() if is_allowed_node(child, ALLOWED_PATHS, working_dir))
+    return visited
+
+def measure(builders: dict, jobs: list) -> dict:
+    """
+    Construit le graph de chaque unité avec chaque constructeur ; vérifie que les graphes
+    sont identiques et retourne, par constructeur, les appels comptés, le temps et le nombre de curseurs.
+    """
+    session = AnalysisSession()
+    totals = {name: {"counts": Counter(), "time": 0.0} for name in builders}
+    cursors = 0
+    for job in jobs:
+        tu = session.parse(job.source_file, ["-std=c++11"] + job.args + ["-working-directory", job.directory])
+        cursors += count_visited_cursors(tu.cursor, [job.source_file], job.directory)
+        graphs = {}
+        for name, builder in builders.items():
+            with count_ctypes_calls() as counts:
+                start = time.perf_counter()
+                graphs[name] = builder(tu.cursor, [job.source_file], EntityContext(job.directory))
+                totals[name]["time"] += time.perf_counter() - start
+            totals[name]["counts"].update(counts)
+        reference = next(iter(graphs.values()))
+        for name, graph in graphs.items():
+            if list(graph.nodes(data=True)) != list(reference.nodes(data=True)) or list(graph.edges(data=True)) != list(reference.edges(data=True)):
+                raise AssertionError(f"Graphes différents pour {job.source_file} ({name})")
+    return {"cursors": cursors, "builders": totals}
+
+def format_results(corpus: str, results: dict) -> list[str]:
+    cursors = results["cursors"]
+    lines = [f"{corpus}: {cursors} curseurs visités, graphes identiques",
+             f"  {'constructeur':<12}{'appels libclang/curseur':>25}{'lectures kind/curseur':>23}{'temps (s)':>11}"]
+    for name, total in results["builders"].items():
+        kind_reads = total["counts"]["Cursor.kind"]
+        lib_calls = sum(total["counts"].values()) - kind_reads
+        lines.append(f"  {name:<12}{lib_calls / cursors:>25.2f}{kind_reads / cursors:>23.2f}{total['time']:>11.3f}")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare le constructeur de graph itératif au constructeur récursif d'origine.")
+    parser.add_argument('--sources', type=int, default=3, help="Nombre de sources du corpus synthétique")
+    cli_args = parser.parse_args()
+    builders = {"récursif": legacy_build_graph_from_ast, "itératif": build_graph_from_ast}
+    with tempfile.TemporaryDirectory(prefix="bench_builder_") as tmp:
+        corpora = {
+            "SConsEx": load_fixture_jobs(tmp),
+            "heavy-headers": generate_heavy_header_corpus(os.path.join(tmp, "heavy"), n_sources=cli_args.sources),
+        }
+        for corpus, jobs in corpora.items():
+            for line in format_results(corpus, measure(builders, jobs)):
+                print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# corpus.py
+import json
+import os
+import random
+import shlex
+from ast_graph_generator.driver import CompileJob, parse_args
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SConsEx-master")
+
+def _rebase_include(arg: str, fixture_dir: str) -> str:
+    """
+    Les chemins -I du compile_commands.json de la fixture pointent vers la machine d'origine :
+    un dossier introuvable est recherché par son nom dans la fixture.
+    """
+    if arg.startswith("-I") and not os.path.isdir(arg[2:]):
+        candidate = os.path.join(fixture_dir, os.path.basename(arg[2:].rstrip("/")))
+        if os.path.isdir(candidate):
+            return "-I" + candidate
+    return arg
+
+def load_fixture_jobs(export_dir: str, fixture_dir: str = FIXTURE_DIR) -> list[CompileJob]:
+    """
+    Retourne les commandes de compilation de la fixture SConsEx, exécutées depuis fixture_dir.
+    """
+    with open(os.path.join(fixture_dir, "compile_commands.json")) as f:
+        commands = json.load(f)
+    jobs = []
+    for command in commands:
+        args = [_rebase_include(arg, fixture_dir) for arg in parse_args(shlex.split(command["command"]))]
+        out_name = command["file"].replace("/", "#")
+        jobs.append(CompileJob(command["file"], args, fixture_dir, export_dir, out_name))
+    return jobs
+
+def generate_heavy_header_corpus(root: str, n_headers: int = 10, functions_per_header: int = 200, n_sources: int = 10) -> list[CompileJob]:
+    """
+    Génère un corpus dont le coût est dans les en-têtes : chaque source inclut tous les
+    en-têtes (et quelques en-têtes standard), qui définissent de nombreuses fonctions inline
+    avec corps, pour un fichier principal court.
+    """
+    include_dir = os.path.join(root, "include")
+    os.makedirs(include_dir, exist_ok=True)
+    for h in range(n_headers):
+        lines = [f"#ifndef HEAVY_{h}_H", f"#define HEAVY_{h}_H", "#include <vector>", "#include <map>", "#include <string>",
+                 f"namespace heavy{h} {{"]
+        for i in range(functions_per_header):
+            lines.append(
+                f"inline int f{i}(const std::vector<int>& v) {{ int s = {i}; for (int x : v) {{ s += x * {i % 7 + 1}; }}"
+                f" std::map<int, std::string> m; m[s] = std::to_string(s); return s + static_cast<int>(m.size()); }}"
+            )
+        lines.append(f"class Widget{h} {{ public: int run(int n) {{ std::vector<int> v(n, 1); return f0(v) + f1(v); }} }};")
+        lines += ["}", "#endif", ""]
+        with open(os.path.join(include_dir, f"heavy{h}.h"), "w") as f:
+            f.write("\n".join(lines))
+
+    jobs = []
+    for s in range(n_sources):
+        lines = [f'#include "heavy{h}.h"' for h in range(n_headers)]
+        lines += [f"namespace app{s} {{",
+                  "int compute() { std::vector<int> v{1, 2, 3}; int total = 0;"]
+        lines += [f"  total += heavy{h}::f{s % functions_per_header}(v) + heavy{h}::Widget{h}().run({s});" for h in range(n_headers)]
+        lines += ["  return total; }", "}", ""]
+        source_file = f"source{s}.cpp"
+        with open(os.path.join(root, source_file), "w") as f:
+            f.write("\n".join(lines))
+        jobs.append(CompileJob(source_file, ["-I" + include_dir], root, os.path.join(root, "out"), f"source{s}"))
+    return jobs
+
+def generate_deep_namespace_corpus(root: str, depth: int = 8, n_classes: int = 40, methods_per_class: int = 50, n_sources: int = 2) -> list[CompileJob]:
+    """
+    Génère des sources dont toutes les classes sont dans les mêmes namespaces profondément
+    imbriqués, avec de nombreuses méthodes qui s'appellent entre elles.
+    """
+    os.makedirs(root, exist_ok=True)
+    jobs = []
+    for s in range(n_sources):
+        lines = [f"namespace level{d} {{" for d in range(depth)]
+        for c in range(n_classes):
+            lines.append(f"class Class{s}_{c} {{ public:")
+            for m in range(methods_per_class):
+                callee = f"method{m - 1}(x)" if m else "x"
+                lines.append(f"  int method{m}(int x) {{ return {callee} + {m}; }}")
+            lines.append("};")
+        lines += ["}" * depth, ""]
+        source_file = f"deep{s}.cpp"
+        with open(os.path.join(root, source_file), "w") as f:
+            f.write("\n".join(lines))
+        jobs.append(CompileJob(source_file, [], root, os.path.join(root, "out"), f"deep{s}"))
+    return jobs
+
+def generate_project_corpus(root: str, namespaces: int = 4, classes_per_namespace: int = 8, methods_per_class: int = 10, call_density: int = 3, header_fan_in: int = 8, std_includes: tuple = ("vector", "string"), seed: int = 0) -> list[CompileJob]:
+    """
+    Génère un projet C++ synthétique et son compile_commands.json (format SCons de la fixture) :
+    une classe par en-tête (include/ns<n>/class<c>.h) et un source par classe qui définit ses
+    méthodes. Chaque source inclut son en-tête et header_fan_in en-têtes d'autres classes ;
+    chaque méthode appelle call_density méthodes de ces classes (ou de sa propre classe).
+    Tous les en-têtes incluent common.h, qui inclut les en-têtes standard std_includes.
+    Les commandes sont relues depuis le compile_commands.json écrit.
+    """
+    rng = random.Random(seed)
+    include_dir = os.path.join(root, "include")
+    os.makedirs(include_dir, exist_ok=True)
+    with open(os.path.join(include_dir, "common.h"), "w") as f:
+        f.write("#pragma once\n" + "".join(f"#include <{header}>\n" for header in std_includes))
+
+    classes = [(n, c) for n in range(namespaces) for c in range(classes_per_namespace)]
+    for n, c in classes:
+        os.makedirs(os.path.join(include_dir, f"ns{n}"), exist_ok=True)
+        lines = ["#pragma once", '#include "common.h"', f"namespace ns{n} {{", f"class Class{c} {{", "public:"]
+        lines += [f"    int m{m}(int x);" for m in range(methods_per_class)]
+        lines += ["};", "}", ""]
+        with open(os.path.join(include_dir, f"ns{n}", f"class{c}.h"), "w") as f:
+            f.write("\n".join(lines))
+
+    commands = []
+    for n, c in classes:
+        others = [other for other in classes if other != (n, c)]
+        included = rng.sample(others, min(header_fan_in, len(others)))
+        lines = [f'#include "ns{n}/class{c}.h"'] + [f'#include "ns{on}/class{oc}.h"' for on, oc in included]
+        lines.append(f"namespace ns{n} {{")
+        for m in range(methods_per_class):
+            body = ["    int s = x;"]
+            for call in range(call_density):
+                target = rng.choice(included + [(n, c)])
+                method = rng.randrange(methods_per_class)
+                if target == (n, c):
+                    if method < m:
+                        body.append(f"    s += m{method}(s);")
+                    continue
+                body.append(f"    ns{target[0]}::Class{target[1]} o{call}; s += o{call}.m{method}(s);")
+            lines += [f"int Class{c}::m{m}(int x) {{"] + body + ["    return s;", "}"]
+        lines += ["}", ""]
+        source_file = f"src/ns{n}/class{c}.cpp"
+        os.makedirs(os.path.join(root, "src", f"ns{n}"), exist_ok=True)
+        with open(os.path.join(root, source_file), "w") as f:
+            f.write("\n".join(lines))
+        output = source_file.replace(".cpp", ".os")
+        commands.append({
+            "command": f"g++ -o {output} -c -fPIC -I{include_dir} {source_file}",
+            "directory": root,
+            "file": source_file,
+            "output": output,
+        })
+
+    with open(os.path.join(root, "compile_commands.json"), "w") as f:
+        json.dump(commands, f, indent=4)
+    return load_fixture_jobs(os.path.join(root, "out"), root)
@@ -0,0 +1,80 @@
+# entity_memory.py
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from ast_graph_generator.graph_builder import build_graph_from_ast
+from ast_graph_generator.ontologie import Entity, EntityContext, FunctionCallEntity
+from ast_graph_generator.session import AnalysisSession
+from .corpus import generate_deep_namespace_corpus
+
+@dataclass
+class LegacyEntityRecord:
+    """
+    Enregistrement équivalent aux anciennes entités (dataclass avec __dict__ par instance),
+    gardé comme référence de taille.
+    """
+    context: EntityContext
+    name: str
+    decl_file: str
+    decl_file_row: object
+    decl_file_column: object
+    namespace_position: str
+    label: str
+    usr: str
+
+def instance_sizes(entity: Entity) -> dict:
+    """
+    Taille propre (sans les chaînes partagées) d'une entité et de l'enregistrement équivalent.
+    """
+    legacy = LegacyEntityRecord(entity.context, entity.name, entity.decl_file, entity.decl_file_row, entity.decl_file_column,
+                                entity.namespace_position, entity.label, entity.usr)
+    return {"legacy": sys.getsizeof(legacy) + sys.getsizeof(legacy.__dict__), "slots": sys.getsizeof(entity)}
+
+def measure_build(source_file: str, directory: str) -> dict:
+    """
+    Parse puis construit le graph de l'unité dans le processus courant (un processus neuf par
+    mesure) : pic d'allocations Python pendant la construction, taille retenue par le graph et
+    mémoire résidente maximale avant et après la construction.
+    """
+    session = AnalysisSession()
+    tu = session.parse(source_file, ["-std=c++11", "-working-directory", directory])
+    # ru_maxrss est en Ko sous Linux
+    parse_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = build_graph_from_ast(tu.cursor, [source_file], EntityContext(directory))
+    build_time = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    call = next(cursor for cursor in tu.cursor.walk_preorder() if cursor.kind.name == "CALL_EXPR")
+    entity = FunctionCallEntity(call, EntityContext(directory))
+    entity.add_to_graph(graph, "call_expr")
+    return {"nodes": graph.number_of_nodes(), "edges": graph.number_of_edges(), "time": build_time,
+            "peak_mb": peak / 2**20, "retained_mb": retained / 2**20, "parse_rss_mb": parse_rss_mb,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "sizes": instance_sizes(entity)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure la mémoire de la construction du graph d'une grande unité de traduction.")
+    parser.add_argument('--depth', type=int, default=8, help="Profondeur des namespaces imbriqués")
+    parser.add_argument('--classes', type=int, default=200, help="Classes de l'unité")
+    parser.add_argument('--methods', type=int, default=50, help="Méthodes par classe")
+    cli_args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench_entities_") as tmp:
+        job = generate_deep_namespace_corpus(tmp, cli_args.depth, cli_args.classes, cli_args.methods, n_sources=1)[0]
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(measure_build, job.source_file, job.directory).result()
+    print(f"{result['nodes']} nœuds, {result['edges']} arêtes, construction {result['time']:.2f}s")
+    print(f"allocations Python : pic {result['peak_mb']:.1f} Mo, retenues par le graph {result['retained_mb']:.1f} Mo")
+    print(f"RSS max : {result['parse_rss_mb']:.1f} Mo après parsing, {result['peak_rss_mb']:.1f} Mo après construction")
+    print(f"taille d'une entité : {result['sizes']['slots']} octets (slots), {result['sizes']['legacy']} octets (dataclass avec __dict__)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# export_memory.py
+import argparse
+import io
+import time
+import tracemalloc
+import networkx as nx
+from ast_graph_generator.exporter import export_to_graphml
+
+def generate_graph(n_nodes: int, edges_per_node: int = 2) -> nx.DiGraph:
+    """
+    Graphe avec les attributs d'un graph d'unité de traduction (label, fichier, ligne, colonne,
+    namespace, type de nœud) et des arêtes vers les nœuds suivants.
+    """
+    graph = nx.DiGraph()
+    for i in range(n_nodes):
+        position = f"level{i % 7}::Class{i % 311}::method{i}(int x, const std::vector<int> &v)"
+        graph.add_node(f"src/module{i % 97}.cpp#{position}", label=f"src/module{i % 97}.cpp#{position}",
+                       declaration_file=f"src/module{i % 97}.cpp", declaration_file_row=i % 5000, declaration_file_column=i % 80,
+                       namespace_position=position, node_type="cxx_method")
+    nodes = list(graph.nodes)
+    for i, node in enumerate(nodes):
+        for k in range(1, edges_per_node + 1):
+            graph.add_edge(node, nodes[(i + k * 7919) % len(nodes)], relation="calls_function")
+    return graph
+
+def measure(writer, graph: nx.DiGraph) -> dict:
+    """
+    Écrit le graph en mémoire et retourne le temps, le pic d'allocations Python pendant
+    l'écriture (hors fichier produit) et le contenu écrit.
+    """
+    output = io.BytesIO()
+    tracemalloc.start()
+    start = time.perf_counter()
+    writer(graph, output)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    content = output.getvalue()
+    return {"time": elapsed, "peak_mb": (peak - len(content)) / 2**20, "content": content}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare l'écriture GraphML en flux à nx.write_graphml.")
+    parser.add_argument('--nodes', type=int, default=50000, help="Nombre de nœuds du graphe")
+    cli_args = parser.parse_args()
+    graph = generate_graph(cli_args.nodes)
+    print(f"{graph.number_of_nodes()} nœuds, {graph.number_of_edges()} arêtes")
+    results = {
+        "nx.write_graphml": measure(nx.write_graphml, graph),
+        "export_to_graphml": measure(export_to_graphml, graph),
+    }
+    reference = results["nx.write_graphml"]["content"]
+    for name, result in results.items():
+        identical = "identique" if result["content"] == reference else "DIFFÉRENT"
+        print(f"{name:<20}{result['time']:>8.2f}s  pic {result['peak_mb']:>8.1f} Mo  {len(result['content']) / 2**20:.1f} Mo écrits ({identical})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# merge_duplicates.py
+import argparse
+import random
+import time
+import networkx as nx
+from ast_graph_generator.graph_postprocessing import merge_duplicate_nodes
+
+def legacy_merge_duplicate_nodes(graph: nx.DiGraph, key_attribute: str = "namespace_position") -> nx.DiGraph:
+    """
+    Fusion d'origine (arêtes redirigées une à une par doublon), avec l'attribut
+    declaration_file corrigé, gardée comme référence de mesure.
+    """
+    groups = {}
+    for node in list(graph.nodes):
+        groups.setdefault(graph.nodes[node].get(key_attribute, node), []).append(node)
+    nodes_to_remove = set()
+    for nodes in groups.values():
+        if len(nodes) < 2:
+            continue
+        canonical_node = next((node for node in nodes if graph.nodes[node].get("declaration_file", "").endswith(".cpp")), nodes[0])
+        for node in nodes:
+            if node == canonical_node:
+                continue
+            for pred, _, data in list(graph.in_edges(node, data=True)):
+                if pred != canonical_node and not graph.has_edge(pred, canonical_node):
+                    graph.add_edge(pred, canonical_node, **data)
+            for _, succ, data in list(graph.out_edges(node, data=True)):
+                if succ != canonical_node and not graph.has_edge(canonical_node, succ):
+                    graph.add_edge(canonical_node, succ, **data)
+            nodes_to_remove.add(node)
+    graph.remove_nodes_from(nodes_to_remove)
+    return graph
+
+def generate_duplicate_graph(n_keys: int, copies: int, edges_per_node: int, seed: int = 0) -> nx.DiGraph:
+    """
+    Graphe où chaque entité apparaît copies fois (une déclaration .h et des définitions ou
+    références .cpp, comme après la concaténation des graphes de plusieurs unités), reliées
+    par des arêtes aléatoires.
+    """
+    rng = random.Random(seed)
+    graph = nx.DiGraph()
+    for key in range(n_keys):
+        for copy in range(copies):
+            extension = ".cpp" if copy == copies - 1 else ".h"
+            graph.add_node(f"file{copy}{extension}#entity{key}", namespace_position=f"entity{key}",
+                           declaration_file=f"file{copy}{extension}", node_type="function_decl")
+    nodes = list(graph.nodes)
+    for node in nodes:
+        for _ in range(edges_per_node):
+            target = rng.choice(nodes)
+            graph.add_edge(node, target, relation="calls_function")
+    return graph
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare la fusion des doublons à la fusion arête par arête d'origine.")
+    parser.add_argument('--keys', type=int, default=100000, help="Nombre d'entités distinctes")
+    parser.add_argument('--copies', type=int, default=4, help="Nombre de nœuds par entité")
+    parser.add_argument('--edges', type=int, default=5, help="Arêtes sortantes par nœud")
+    cli_args = parser.parse_args()
+
+    graph = generate_duplicate_graph(cli_args.keys, cli_args.copies, cli_args.edges)
+    print(f"{graph.number_of_nodes()} nœuds, {graph.number_of_edges()} arêtes")
+    results = {}
+    for name, merge in (("arête par arête", legacy_merge_duplicate_nodes), ("en bloc", merge_duplicate_nodes)):
+        copy = graph.copy()
+        start = time.perf_counter()
+        results[name] = merge(copy)
+        print(f"{name:<16}{time.perf_counter() - start:>8.2f}s  -> {copy.number_of_nodes()} nœuds, {copy.number_of_edges()} arêtes")
+    legacy, bulk = results.values()
+    if list(legacy.nodes(data=True)) != list(bulk.nodes(data=True)) or set(legacy.edges) != set(bulk.edges):
+        raise AssertionError("Fusions différentes")
+
+if __name__ == "__main__":
+    main()
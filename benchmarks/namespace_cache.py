@@ -0,0 +1,56 @@
+# namespace_cache.py
+import argparse
+import cProfile
+import pstats
+import tempfile
+import time
+from ast_graph_generator.graph_builder import build_graph_from_ast
+from ast_graph_generator.ontologie import EntityContext
+from ast_graph_generator.session import AnalysisSession
+from .builder_calls import count_ctypes_calls
+from .corpus import generate_deep_namespace_corpus
+
+def measure(jobs: list, memoize: bool, profile: bool = False) -> dict:
+    """
+    Construit le graph de chaque unité avec ou sans mémorisation des namespaces et retourne
+    le temps de construction, les appels libclang et les graphes produits.
+    """
+    session = AnalysisSession()
+    result = {"time": 0.0, "calls": 0, "graphs": [], "profile": None}
+    profiler = cProfile.Profile() if profile else None
+    for job in jobs:
+        tu = session.parse(job.source_file, ["-std=c++11"] + job.args + ["-working-directory", job.directory])
+        context = EntityContext(job.directory, namespace_prefixes={} if memoize else None)
+        with count_ctypes_calls() as counts:
+            start = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            graph = build_graph_from_ast(tu.cursor, [job.source_file], context)
+            if profiler is not None:
+                profiler.disable()
+            result["time"] += time.perf_counter() - start
+        result["calls"] += sum(counts.values())
+        result["graphs"].append(graph)
+    if profiler is not None:
+        stats = pstats.Stats(profiler)
+        result["profile"] = stats.stats[next(key for key in stats.stats if key[2] == "_build_namespace_position")][3]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure la mémorisation des préfixes de namespace.")
+    parser.add_argument('--depth', type=int, default=8, help="Profondeur des namespaces imbriqués")
+    parser.add_argument('--classes', type=int, default=40, help="Classes par source")
+    parser.add_argument('--methods', type=int, default=50, help="Méthodes par classe")
+    cli_args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench_namespace_") as tmp:
+        jobs = generate_deep_namespace_corpus(tmp, cli_args.depth, cli_args.classes, cli_args.methods)
+        results = {memoize: measure(jobs, memoize, profile=True) for memoize in (False, True)}
+        for without, with_cache in zip(results[False]["graphs"], results[True]["graphs"]):
+            if list(without.nodes(data=True)) != list(with_cache.nodes(data=True)) or list(without.edges(data=True)) != list(with_cache.edges(data=True)):
+                raise AssertionError("Graphes différents avec et sans mémorisation")
+        print(f"{'namespaces':<14}{'construction (s)':>18}{'appels libclang':>17}{'_build_namespace_position (s, cumulé)':>40}")
+        for memoize, result in results.items():
+            print(f"{'mémorisés' if memoize else 'remontés':<14}{result['time']:>18.3f}{result['calls']:>17}{result['profile']:>40.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# parse_profiles.py
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from ast_graph_generator.ast_parser import FULL_MODE, SKIP_HEADER_BODIES_MODE, STRUCTURE_MODE
+from ast_graph_generator.lib import create_ast_graph_from_file_with_args
+from ast_graph_generator.session import AnalysisSession
+from .corpus import load_fixture_jobs, generate_heavy_header_corpus
+
+PROFILES = (FULL_MODE, SKIP_HEADER_BODIES_MODE, STRUCTURE_MODE)
+
+@dataclass
+class ProfileMeasure:
+    corpus: str
+    mode: str
+    units: int
+    failures: int
+    parse_time: float
+    total_time: float
+    peak_rss_mb: float
+
+def measure_profile(corpus: str, jobs: list, mode: str) -> ProfileMeasure:
+    """
+    Analyse toutes les unités dans le processus courant (un processus neuf par mesure pour
+    que la mémoire résidente maximale ne dépende que de ce profil).
+    """
+    session = AnalysisSession()
+    parse_time = 0.0
+    failures = 0
+    start = time.perf_counter()
+    for job in jobs:
+        timings = {}
+        try:
+            create_ast_graph_from_file_with_args(job.source_file, job.args, job.export_dir, out_name=f"{job.out_name}_{mode}", session=session, working_dir=job.directory, timings=timings, mode=mode)
+        except Exception:
+            failures += 1
+        parse_time += timings.get("parse", 0.0)
+    total_time = time.perf_counter() - start
+    # ru_maxrss est en Ko sous Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return ProfileMeasure(corpus, mode, len(jobs), failures, parse_time, total_time, peak_rss_mb)
+
+def run_benchmark(corpora: dict, repeat: int = 1) -> list[ProfileMeasure]:
+    """
+    Mesure chaque profil sur chaque corpus ; garde la meilleure des repeat mesures.
+    """
+    measures = []
+    context = multiprocessing.get_context("spawn")
+    for corpus, jobs in corpora.items():
+        for mode in PROFILES:
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(measure_profile, corpus, jobs, mode).result())
+            measures.append(min(runs, key=lambda measure: measure.total_time))
+    return measures
+
+def format_measures(measures: list[ProfileMeasure]) -> list[str]:
+    """
+    Tableau des mesures, avec le gain de chaque profil par rapport au mode complet du même corpus.
+    """
+    reference = {measure.corpus: measure for measure in measures if measure.mode == FULL_MODE}
+    lines = [f"{'corpus':<16}{'profil':<20}{'unités':>8}{'échecs':>8}{'parsing (s)':>13}{'total (s)':>11}{'RSS max (Mo)':>14}{'gain parsing':>14}{'gain total':>12}{'gain RSS':>10}"]
+    for measure in measures:
+        full = reference.get(measure.corpus)
+        parse_gain = f"{1 - measure.parse_time / full.parse_time:.0%}" if full and full.parse_time else "-"
+        total_gain = f"{1 - measure.total_time / full.total_time:.0%}" if full and full.total_time else "-"
+        rss_gain = f"{1 - measure.peak_rss_mb / full.peak_rss_mb:.0%}" if full and full.peak_rss_mb else "-"
+        lines.append(f"{measure.corpus:<16}{measure.mode:<20}{measure.units:>8}{measure.failures:>8}{measure.parse_time:>13.3f}"
+                     f"{measure.total_time:>11.3f}{measure.peak_rss_mb:>14.1f}{parse_gain:>14}{total_gain:>12}{rss_gain:>10}")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les profils de parsing (full, skip_header_bodies, structure).")
+    parser.add_argument('--headers', type=int, default=10, help="Nombre d'en-têtes du corpus synthétique")
+    parser.add_argument('--functions', type=int, default=200, help="Fonctions inline par en-tête du corpus synthétique")
+    parser.add_argument('--sources', type=int, default=10, help="Nombre de sources du corpus synthétique")
+    parser.add_argument('--repeat', type=int, default=1, help="Nombre de mesures par profil (la meilleure est gardée)")
+    cli_args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_profiles_") as tmp:
+        corpora = {
+            "SConsEx": load_fixture_jobs(tmp),
+            "heavy-headers": [replace(job, export_dir=tmp) for job in generate_heavy_header_corpus(tmp, cli_args.headers, cli_args.functions, cli_args.sources)],
+        }
+        for line in format_measures(run_benchmark(corpora, cli_args.repeat)):
+            print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# pipeline.py
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict, replace
+from ast_graph_generator.driver import find_compile_commands, collect_compile_jobs, run_compile_jobs
+from ast_graph_generator.global_graph import assemble_global_graph
+from ast_graph_generator.instrumentation import aggregate_metrics, STAGES
+from ast_graph_generator.lib import create_ast_graph_from_file_with_args
+from ast_graph_generator.session import AnalysisSession
+from .corpus import load_fixture_jobs, generate_project_corpus
+
+PIPELINE = "pipeline"
+STAGES_SCENARIO = "stages"
+
+# Mesures comparées d'une exécution à l'autre (plus grand = meilleur)
+THROUGHPUTS = ("tus_per_s", "cursors_per_s")
+
+@dataclass
+class PipelineMeasure:
+    """
+    Mesure d'un scénario sur un corpus : le pipeline complet de main.py (workers, puis
+    assemblage du graph global) ou les étapes d'analyse d'une unité, une à une dans le
+    processus courant (STAGES_SCENARIO, sans pool ni cache).
+    """
+    corpus: str
+    scenario: str
+    units: int
+    failures: int
+    wall: float
+    cursors: int
+    nodes: int
+    edges: int
+    peak_rss_mb: float
+    # Étape -> temps réel, temps CPU et débits (voir instrumentation.aggregate_metrics)
+    stages: dict = field(default_factory=dict)
+
+    @property
+    def tus_per_s(self) -> float:
+        return self.units / self.wall if self.wall else 0.0
+
+    @property
+    def cursors_per_s(self) -> float:
+        return self.cursors / self.wall if self.wall else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "tus_per_s": self.tus_per_s, "cursors_per_s": self.cursors_per_s}
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss est en Ko sous Linux ; les workers sont attendus avant la mesure
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+def _stage_throughputs(totals: dict) -> dict:
+    """
+    Temps de chaque étape avec ses débits (unités et curseurs par seconde de l'étape).
+    """
+    cursors = totals["counters"]["cursors"]
+    stages = {}
+    for stage, measure in totals["stages"].items():
+        stages[stage] = {**measure, "tus_per_s": measure["units"] / measure["wall"] if measure["wall"] else 0.0,
+                         "cursors_per_s": cursors / measure["wall"] if measure["wall"] else 0.0}
+    return stages
+
+def measure_pipeline(corpus: str, jobs: list, n_jobs: int = 1) -> PipelineMeasure:
+    """
+    Pipeline complet comme main.py --merge : analyse de toutes les unités sur n_jobs
+    processus, puis assemblage du graph global.
+    """
+    start = time.perf_counter()
+    summary = run_compile_jobs(jobs, n_jobs=n_jobs)
+    merge_start = time.perf_counter()
+    graph_files = [result.graph_file_path for result in summary.results if not result.error]
+    assemble_global_graph(graph_files, n_jobs=n_jobs)
+    wall = time.perf_counter() - start
+
+    totals = aggregate_metrics(summary.results)
+    stages = _stage_throughputs(totals)
+    stages["global_merge"] = {"units": len(graph_files), "wall": time.perf_counter() - merge_start}
+    counters = totals["counters"]
+    return PipelineMeasure(corpus, PIPELINE, len(jobs), summary.failures, wall, counters["cursors"], counters["nodes"],
+                           counters["edges"], _peak_rss_mb(), stages)
+
+def measure_stages(corpus: str, jobs: list) -> PipelineMeasure:
+    """
+    Étapes d'analyse mesurées une à une (parsing, capture, construction, fusion, export) :
+    les unités sont traitées en série dans le processus courant, sans pool ni cache.
+    """
+    session = AnalysisSession()
+    results = []
+    failures = 0
+    start = time.perf_counter()
+    for job in jobs:
+        timings = {}
+        try:
+            create_ast_graph_from_file_with_args(job.source_file, job.args, job.export_dir, out_name=job.out_name, session=session, working_dir=job.directory, timings=timings)
+        except Exception:
+            failures += 1
+        results.append(timings)
+    wall = time.perf_counter() - start
+
+    totals = {
+        "stages": {},
+        "counters": {counter: sum(timings.get(counter, 0) for timings in results) for counter in ("cursors", "nodes", "edges")},
+    }
+    for stage in STAGES:
+        walls = [timings[stage] for timings in results if stage in timings]
+        if walls:
+            totals["stages"][stage] = {"units": len(walls), "wall": sum(walls), "cpu": sum(timings.get(stage + "_cpu", 0.0) for timings in results), "max_wall": max(walls)}
+    counters = totals["counters"]
+    return PipelineMeasure(corpus, STAGES_SCENARIO, len(jobs), failures, wall, counters["cursors"], counters["nodes"],
+                           counters["edges"], _peak_rss_mb(), _stage_throughputs(totals))
+
+def run_benchmark(corpora: dict, n_jobs: int = 1, repeat: int = 1) -> list[PipelineMeasure]:
+    """
+    Mesure chaque scénario sur chaque corpus, chaque mesure dans un processus neuf (la
+    mémoire résidente maximale ne dépend que d'elle) ; garde la plus rapide des repeat mesures.
+    """
+    measures = []
+    context = multiprocessing.get_context("spawn")
+    for corpus, jobs in corpora.items():
+        for scenario, measure, args in ((PIPELINE, measure_pipeline, (corpus, jobs, n_jobs)), (STAGES_SCENARIO, measure_stages, (corpus, jobs))):
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(measure, *args).result())
+            measures.append(min(runs, key=lambda run: run.wall))
+    return measures
+
+def current_revision() -> str:
+    """
+    Révision git du dépôt mesuré (vide hors d'un dépôt git).
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def format_measures(measures: list[PipelineMeasure]) -> list[str]:
+    lines = [f"{'corpus':<12}{'scénario':<10}{'unités':>8}{'échecs':>8}{'total (s)':>11}{'TUs/s':>9}{'curseurs/s':>12}{'nœuds':>9}{'arêtes':>9}{'RSS max (Mo)':>14}"]
+    for measure in measures:
+        lines.append(f"{measure.corpus:<12}{measure.scenario:<10}{measure.units:>8}{measure.failures:>8}{measure.wall:>11.3f}"
+                     f"{measure.tus_per_s:>9.2f}{measure.cursors_per_s:>12.0f}{measure.nodes:>9}{measure.edges:>9}{measure.peak_rss_mb:>14.1f}")
+        if measure.scenario == STAGES_SCENARIO:
+            for stage, stage_measure in measure.stages.items():
+                lines.append(f"{'':<22}{stage:<10}{stage_measure['wall']:>11.3f}s réel {stage_measure['cpu']:>9.3f}s CPU {stage_measure['cursors_per_s']:>12.0f} curseurs/s")
+    return lines
+
+def compare_measures(measures: list[dict], baseline: list[dict], tolerance: float) -> tuple[list[str], bool]:
+    """
+    Compare les débits et la mémoire de chaque (corpus, scénario) à une exécution de
+    référence. Retourne les lignes du résumé et True si un débit a baissé, ou la mémoire
+    augmenté, de plus de tolerance.
+    """
+    reference = {(measure["corpus"], measure["scenario"]): measure for measure in baseline}
+    lines, regressed = [], False
+    for measure in measures:
+        base = reference.get((measure["corpus"], measure["scenario"]))
+        if base is None:
+            continue
+        ratios = {name: measure[name] / base[name] for name in THROUGHPUTS if base[name]}
+        if base["peak_rss_mb"]:
+            ratios["peak_rss_mb"] = measure["peak_rss_mb"] / base["peak_rss_mb"]
+        flagged = [name for name, ratio in ratios.items()
+                   if (ratio > 1 + tolerance if name == "peak_rss_mb" else ratio < 1 - tolerance)]
+        regressed |= bool(flagged)
+        details = ", ".join(f"{name} x{ratio:.2f}" for name, ratio in ratios.items())
+        lines.append(f"{measure['corpus']:<12}{measure['scenario']:<10}{details}" + (f"  RÉGRESSION ({', '.join(flagged)})" if flagged else ""))
+    return lines, regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure le pipeline complet et chacune de ses étapes sur la fixture SConsEx et un projet synthétique.")
+    parser.add_argument('--namespaces', type=int, default=4, help="Namespaces du projet synthétique")
+    parser.add_argument('--classes', type=int, default=8, help="Classes par namespace (une unité de traduction par classe)")
+    parser.add_argument('--methods', type=int, default=10, help="Méthodes par classe")
+    parser.add_argument('--calls', type=int, default=3, help="Appels de méthodes par méthode (densité d'appels)")
+    parser.add_argument('--fan-in', type=int, default=8, help="En-têtes d'autres classes inclus par chaque source")
+    parser.add_argument('--compile-commands', default=None, help="Dossier contenant un compile_commands.json à mesurer en plus (projet réel)")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Nombre de processus workers du pipeline complet")
+    parser.add_argument('--repeat', type=int, default=1, help="Nombre de mesures par scénario (la plus rapide est gardée)")
+    parser.add_argument('--output', default=None, help="Écrit les mesures en JSON dans ce fichier")
+    parser.add_argument('--compare', default=None, help="Compare les mesures à un fichier JSON écrit par --output (autre branche)")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Baisse relative de débit (ou hausse de mémoire) tolérée par --compare")
+    cli_args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+        synthetic_dir = os.path.join(tmp, "synthetic")
+        corpora = {
+            "SConsEx": load_fixture_jobs(os.path.join(tmp, "sconsex")),
+            "synthetic": [replace(job, export_dir=os.path.join(tmp, "out")) for job in generate_project_corpus(
+                synthetic_dir, cli_args.namespaces, cli_args.classes, cli_args.methods, cli_args.calls, cli_args.fan_in)],
+        }
+        if cli_args.compile_commands:
+            # Commandes lues comme dans main.py
+            corpora["project"] = collect_compile_jobs(find_compile_commands(cli_args.compile_commands), cli_args.compile_commands, os.path.join(tmp, "project"))
+        measures = run_benchmark(corpora, cli_args.jobs, cli_args.repeat)
+
+    for line in format_measures(measures):
+        print(line)
+    results = {
+        "revision": current_revision(),
+        "python": platform.python_version(),
+        "jobs": cli_args.jobs,
+        "measures": [measure.to_dict() for measure in measures],
+    }
+    if cli_args.output:
+        with open(cli_args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if cli_args.compare:
+        with open(cli_args.compare) as f:
+            baseline = json.load(f)
+        lines, regressed = compare_measures(results["measures"], baseline["measures"], cli_args.tolerance)
+        print(f"Comparaison avec {cli_args.compare} (révision {baseline.get('revision') or '?'}) :")
+        for line in lines:
+            print(line)
+        if regressed:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
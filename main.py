@@ -1,30 +1,47 @@
+import argparse
 import os
-from pathlib import Path
-from clang.cindex import CompilationDatabase
-from ast_graph_generator.lib import create_ast_graph_from_file_with_args
-from tqdm import tqdm
+import tempfile
+from ast_graph_generator.driver import find_compile_commands, collect_compile_jobs, run_compile_jobs
+from ast_graph_generator.cache import AnalysisCache, MANIFEST_NAME, AST_CACHE_DIR_NAME
+from ast_graph_generator.pch import format_pch_report
+from ast_graph_generator.exporter import export_to_graphml, graph_file_extension, SqliteGraphStore, EXPORT_FORMATS, GRAPHML_FORMAT, SQLITE_FORMAT, SQLITE_DATABASE_NAME
+from ast_graph_generator.global_graph import assemble_global_graph, refresh_global_graph, GLOBAL_GRAPH_NAME, GLOBAL_STATE_NAME
+from ast_graph_generator.query_daemon import send_request
+from ast_graph_generator.instrumentation import measure_stage, build_run_report, write_run_report, format_stage_report
+from ast_graph_generator.ast_parser import EXTRACTION_MODES, FULL_MODE
+from ast_graph_generator.ontologie import IDENTITY_MODES, NAME_IDENTITY
 import config
 
-def find_compile_commands(directory):
-    result = []
-    for root, dirs, files in os.walk(directory):
-        if 'compile_commands.json' in files:
-            result.append(os.path.join(root, 'compile_commands.json'))
-    return result
-
-def parse_args(args):
-    filtered_args = []
-    args = args[4:]
-    args = args[:-1]
-    for arg in args:
-        if not (arg.startswith('-T') or arg.startswith('-c') or arg.startswith('-o') or arg == '-fPIC'): # or arg.startswith('-W')
-            filtered_args.append(arg)
-    return filtered_args
-
 def main():
+    parser = argparse.ArgumentParser(
+        description="Génère le graphe AST de chaque commande de compilation trouvée sous TALIOS_PATH."
+    )
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Nombre de processus workers (1 = exécution séquentielle)")
+    parser.add_argument('--threads', action='store_true', help="Répartit les commandes sur des threads du processus courant plutôt que sur des processus")
+    parser.add_argument('--max-tus-per-session', type=int, default=None, help="Recrée l'index libclang d'un worker après ce nombre d'unités de traduction")
+    parser.add_argument('--max-rss', type=float, default=None, help="Recrée l'index libclang d'un worker quand sa mémoire résidente dépasse ce seuil (Mo)")
+    parser.add_argument('--exclude-decls', action='store_true', help="Crée les index libclang avec excludeDecls")
+    parser.add_argument('--pch', action='store_true', help="Précompile les includes communs aux unités de traduction de mêmes options")
+    parser.add_argument('--mode', choices=EXTRACTION_MODES, default=FULL_MODE, help="'structure' n'extrait que les déclarations (namespaces, classes, méthodes) sans parser les corps de fonctions, 'skip_header_bodies' ne parse pas les corps de fonctions des includes de tête")
+    parser.add_argument('--incomplete', action='store_true', help="Parse avec PARSE_INCOMPLETE (pas d'instanciation implicite des templates)")
+    parser.add_argument('--identity', choices=IDENTITY_MODES, default=NAME_IDENTITY, help="'usr' indexe les nœuds par leur USR libclang (fusion exacte entre unités de traduction)")
+    parser.add_argument('--compress', action='store_true', help="Écrit les graphes GraphML compressés en gzip (.graphml.gz)")
+    parser.add_argument('--export', choices=EXPORT_FORMATS, default=GRAPHML_FORMAT, help="'sqlite' écrit tous les graphes dans une seule base SQLite (graph.sqlite) au lieu d'un fichier GraphML par unité")
+    parser.add_argument('--merge', action='store_true', help="Assemble ensuite le graph global du programme à partir des graphes produits")
+    parser.add_argument('--notify-daemon', default=None, metavar='SOCKET', help="Avec --merge, demande au démon de requêtes écoutant sur cette socket de recharger le graph global")
+    parser.add_argument('--incremental', action='store_true', help="Réutilise les graphes des unités de traduction inchangées depuis la dernière exécution")
+    parser.add_argument('--ast-cache', action='store_true', help="Sérialise les unités de traduction parsées et recharge celles dont le source et les headers n'ont pas changé")
+    parser.add_argument('--reextract', action='store_true', help="Reconstruit tous les graphes depuis le cache d'AST (après un changement des règles d'extraction), sans reparser les unités inchangées")
+    cli_args = parser.parse_args()
+
     talios_path = config.TALIOS_PATH
     graph_save_root = "/users/t0315611/Documents"
     export_root = "ast_gen"
+    # Les graphes d'un autre mode ou d'une autre identité ne remplacent pas les graphes complets
+    if cli_args.mode != FULL_MODE:
+        export_root += f"_{cli_args.mode}"
+    if cli_args.identity != NAME_IDENTITY:
+        export_root += f"_{cli_args.identity}"
     export_root_path = os.path.join(graph_save_root, export_root)
 
     try:
@@ -37,52 +54,67 @@ def main():
         print(f"Aucun fichier 'compile_commands.json' trouvé dans {talios_path}")
         return
 
-    # Utiliser tqdm pour la boucle principale sur les fichiers compile_commands.json
-    for compile_commands_json in tqdm(list_json, desc="Traitement des fichiers compile_commands.json"):
-        try:
-            compile_commands_json_dir = os.path.dirname(compile_commands_json)
-            cdb = CompilationDatabase.fromDirectory(compile_commands_json_dir)
-            compile_cmds = cdb.getAllCompileCommands()
+    cache = None
+    if cli_args.incremental:
+        cache = AnalysisCache.load(os.path.join(export_root_path, MANIFEST_NAME))
 
-            if compile_cmds is None:
-                print(f"{compile_commands_json} est vide")
-                continue
-
-            # Utiliser tqdm pour la boucle interne sur les commandes de compilation
-            for comp in tqdm(compile_cmds, desc=f"Traitement des commandes de compilation ({compile_commands_json})"):
-                try:
-                    args = [arg for arg in comp.arguments]
-                    args = parse_args(args)
-                    source_file = comp.filename
-                    cmd_exec_folder = comp.directory
-
-                    try:
-                        os.chdir(cmd_exec_folder)
-                    except Exception as e:
-                        print(f"Erreur lors du changement de répertoire vers {cmd_exec_folder}: {e}")
-                        continue
+    # --reextract implique le cache d'AST
+    ast_cache_dir = os.path.join(export_root_path, AST_CACHE_DIR_NAME) if cli_args.ast_cache or cli_args.reextract else None
+    jobs = collect_compile_jobs(list_json, talios_path, export_root_path, mode=cli_args.mode, incomplete=cli_args.incomplete, identity=cli_args.identity, compress=cli_args.compress, export_format=cli_args.export, ast_cache_dir=ast_cache_dir, reextract=cli_args.reextract)
+    session_options = {
+        "exclude_decls": cli_args.exclude_decls,
+        "max_translation_units": cli_args.max_tus_per_session,
+        "max_rss_mb": cli_args.max_rss,
+    }
+    # Export SQLite : le processus principal écrit les graphes renvoyés par les workers
+    store = SqliteGraphStore(os.path.join(export_root_path, SQLITE_DATABASE_NAME)) if cli_args.export == SQLITE_FORMAT else None
+    # Temps des étapes du processus principal, pour le rapport d'exécution
+    run_stages = {}
+    try:
+        with measure_stage(run_stages, "analyse"):
+            if cli_args.pch:
+                os.makedirs(export_root_path, exist_ok=True)
+                with tempfile.TemporaryDirectory(prefix="pch_", dir=export_root_path) as pch_dir:
+                    summary = run_compile_jobs(jobs, n_jobs=cli_args.jobs, cache=cache, use_threads=cli_args.threads, session_options=session_options, pch_dir=pch_dir, store=store)
+            else:
+                summary = run_compile_jobs(jobs, n_jobs=cli_args.jobs, cache=cache, use_threads=cli_args.threads, session_options=session_options, store=store)
+    finally:
+        if store is not None:
+            store.close()
 
-                    rel_cmd_exec_folder = os.path.relpath(cmd_exec_folder, talios_path).replace("/", "#").replace("\\", "#")
-                    
-                    export_path = os.path.join(export_root_path, rel_cmd_exec_folder)
-                    export_dir = os.path.join(source_file.replace("/", "#").replace("\\", "#"), export_path)
-                    #out_name = source_file.replace("/", "#").replace("\\", "#")
+    print(f"{len(jobs) - summary.failures}/{len(jobs)} commandes de compilation traitées avec succès ({summary.cached} réutilisées depuis le cache)")
+    if ast_cache_dir is not None:
+        print(f"{summary.ast_cached} unités de traduction rechargées depuis le cache d'AST {ast_cache_dir}")
+    for line in format_pch_report(summary.pch_groups, summary.results):
+        print(line)
 
-                    abs_path = cmd_exec_folder + source_file
-                    rel_path_cpp_file = os.path.relpath(abs_path, talios_path)
-                    out_name = rel_path_cpp_file.replace("/", "#").replace("\\", "#")
+    if cli_args.merge and store is not None:
+        print("--merge assemble les graphes GraphML : la base SQLite partage déjà les nœuds de toutes les unités")
+    elif cli_args.merge:
+        graph_files = [result.graph_file_path for result in summary.results if not result.error]
+        with measure_stage(run_stages, "merge"):
+            if cli_args.incremental:
+                # Seuls les graphes réécrits depuis le dernier assemblage sont relus
+                global_graph = refresh_global_graph(os.path.join(export_root_path, GLOBAL_STATE_NAME), graph_files, n_jobs=cli_args.jobs)
+                graph = global_graph.to_graph(cli_args.identity)
+            else:
+                graph = assemble_global_graph(graph_files, n_jobs=cli_args.jobs, identity=cli_args.identity)
+        global_graph_path = os.path.join(export_root_path, GLOBAL_GRAPH_NAME + graph_file_extension(cli_args.compress))
+        with measure_stage(run_stages, "export_global"):
+            export_to_graphml(graph, global_graph_path, cli_args.compress)
+        print(f"Graph global : {graph.number_of_nodes()} nœuds, {graph.number_of_edges()} arêtes, exporté vers {global_graph_path}")
+        if cli_args.notify_daemon:
+            try:
+                send_request(cli_args.notify_daemon, {"query": "reload", "source": global_graph_path})
+            except Exception as e:
+                print(f"Le démon de requêtes {cli_args.notify_daemon} n'a pas rechargé le graph global: {e}")
 
-                    try:
-                        create_ast_graph_from_file_with_args(source_file, args, export_dir, out_name=out_name)
-                    except Exception as e:
-                        print(f"Erreur lors de la création du graphe AST pour le fichier {source_file}: {e}")
-                        continue  # Continue with the next command despite errors
-                except Exception as e:
-                    print(f"Erreur lors du traitement des commandes de compilation pour {compile_commands_json}: {e}")
-                    continue  # Continue with the next compile command despite errors
-        except Exception as e:
-            print(f"Erreur lors de la tentative de lecture {compile_commands_json}: {e}")
-            continue  # Continue with the next compile_commands.json file despite errors
+    # Rapport d'exécution : mesures de chaque unité (renvoyées par les workers) et totaux
+    report = build_run_report(summary.results, run_stages)
+    for line in format_stage_report(report["totals"]):
+        print(line)
+    json_path, csv_path = write_run_report(report, export_root_path)
+    print(f"Rapport d'exécution écrit dans {json_path} et {csv_path}")
 
 if __name__ == "__main__":
     main()